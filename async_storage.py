@@ -0,0 +1,187 @@
+"""Async facade over supabase_storage for the event loop.
+
+The Supabase client is synchronous, so every call runs on a dedicated
+thread pool; awaiting these helpers from an aiogram handler never blocks
+other updates. Batch helpers bound concurrency, retry each file on its own
+and return one aggregated result.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Iterable, List, Optional
+
+import metrics
+from config import settings
+from supabase_storage import (
+    ProgressCallback,
+    download_bytes,
+    download_file,
+    get_public_url,
+    upload_bytes,
+    upload_file,
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+# Local problems that another attempt won't fix.
+_PERMANENT_ERRORS = (FileNotFoundError, IsADirectoryError, PermissionError)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.storage_concurrency), thread_name_prefix="storage"
+        )
+    return _executor
+
+
+async def _run(func: Callable, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), partial(func, *args, **kwargs))
+
+
+@dataclass
+class TransferItem:
+    local_path: str
+    remote_path: str
+    bucket: Optional[str] = None
+    content_type: Optional[str] = None
+
+
+@dataclass
+class TransferResult:
+    item: TransferItem
+    ok: bool
+    attempts: int
+    bytes: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchResult:
+    results: List[TransferResult] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def succeeded(self) -> List[TransferResult]:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self) -> List[TransferResult]:
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def bytes(self) -> int:
+        return sum(result.bytes for result in self.succeeded)
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+
+async def upload(
+    local_path: str,
+    bucket: Optional[str],
+    remote_path: str,
+    content_type: Optional[str] = None,
+    on_progress: Optional[ProgressCallback] = None,
+):
+    """Awaitable :func:`supabase_storage.upload_file`; ``on_progress`` runs on the worker thread."""
+    return await _run(
+        upload_file, local_path, bucket, remote_path, content_type=content_type, on_progress=on_progress
+    )
+
+
+async def download(bucket: Optional[str], remote_path: str, local_path: str) -> int:
+    return await _run(download_file, bucket, remote_path, local_path)
+
+
+async def public_url(bucket: Optional[str], remote_path: str) -> str:
+    return await _run(get_public_url, bucket, remote_path)
+
+
+async def upload_data(
+    data: bytes, bucket: Optional[str], remote_path: str, content_type: str = "application/octet-stream"
+) -> None:
+    await _run(upload_bytes, data, bucket, remote_path, content_type)
+
+
+async def download_data(bucket: Optional[str], remote_path: str) -> Optional[bytes]:
+    return await _run(download_bytes, bucket, remote_path)
+
+
+async def _with_retries(
+    operation: str,
+    item: TransferItem,
+    transfer: Callable[[TransferItem], "asyncio.Future[int]"],
+    semaphore: asyncio.Semaphore,
+    retries: int,
+) -> TransferResult:
+    attempts = 0
+    async with semaphore:
+        started = time.perf_counter()
+        while True:
+            attempts += 1
+            try:
+                size = await transfer(item)
+            except _PERMANENT_ERRORS as exc:
+                error = repr(exc)
+                break
+            except Exception as exc:  # noqa: BLE001 - report per file, keep the batch going
+                error = repr(exc)
+                if attempts > retries:
+                    break
+                metrics.incr(f"storage.{operation}.retry")
+                await asyncio.sleep(min(0.5 * 2 ** (attempts - 1), 10.0))
+                continue
+            seconds = time.perf_counter() - started
+            metrics.incr(f"storage.{operation}.ok")
+            metrics.observe(f"storage.{operation}", seconds)
+            return TransferResult(item, True, attempts, size, seconds)
+    metrics.incr(f"storage.{operation}.failed")
+    return TransferResult(item, False, attempts, 0, time.perf_counter() - started, error)
+
+
+async def _run_batch(
+    operation: str,
+    items: Iterable[TransferItem],
+    transfer: Callable[[TransferItem], "asyncio.Future[int]"],
+    concurrency: Optional[int],
+    retries: int,
+) -> BatchResult:
+    # Threads are the real limit, so never ask for more than the pool has.
+    limit = min(concurrency or settings.storage_concurrency, settings.storage_concurrency)
+    semaphore = asyncio.Semaphore(max(1, limit))
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(_with_retries(operation, item, transfer, semaphore, retries) for item in items)
+    )
+    return BatchResult(list(results), time.perf_counter() - started)
+
+
+async def upload_many(
+    items: Iterable[TransferItem], concurrency: Optional[int] = None, retries: int = 2
+) -> BatchResult:
+    """Upload files with at most ``concurrency`` in flight; failures don't stop the batch."""
+
+    async def transfer(item: TransferItem) -> int:
+        await upload(item.local_path, item.bucket, item.remote_path, content_type=item.content_type)
+        return os.path.getsize(item.local_path)
+
+    return await _run_batch("upload", items, transfer, concurrency, retries)
+
+
+async def download_many(
+    items: Iterable[TransferItem], concurrency: Optional[int] = None, retries: int = 2
+) -> BatchResult:
+    """Download objects to their ``local_path`` with bounded concurrency."""
+
+    async def transfer(item: TransferItem) -> int:
+        return await download(item.bucket, item.remote_path, item.local_path)
+
+    return await _run_batch("download", items, transfer, concurrency, retries)
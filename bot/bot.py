@@ -1,4 +1,13 @@
+import time
+
+_MODULE_STARTED = time.time()
+
+import asyncio
+import hmac
+import json
+import os
 from pathlib import Path
+import socket
 import sys
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -6,42 +15,64 @@ sys.path.append(str(ROOT))
 
 from aiohttp import web
 from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiogram.webhook.aiohttp_server import setup_application
 from typing import Optional, List
 
-from redis.asyncio import Redis
-from sqlalchemy import select
-import sentry_sdk
-from sentry_sdk.integrations.aiohttp import AioHttpIntegration
+from sqlalchemy.ext.asyncio import AsyncSession
 
+import cache
+import metrics
+from observability import init_sentry
+import session_timers
 from config import settings
-from db import AsyncSessionLocal
-from models import AdminAction, ClientProfile, EscrowAccount, ModelProfile, User
+from db import AsyncSessionLocal, engine, pool_stats, prewarm_pool
+from models import AdminAction, User
+from jobs import enqueue_job
+from outbox import SENDER_ADMIN, SENDER_MAIN, enqueue_notification
+from catalog_cache import get_catalog_page
+import cluster_metrics
 from content_flow import (
+    PURCHASES_PAGE_SIZE,
+    ContentPage,
     create_content,
     create_purchase,
-    get_content_by_id,
-    list_active_content,
-    list_model_content,
+    page_active_content,
+    page_client_purchases,
+    page_model_content,
     parse_content_args,
 )
+from middlewares import (
+    USER_PROFILES_FLAG,
+    ThrottlingMiddleware,
+    UpdateDeduplicationMiddleware,
+    UserContextMiddleware,
+)
 from session_flow import (
+    complete_client_registration,
+    complete_model_registration,
     create_session_with_escrow,
-    get_or_create_user,
+    dispute_session,
+    get_cached_user,
     get_session_by_ref,
-    get_user_by_telegram_id,
-    set_escrow_status,
-    set_session_status,
-    update_user_role,
+    start_session,
+    transition_escrow,
+    transition_session,
+    update_user_email,
 )
+from states import Registration
+from update_scheduler import InlineRequestHandler, OrderedRequestHandler, UpdateScheduler
+
+_IMPORTS_DONE = time.time()
 
 WEBHOOK_PATH = "/webhook"
 ADMIN_WEBHOOK_PATH = "/admin_webhook"
-
-redis_client: Optional[Redis] = None
-PENDING_REGISTRATIONS: dict[int, dict[str, str]] = {}
+METRICS_PATH = "/metrics"
 
 
 def _require_bot_token() -> str:
@@ -50,44 +81,78 @@ def _require_bot_token() -> str:
     return settings.bot_token
 
 
+def _bot_session():
+    """Default session, or one aimed at TELEGRAM_API_BASE_URL when set."""
+    if not settings.telegram_api_base_url:
+        return None
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    return AiohttpSession(api=TelegramAPIServer.from_base(settings.telegram_api_base_url))
+
+
+def _startup_profile_middleware(profile: dict):
+    """Report startup timings (seconds since bot.py started importing) after the first update."""
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        response = await handler(request)
+        if "first_webhook" not in profile and request.path == WEBHOOK_PATH:
+            profile["first_webhook"] = time.time()
+            report = {
+                "imports_s": profile["imports_done"] - _MODULE_STARTED,
+                "ready_s": profile["ready"] - _MODULE_STARTED,
+                "first_webhook_s": profile["first_webhook"] - _MODULE_STARTED,
+                **profile,
+                "module_started": _MODULE_STARTED,
+            }
+            print(f"startup_profile {json.dumps(report)}", flush=True)
+        return response
+
+    return middleware
+
+
 def _require_webhook_base_url() -> str:
     if not settings.webhook_base_url:
         raise RuntimeError("WEBHOOK_BASE_URL is required for webhook mode")
     return settings.webhook_base_url.rstrip("/")
 
 
-def _init_sentry():
-    if settings.sentry_dsn:
-        sentry_sdk.init(
-            dsn=settings.sentry_dsn,
-            integrations=[AioHttpIntegration()],
-            traces_sample_rate=0.1,
-        )
+def _build_fsm_storage() -> BaseStorage:
+    """Redis-backed FSM state shared by all webhook workers; in-memory for single-node dev."""
+    redis = cache.get_redis()
+    if redis is None:
+        return MemoryStorage()
+    from aiogram.fsm.storage.redis import RedisStorage
 
-
-async def init_redis():
-    global redis_client
-    if settings.redis_url:
-        redis_client = Redis.from_url(settings.redis_url)
+    return RedisStorage(
+        redis,
+        key_builder=DefaultKeyBuilder(with_bot_id=True),
+        state_ttl=settings.fsm_state_ttl,
+        data_ttl=settings.fsm_state_ttl,
+    )
 
 
-async def close_redis():
-    if redis_client is not None:
-        await redis_client.close()
+async def metrics_handler(request: web.Request) -> web.Response:
+    # Served on the public webhook port, so only with METRICS_TOKEN as a bearer token.
+    supplied = request.headers.get("Authorization", "").encode()
+    if not hmac.compare_digest(supplied, f"Bearer {settings.metrics_token}".encode()):
+        raise web.HTTPUnauthorized(headers={"WWW-Authenticate": "Bearer"})
+    snapshot = metrics.snapshot()
+    snapshot["ratios"] = {
+        "cache.user.hit_ratio": metrics.ratio("cache.user.hit", "cache.user.miss"),
+        "cache.catalog.hit_ratio": metrics.ratio("cache.catalog.hit", "cache.catalog.miss"),
+    }
+    snapshot["db_pool"] = pool_stats()
+    if _launched():
+        # The rest is this worker only; any worker may answer on a shared port.
+        snapshot["cluster"] = await cluster_metrics.collect(settings.metrics_publish_interval)
+    return web.json_response(snapshot)
 
 
 async def start_handler(message: types.Message):
-    async with AsyncSessionLocal() as db:
-        await get_or_create_user(
-            db=db,
-            telegram_id=message.from_user.id,
-            username=message.from_user.username,
-            first_name=message.from_user.first_name,
-            last_name=message.from_user.last_name,
-            role="unassigned",
-        )
-
-    await message.answer(
+    # UserContextMiddleware has already registered the sender.
+    return message.answer(
         "Welcome to Velvet Rooms 👋\n"
         "Choose your role to continue (you can switch later):",
         reply_markup=_role_selection_keyboard(),
@@ -135,6 +200,9 @@ def _client_menu_keyboard() -> InlineKeyboardMarkup:
             InlineKeyboardButton(text="🖼️ Browse Content", callback_data="action:list_content"),
             InlineKeyboardButton(text="💳 Buy Content", callback_data="action:buy_content"),
         ],
+        [
+            InlineKeyboardButton(text="📥 My Purchases", callback_data="action:my_purchases"),
+        ],
         [
             InlineKeyboardButton(text="📅 Book Session", callback_data="action:create_session"),
             InlineKeyboardButton(text="⚠️ Dispute Session", callback_data="action:dispute_session"),
@@ -185,12 +253,12 @@ async def _send_role_menu(message: types.Message, role: str):
             "Client dashboard 🧑‍💼\n"
             "You are all set. Choose what to do next."
         )
-    await message.answer(text, reply_markup=keyboard)
+    return message.answer(text, reply_markup=keyboard)
 
 
-async def _send_onboarding_dashboard(message: types.Message, role: str) -> None:
+async def _send_onboarding_dashboard(message: types.Message, role: str):
     if role == "client":
-        await message.answer(
+        return message.answer(
             "Client onboarding 🧑‍💼\n"
             "Register to unlock bookings and purchases.\n\n"
             "What you'll get:\n"
@@ -200,10 +268,9 @@ async def _send_onboarding_dashboard(message: types.Message, role: str) -> None:
             "Step 1: Tap register below.",
             reply_markup=_client_onboarding_keyboard(),
         )
-        return
 
     if role == "model":
-        await message.answer(
+        return message.answer(
             "Model onboarding ✨\n"
             "Register to start earning.\n\n"
             "What you'll get:\n"
@@ -213,7 +280,6 @@ async def _send_onboarding_dashboard(message: types.Message, role: str) -> None:
             "Step 1: Tap register below.",
             reply_markup=_model_onboarding_keyboard(),
         )
-        return
 
 
 def _admin_webhook_base_url() -> str:
@@ -221,19 +287,11 @@ def _admin_webhook_base_url() -> str:
 
 
 async def _get_user_or_prompt_role(
-    message: types.Message, user_id: int
+    message: types.Message, user: Optional[User]
 ) -> Optional[User]:
-    async with AsyncSessionLocal() as db:
-        user = await get_user_by_telegram_id(db, user_id)
-        if not user:
-            user = await get_or_create_user(
-                db=db,
-                telegram_id=user_id,
-                username=message.from_user.username if message.from_user else None,
-                first_name=message.from_user.first_name if message.from_user else None,
-                last_name=message.from_user.last_name if message.from_user else None,
-                role="unassigned",
-            )
+    if not user:
+        await message.answer("Unable to identify user. Please try again.")
+        return None
     if user.role == "unassigned":
         await message.answer(
             "Please choose your role to continue:",
@@ -243,10 +301,10 @@ async def _get_user_or_prompt_role(
     return user
 
 
-async def _require_role_from_user_id(
-    message: types.Message, user_id: int, role: str
+async def _require_role(
+    message: types.Message, user: Optional[User], role: str
 ) -> Optional[User]:
-    user = await _get_user_or_prompt_role(message, user_id)
+    user = await _get_user_or_prompt_role(message, user)
     if not user:
         return None
     if user.role != role:
@@ -255,199 +313,125 @@ async def _require_role_from_user_id(
     return user
 
 
-async def _require_role(message: types.Message, role: str) -> Optional[User]:
+async def register_model(message: types.Message, state: FSMContext):
     if not message.from_user:
-        await message.answer("Unable to identify user. Please try again.")
-        return None
-    return await _require_role_from_user_id(message, message.from_user.id, role)
+        return message.answer("Unable to identify user. Please try again.")
+    return await _start_registration_flow(message, state, "model")
 
 
-async def register_model(message: types.Message):
+async def register_client(message: types.Message, state: FSMContext):
     if not message.from_user:
-        await message.answer("Unable to identify user. Please try again.")
-        return
-    await _start_registration_flow(message, message.from_user.id, "model")
-
-
-async def register_client(message: types.Message):
-    if not message.from_user:
-        await message.answer("Unable to identify user. Please try again.")
-        return
-    await _start_registration_flow(message, message.from_user.id, "client")
+        return message.answer("Unable to identify user. Please try again.")
+    return await _start_registration_flow(message, state, "client")
 
 
 async def menu_handler(message: types.Message):
-    await message.answer(
+    return message.answer(
         "Choose your role to continue:",
         reply_markup=_role_selection_keyboard(),
     )
 
 
-async def _handle_role_selection(query: CallbackQuery, role: str):
+async def _handle_role_selection(query: CallbackQuery, user: User, role: str):
     await query.answer()
-    async with AsyncSessionLocal() as db:
-        user = await get_or_create_user(
-            db=db,
-            telegram_id=query.from_user.id,
-            username=query.from_user.username,
-            first_name=query.from_user.first_name,
-            last_name=query.from_user.last_name,
-            role="unassigned",
-        )
-
     if user.role == role:
-        await _send_role_menu(query.message, role)
-        return
+        return await _send_role_menu(query.message, role)
 
-    await _send_onboarding_dashboard(query.message, role)
+    return await _send_onboarding_dashboard(query.message, role)
 
 
-async def _handle_register_selection(query: CallbackQuery, role: str):
-    async with AsyncSessionLocal() as db:
-        user = await get_or_create_user(
-            db=db,
-            telegram_id=query.from_user.id,
-            username=query.from_user.username,
-            first_name=query.from_user.first_name,
-            last_name=query.from_user.last_name,
-            role="unassigned",
-        )
-        if user.role != "unassigned" and user.role != role:
-            await query.answer("You already registered in another role.")
-            return
+async def _handle_register_selection(
+    query: CallbackQuery, user: User, state: FSMContext, role: str
+):
+    if user.role != "unassigned" and user.role != role:
+        return query.answer("You already registered in another role.")
 
-        await query.answer()
-        await _start_registration_flow(query.message, query.from_user.id, role)
+    await query.answer()
+    return await _start_registration_flow(query.message, state, role)
 
 
-async def _start_registration_flow(message: types.Message, user_id: int, role: str):
-    PENDING_REGISTRATIONS[user_id] = {"role": role, "step": "email"}
-    await message.answer(
+async def _start_registration_flow(message: types.Message, state: FSMContext, role: str):
+    await state.set_state(Registration.email)
+    await state.set_data({"role": role})
+    return message.answer(
         "Please send your email to complete registration.",
     )
 
 
 async def _send_usage(message: types.Message, text: str):
-    await message.answer(text)
+    return message.answer(text)
 
 
 def _looks_like_email(value: str) -> bool:
     return "@" in value and "." in value
 
 
-async def registration_input_handler(message: types.Message):
-    if not message.from_user:
-        return
-    user_id = message.from_user.id
-    if user_id not in PENDING_REGISTRATIONS:
-        return
+async def registration_input_handler(
+    message: types.Message, db: AsyncSession, user: User, state: FSMContext
+):
     if not message.text:
-        await message.answer("Please send text for registration.")
-        return
+        return message.answer("Please send text for registration.")
     if message.text.strip().startswith("/"):
-        await message.answer("Please finish registration before using commands.")
-        return
+        return message.answer("Please finish registration before using commands.")
 
-    state = PENDING_REGISTRATIONS[user_id]
-    role = state["role"]
-    step = state["step"]
+    data = await state.get_data()
+    role = data.get("role")
+    step = await state.get_state()
     text = message.text.strip()
+    if role not in ("client", "model"):
+        await state.clear()
+        return message.answer(
+            "Your registration expired. Choose your role to start again:",
+            reply_markup=_role_selection_keyboard(),
+        )
 
-    if step == "email":
+    if step == Registration.email.state:
         if not _looks_like_email(text):
-            await message.answer("That doesn't look like a valid email. Try again.")
-            return
+            return message.answer("That doesn't look like a valid email. Try again.")
 
-        async with AsyncSessionLocal() as db:
-            user = await get_or_create_user(
-                db=db,
-                telegram_id=user_id,
-                username=message.from_user.username,
-                first_name=message.from_user.first_name,
-                last_name=message.from_user.last_name,
-                role="unassigned",
-            )
-            user.email = text
-            await db.commit()
-            await db.refresh(user)
+        if role == "model":
+            await update_user_email(db, user, text)
+            await state.set_state(Registration.display_name)
+            return message.answer("Great! Send your display name.")
 
-            if role == "model":
-                state["step"] = "display_name"
-                await message.answer("Great! Send your display name.")
-                return
-
-            await update_user_role(db, user, "client")
-            profile = await db.execute(
-                select(ClientProfile).where(ClientProfile.user_id == user.id)
-            )
-            if not profile.scalar_one_or_none():
-                db.add(ClientProfile(user_id=user.id))
-                await db.commit()
-            PENDING_REGISTRATIONS.pop(user_id, None)
+        await complete_client_registration(db, user, text)
+        await state.clear()
 
         await message.answer("Client registration complete ✅")
-        await _send_role_menu(message, "client")
-        return
+        return await _send_role_menu(message, "client")
 
-    if step == "display_name":
+    if step == Registration.display_name.state:
         if len(text) < 2:
-            await message.answer("Display name is too short. Try again.")
-            return
-        async with AsyncSessionLocal() as db:
-            user = await get_or_create_user(
-                db=db,
-                telegram_id=user_id,
-                username=message.from_user.username,
-                first_name=message.from_user.first_name,
-                last_name=message.from_user.last_name,
-                role="unassigned",
-            )
-            await update_user_role(db, user, "model")
-            profile = await db.execute(
-                select(ModelProfile).where(ModelProfile.user_id == user.id)
-            )
-            model_profile = profile.scalar_one_or_none()
-            if not model_profile:
-                model_profile = ModelProfile(
-                    user_id=user.id,
-                    display_name=text,
-                )
-                db.add(model_profile)
-                await db.commit()
-            else:
-                model_profile.display_name = text
-                await db.commit()
-
-            PENDING_REGISTRATIONS.pop(user_id, None)
+            return message.answer("Display name is too short. Try again.")
+        await complete_model_registration(db, user, text)
+        await state.clear()
 
         await message.answer("Model registration complete ✅")
-        await _send_role_menu(message, "model")
-        return
+        return await _send_role_menu(message, "model")
 
 
-async def callback_handler(query: CallbackQuery):
+async def callback_handler(
+    query: CallbackQuery, db: AsyncSession, user: User, state: FSMContext
+):
     data = query.data or ""
     if data.startswith("role:"):
         role = data.split(":", 1)[1]
-        await _handle_role_selection(query, role)
-        return
+        return await _handle_role_selection(query, user, role)
 
     if data.startswith("register:"):
         role = data.split(":", 1)[1]
-        await _handle_register_selection(query, role)
-        return
+        return await _handle_register_selection(query, user, state, role)
 
     if data == "menu:role_select":
         await query.answer()
-        await query.message.answer(
+        return query.message.answer(
             "Choose your role to continue:",
             reply_markup=_role_selection_keyboard(),
         )
-        return
 
     if data == "menu:learn_more":
         await query.answer()
-        await query.message.answer(
+        return query.message.answer(
             "Velvet Rooms is a curated space for premium sessions and content.\n\n"
             "Clients:\n"
             "• Discover premium content\n"
@@ -457,11 +441,10 @@ async def callback_handler(query: CallbackQuery):
             "• Run sessions end-to-end",
             reply_markup=_role_selection_keyboard(),
         )
-        return
 
     if data == "info:client":
         await query.answer()
-        await query.message.answer(
+        return query.message.answer(
             "Client guide 🧑‍💼\n"
             "1) Register as a client\n"
             "2) Browse content or book a session\n"
@@ -469,11 +452,10 @@ async def callback_handler(query: CallbackQuery):
             "Need help? Use /menu to return.",
             reply_markup=_client_onboarding_keyboard(),
         )
-        return
 
     if data == "info:model":
         await query.answer()
-        await query.message.answer(
+        return query.message.answer(
             "Model guide ✨\n"
             "1) Register as a model\n"
             "2) Add content to your catalog\n"
@@ -481,99 +463,105 @@ async def callback_handler(query: CallbackQuery):
             "Need help? Use /menu to return.",
             reply_markup=_model_onboarding_keyboard(),
         )
-        return
 
     if data == "menu:main":
         await query.answer()
-        await query.message.answer(
+        return query.message.answer(
             "Choose your role to continue:",
             reply_markup=_role_selection_keyboard(),
         )
-        return
 
     if data == "action:list_content":
         await query.answer()
-        await list_content_handler(query.message)
-        return
+        return await list_content_handler(query.message, db)
 
     if data == "action:my_content":
         await query.answer()
-        await _send_my_content(query.message, query.from_user.id)
-        return
+        return await _send_my_content(query.message, db, user)
+
+    if data.startswith("catalog:"):
+        await query.answer()
+        after_id, before_id = _parse_page_cursor(data)
+        return await list_content_handler(
+            query.message, db, after_id=after_id, before_id=before_id, edit=True
+        )
+
+    if data == "action:my_purchases":
+        await query.answer()
+        return await _send_my_purchases(query.message, db, user)
+
+    if data.startswith("mypurchases:send:"):
+        return await _deliver_purchase_page(query, user, data)
+
+    if data.startswith("mypurchases:"):
+        await query.answer()
+        after_id, before_id = _parse_page_cursor(data)
+        return await _send_my_purchases(
+            query.message, db, user, after_id=after_id, before_id=before_id, edit=True
+        )
+
+    if data.startswith("mycontent:"):
+        await query.answer()
+        after_id, before_id = _parse_page_cursor(data)
+        return await _send_my_content(
+            query.message, db, user, after_id=after_id, before_id=before_id, edit=True
+        )
 
     if data == "action:add_content":
         await query.answer()
-        await _send_usage(
+        return await _send_usage(
             query.message,
             "Usage: /add_content <type> <price> <title> | <description>",
         )
-        return
 
     if data == "action:buy_content":
         await query.answer()
-        await _send_usage(query.message, "Usage: /buy_content <content_id>")
-        return
+        return await _send_usage(query.message, "Usage: /buy_content <content_id> [<content_id> ...]")
 
     if data == "action:create_session":
         await query.answer()
-        await _send_usage(
+        return await _send_usage(
             query.message,
             "Usage: /create_session <model_telegram_id> <type> <price>",
         )
-        return
 
     if data == "action:start_session":
         await query.answer()
-        await _send_usage(query.message, "Usage: /start_session <session_ref>")
-        return
+        return await _send_usage(query.message, "Usage: /start_session <session_ref>")
 
     if data == "action:end_session":
         await query.answer()
-        await _send_usage(query.message, "Usage: /end_session <session_ref>")
-        return
+        return await _send_usage(query.message, "Usage: /end_session <session_ref>")
 
     if data == "action:dispute_session":
         await query.answer()
-        await _send_usage(
+        return await _send_usage(
             query.message,
             "Usage: /dispute_session <session_ref> <reason>",
         )
-        return
 
 
 async def admin_start_handler(message: types.Message):
     if not _is_admin(message.from_user.id if message.from_user else None):
-        await message.answer("Admin access required.")
-        return
-    await message.answer("Admin dashboard 🛡️", reply_markup=_admin_menu_keyboard())
+        return message.answer("Admin access required.")
+    return message.answer("Admin dashboard 🛡️", reply_markup=_admin_menu_keyboard())
 
 
 async def admin_release_escrow_handler(message: types.Message):
     if not _is_admin(message.from_user.id if message.from_user else None):
-        await message.answer("Admin access required.")
-        return
+        return message.answer("Admin access required.")
 
     args = _parse_args(message)
     if len(args) < 1:
-        await message.answer("Usage: /release_escrow <session_ref>")
-        return
+        return message.answer("Usage: /release_escrow <session_ref>")
 
     session_ref = args[0]
     async with AsyncSessionLocal() as db:
         session = await get_session_by_ref(db, session_ref)
         if not session:
-            await message.answer("Session not found.")
-            return
+            return message.answer("Session not found.")
 
-        result = await db.execute(
-            select(EscrowAccount).where(EscrowAccount.session_id == session.id)
-        )
-        escrow_obj = result.scalar_one_or_none()
-        if not escrow_obj:
-            await message.answer("Escrow record not found.")
-            return
-
-        await set_escrow_status(db, escrow_obj, "released")
+        # The audit row and log message commit with the release, or are discarded if it loses.
         db.add(
             AdminAction(
                 admin_id=message.from_user.id,
@@ -584,28 +572,31 @@ async def admin_release_escrow_handler(message: types.Message):
                 details={"session_ref": session_ref},
             )
         )
-        await db.commit()
-        await message.answer(f"Escrow released for {session_ref}.")
-        if settings.escrow_log_channel_id:
-            await message.bot.send_message(
-                settings.escrow_log_channel_id,
-                f"Escrow released for session {session_ref} by admin {message.from_user.id}",
+        enqueue_notification(
+            db,
+            settings.escrow_log_channel_id,
+            f"Escrow released for session {session_ref} by admin {message.from_user.id}",
+            sender=SENDER_ADMIN,
+        )
+        escrow_obj = await transition_escrow(db, session.id, "released")
+        if not escrow_obj:
+            return message.answer(
+                f"Escrow for {session_ref} is not held (missing, disputed or already released)."
             )
 
+        return message.answer(f"Escrow released for {session_ref}.")
+
 
 async def admin_callback_handler(query: CallbackQuery):
     if not _is_admin(query.from_user.id):
-        await query.answer("Admin access required.", show_alert=True)
-        return
+        return query.answer("Admin access required.", show_alert=True)
     data = query.data or ""
     if data == "admin:release_escrow":
         await query.answer()
-        await query.message.answer("Usage: /release_escrow <session_ref>")
-        return
+        return query.message.answer("Usage: /release_escrow <session_ref>")
     if data == "admin:home":
         await query.answer()
-        await query.message.answer("Admin dashboard 🛡️", reply_markup=_admin_menu_keyboard())
-        return
+        return query.message.answer("Admin dashboard 🛡️", reply_markup=_admin_menu_keyboard())
 
 
 
@@ -615,266 +606,476 @@ def _parse_args(message: types.Message) -> List[str]:
     return message.text.strip().split()[1:]
 
 
-async def create_session_handler(message: types.Message):
-    user = await _require_role(message, "client")
+async def create_session_handler(message: types.Message, db: AsyncSession, user: Optional[User]):
+    user = await _require_role(message, user, "client")
     if not user:
         return
 
     args = _parse_args(message)
     if len(args) < 3:
-        await message.answer("Usage: /create_session <model_telegram_id> <type> <price>")
-        return
+        return message.answer("Usage: /create_session <model_telegram_id> <type> <price>")
 
     try:
         model_telegram_id = int(args[0])
         session_type = args[1]
         price = float(args[2])
     except ValueError:
-        await message.answer("Invalid arguments. Example: /create_session 123456 video 50")
-        return
+        return message.answer("Invalid arguments. Example: /create_session 123456 video 50")
 
-    async with AsyncSessionLocal() as db:
-        client = await get_or_create_user(
-            db=db,
-            telegram_id=message.from_user.id,
-            username=message.from_user.username,
-            first_name=message.from_user.first_name,
-            last_name=message.from_user.last_name,
-            role="client",
-        )
-        model = await get_user_by_telegram_id(db, model_telegram_id)
-        if not model or model.role != "model":
-            await message.answer("Model not found or not registered as model.")
-            return
+    model = await get_cached_user(db, model_telegram_id)
+    if not model or model.role != "model":
+        return message.answer("Model not found or not registered as model.")
 
-        session = await create_session_with_escrow(db, client, model, session_type, price)
-        await message.answer(
-            f"Session created: {session.session_ref}\n"
-            f"Status: {session.status}\n"
-            "Escrow: held"
-        )
+    session = await create_session_with_escrow(db, user, model, session_type, price)
+    return message.answer(
+        f"Session created: {session.session_ref}\n"
+        f"Status: {session.status}\n"
+        "Escrow: held"
+    )
 
 
-async def start_session_handler(message: types.Message):
-    user = await _require_role(message, "model")
+async def start_session_handler(message: types.Message, db: AsyncSession, user: Optional[User]):
+    user = await _require_role(message, user, "model")
     if not user:
         return
 
     args = _parse_args(message)
     if len(args) < 1:
-        await message.answer("Usage: /start_session <session_ref>")
-        return
+        return message.answer("Usage: /start_session <session_ref>")
 
     session_ref = args[0]
-    async with AsyncSessionLocal() as db:
-        session = await get_session_by_ref(db, session_ref)
-        if not session:
-            await message.answer("Session not found.")
-            return
-
-        user = await get_user_by_telegram_id(db, message.from_user.id)
-        if not user or user.id != session.model_id:
-            await message.answer("Only the model can start the session.")
-            return
-
-        await set_session_status(db, session, "active")
-        await message.answer(f"Session {session_ref} started.")
+    session = await get_session_by_ref(db, session_ref)
+    if not session:
+        return message.answer("Session not found.")
+
+    if user.id != session.model_id:
+        return message.answer("Only the model can start the session.")
+
+    started = await start_session(db, session)
+    if not started:
+        return message.answer(f"Session {session_ref} can't be started from status {session.status}.")
+    await session_timers.schedule_session(
+        started.id, started.scheduled_end, settings.session_warning_minutes * 60
+    )
+    return message.answer(
+        f"Session {session_ref} started. It ends at {started.scheduled_end:%H:%M} UTC."
+    )
 
 
-async def end_session_handler(message: types.Message):
-    user = await _require_role(message, "model")
+async def end_session_handler(message: types.Message, db: AsyncSession, user: Optional[User]):
+    user = await _require_role(message, user, "model")
     if not user:
         return
 
     args = _parse_args(message)
     if len(args) < 1:
-        await message.answer("Usage: /end_session <session_ref>")
-        return
+        return message.answer("Usage: /end_session <session_ref>")
 
     session_ref = args[0]
-    async with AsyncSessionLocal() as db:
-        session = await get_session_by_ref(db, session_ref)
-        if not session:
-            await message.answer("Session not found.")
-            return
+    session = await get_session_by_ref(db, session_ref)
+    if not session:
+        return message.answer("Session not found.")
 
-        user = await get_user_by_telegram_id(db, message.from_user.id)
-        if not user or user.id != session.model_id:
-            await message.answer("Only the model can end the session.")
-            return
+    if user.id != session.model_id:
+        return message.answer("Only the model can end the session.")
 
-        await set_session_status(db, session, "completed")
-        await message.answer(f"Session {session_ref} completed. Awaiting escrow release.")
+    if not await transition_session(db, session.id, "completed"):
+        return message.answer(f"Session {session_ref} can't be ended from status {session.status}.")
+    await session_timers.cancel_session(session.id)
+    return message.answer(f"Session {session_ref} completed. Awaiting escrow release.")
 
 
-async def dispute_session_handler(message: types.Message):
-    user = await _get_user_or_prompt_role(message, message.from_user.id)
+async def dispute_session_handler(message: types.Message, db: AsyncSession, user: Optional[User]):
+    user = await _get_user_or_prompt_role(message, user)
     if not user:
         return
 
     args = _parse_args(message)
     if len(args) < 2:
-        await message.answer("Usage: /dispute_session <session_ref> <reason>")
-        return
+        return message.answer("Usage: /dispute_session <session_ref> <reason>")
 
     session_ref = args[0]
     reason = " ".join(args[1:])
-    async with AsyncSessionLocal() as db:
-        session = await get_session_by_ref(db, session_ref)
-        if not session:
-            await message.answer("Session not found.")
-            return
+    session = await get_session_by_ref(db, session_ref)
+    if not session:
+        return message.answer("Session not found.")
 
-        user = await get_user_by_telegram_id(db, message.from_user.id)
-        if not user or user.id not in {session.client_id, session.model_id}:
-            await message.answer("Only participants can dispute a session.")
-            return
+    if user.id not in {session.client_id, session.model_id}:
+        return message.answer("Only participants can dispute a session.")
 
-        result = await db.execute(
-            select(EscrowAccount).where(EscrowAccount.session_id == session.id)
+    enqueue_notification(
+        db,
+        settings.escrow_log_channel_id,
+        f"Dispute opened for session {session_ref} by user {message.from_user.id}: {reason}",
+    )
+    if not await dispute_session(db, session.id, reason):
+        return message.answer(
+            f"Session {session_ref} can't be disputed: it is {session.status} "
+            "or its escrow is no longer held."
         )
-        escrow_obj = result.scalar_one_or_none()
-        if not escrow_obj:
-            await message.answer("Escrow record not found.")
-            return
 
-        await set_session_status(db, session, "disputed")
-        await set_escrow_status(db, escrow_obj, "disputed", reason=reason)
-        await message.answer(f"Session {session_ref} disputed: {reason}")
-        if settings.escrow_log_channel_id:
-            await message.bot.send_message(
-                settings.escrow_log_channel_id,
-                f"Dispute opened for session {session_ref} by user {message.from_user.id}: {reason}",
-            )
+    await session_timers.cancel_session(session.id)
+    return message.answer(f"Session {session_ref} disputed: {reason}")
+
+
+def _attached_media(message: types.Message) -> Optional[dict]:
+    """media_type, file_id and file_unique_id of the media in a message, if any."""
+    if message.photo:
+        media_type, item = "photo", message.photo[-1]
+    elif message.video:
+        media_type, item = "video", message.video
+    elif message.animation:
+        media_type, item = "animation", message.animation
+    elif message.document:
+        media_type, item = "document", message.document
+    else:
+        return None
+    return {"media_type": media_type, "file_id": item.file_id, "file_unique_id": item.file_unique_id}
+
+
+def _content_announcements(content, author) -> List[dict]:
+    return [
+        {
+            "chat_id": settings.model_dashboard_channel_id,
+            "text": f"New content by @{author}:\n"
+            f"#{content.id} {content.title} - ${content.price}\n"
+            f"{content.description}",
+            "with_media": True,
+        },
+        {
+            # Paid media never goes to the public gallery, only its listing.
+            "chat_id": settings.main_gallery_channel_id,
+            "text": f"New content drop:\n"
+            f"{content.title} - ${content.price}\n"
+            f"{content.description}\n"
+            f"Use /buy_content {content.id} to purchase.",
+            "with_media": False,
+        },
+    ]
 
 
-async def add_content_handler(message: types.Message):
-    user = await _require_role(message, "model")
+async def add_content_handler(message: types.Message, db: AsyncSession, user: Optional[User]):
+    user = await _require_role(message, user, "model")
     if not user:
         return
 
-    parsed = parse_content_args(message.text or "")
+    parsed = parse_content_args(message.text or message.caption or "")
     if not parsed:
-        await message.answer(
-            "Usage: /add_content <type> <price> <title> | <description>"
+        return message.answer(
+            "Usage: /add_content <type> <price> <title> | <description>\n"
+            "Send it as the caption of a photo, video or file to attach the media."
         )
-        return
 
-    async with AsyncSessionLocal() as db:
-        content = await create_content(
-            db=db,
-            model=user,
-            content_type=parsed["content_type"],
-            price=parsed["price"],
-            title=parsed["title"],
-            description=parsed["description"],
+    author = message.from_user.username or message.from_user.id
+    media = _attached_media(message)
+
+    def announce(content):
+        return [(item["chat_id"], item["text"]) for item in _content_announcements(content, author)]
+
+    content = await create_content(
+        db=db,
+        model=user,
+        content_type=parsed["content_type"],
+        price=parsed["price"],
+        title=parsed["title"],
+        description=parsed["description"],
+        telegram_file_id=media["file_id"] if media else None,
+        # With media, the worker announces once the upload is in the media registry.
+        announce=None if media else announce,
+    )
+    if media:
+        queued = await enqueue_job(
+            "media.ingest",
+            {"content_id": content.id, "announcements": _content_announcements(content, author), **media},
         )
-        await message.answer(
-            f"Content created: #{content.id} - {content.title} (${content.price})"
+        if queued is None:
+            # Worker queue unavailable: announce without the media rather than not at all.
+            for chat_id, text in announce(content):
+                enqueue_notification(db, chat_id, text)
+            await db.commit()
+    return message.answer(
+        f"Content created: #{content.id} - {content.title} (${content.price})"
+    )
+
+
+def _parse_page_cursor(data: str) -> tuple[Optional[int], Optional[int]]:
+    """Turn ``<prefix>:next:<id>`` / ``<prefix>:prev:<id>`` into (after_id, before_id)."""
+    parts = data.split(":")
+    if len(parts) != 3 or not parts[2].isdigit():
+        return None, None
+    if parts[1] == "prev":
+        return None, int(parts[2])
+    return int(parts[2]), None
+
+
+def _content_page_view(heading: str, page: ContentPage) -> dict:
+    """Render a page into the JSON-serialisable form the catalog cache stores."""
+    lines = [heading]
+    for item in page.items:
+        lines.append(f"#{item.id} {item.title} - ${item.price}")
+    return {
+        "text": "\n".join(lines),
+        "empty": not page.items,
+        "first_id": page.first_id,
+        "last_id": page.last_id,
+        "has_prev": page.has_prev,
+        "has_next": page.has_next,
+    }
+
+
+def _page_keyboard(view: dict, prefix: str) -> Optional[InlineKeyboardMarkup]:
+    buttons = []
+    if view["has_prev"]:
+        buttons.append(
+            InlineKeyboardButton(text="⬅️ Prev", callback_data=f"{prefix}:prev:{view['first_id']}")
         )
-        if settings.model_dashboard_channel_id:
-            await message.bot.send_message(
-                settings.model_dashboard_channel_id,
-                f"New content by @{message.from_user.username or message.from_user.id}:\n"
-                f"#{content.id} {content.title} - ${content.price}\n"
-                f"{content.description}",
-            )
-        if settings.main_gallery_channel_id:
-            await message.bot.send_message(
-                settings.main_gallery_channel_id,
-                f"New content drop:\n"
-                f"{content.title} - ${content.price}\n"
-                f"{content.description}\n"
-                f"Use /buy_content {content.id} to purchase.",
-            )
+    if view["has_next"]:
+        buttons.append(
+            InlineKeyboardButton(text="Next ➡️", callback_data=f"{prefix}:next:{view['last_id']}")
+        )
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
 
 
-async def list_content_handler(message: types.Message):
-    async with AsyncSessionLocal() as db:
-        content_list = await list_active_content(db)
-        if not content_list:
-            await message.answer("No content available.")
+async def _show_content_page(
+    message: types.Message, text: str, keyboard: Optional[InlineKeyboardMarkup], edit: bool
+):
+    if edit:
+        try:
+            await message.edit_text(text, reply_markup=keyboard)
             return
+        except TelegramBadRequest as exc:
+            if "message is not modified" in exc.message:
+                # Same page again (a double tap); the callback is already answered.
+                return
+    return message.answer(text, reply_markup=keyboard)
+
+
+async def list_content_handler(
+    message: types.Message,
+    db: AsyncSession,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    edit: bool = False,
+):
+    async def render() -> dict:
+        page = await page_active_content(db, after_id=after_id, before_id=before_id)
+        if not page.items and (after_id or before_id):
+            page = await page_active_content(db)
+        return _content_page_view("Available content:", page)
+
+    view = await get_catalog_page(render, after_id=after_id, before_id=before_id)
+    if view["empty"]:
+        return message.answer("No content available.")
+
+    return await _show_content_page(message, view["text"], _page_keyboard(view, "catalog"), edit)
+
+
+async def _send_my_content(
+    message: types.Message,
+    db: AsyncSession,
+    user: Optional[User],
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    edit: bool = False,
+):
+    user = await _require_role(message, user, "model")
+    if not user:
+        return
 
-        lines = ["Available content:"]
-        for item in content_list[:20]:
-            lines.append(f"#{item.id} {item.title} - ${item.price}")
-        await message.answer("\n".join(lines))
+    page = await page_model_content(db, user.id, after_id=after_id, before_id=before_id)
+    if not page.items and (after_id or before_id):
+        page = await page_model_content(db, user.id)
+    if not page.items:
+        return message.answer("You have no content yet.")
 
+    view = _content_page_view("Your content:", page)
+    return await _show_content_page(message, view["text"], _page_keyboard(view, "mycontent"), edit)
 
-async def _send_my_content(message: types.Message, user_id: int):
-    async with AsyncSessionLocal() as db:
-        user = await _require_role_from_user_id(message, user_id, "model")
-        if not user:
-            return
 
-        content_list = await list_model_content(db, user.id)
-        if not content_list:
-            await message.answer("You have no content yet.")
-            return
+async def my_content_handler(message: types.Message, db: AsyncSession, user: Optional[User]):
+    return await _send_my_content(message, db, user)
 
-        lines = ["Your content:"]
-        for item in content_list[:20]:
-            lines.append(f"#{item.id} {item.title} - ${item.price}")
-        await message.answer("\n".join(lines))
 
-
-async def my_content_handler(message: types.Message):
-    if not message.from_user:
-        await message.answer("Unable to identify user. Please try again.")
-        return
-    await _send_my_content(message, message.from_user.id)
+async def _queue_delivery(client: User, chat_id: int, first_id: int, last_id: int) -> bool:
+    """Hand purchases first_id..last_id to the worker; False if the queue is unavailable."""
+    job_id = await enqueue_job(
+        "purchases.deliver",
+        {"client_id": client.id, "chat_id": chat_id, "first_id": first_id, "last_id": last_id},
+    )
+    return job_id is not None
 
 
-async def buy_content_handler(message: types.Message):
-    user = await _require_role(message, "client")
+async def buy_content_handler(message: types.Message, db: AsyncSession, user: Optional[User]):
+    user = await _require_role(message, user, "client")
     if not user:
         return
 
     args = _parse_args(message)
     if len(args) < 1:
-        await message.answer("Usage: /buy_content <content_id>")
-        return
+        return message.answer("Usage: /buy_content <content_id> [<content_id> ...]")
 
     try:
-        content_id = int(args[0])
+        content_ids = list(dict.fromkeys(int(arg) for arg in args))
     except ValueError:
-        await message.answer("Invalid content id.")
+        return message.answer("Invalid content id.")
+    if len(content_ids) > PURCHASES_PAGE_SIZE:
+        return message.answer(f"You can buy up to {PURCHASES_PAGE_SIZE} items at once.")
+
+    purchases = []
+    not_found = []
+    for content_id in content_ids:
+        purchase = await create_purchase(db, content_id, user)
+        if purchase:
+            purchases.append(purchase)
+        else:
+            not_found.append(content_id)
+
+    lines = []
+    if purchases:
+        bought = ", ".join(f"#{purchase.content_id}" for purchase in purchases)
+        queued = await _queue_delivery(
+            user, message.chat.id, purchases[0].id, purchases[-1].id
+        )
+        lines.append(f"Purchase recorded for content {bought}.")
+        lines.append(
+            "Your content is on its way." if queued else "Use /my_purchases to get your content."
+        )
+    if not_found:
+        missing = ", ".join(f"#{content_id}" for content_id in not_found)
+        lines.append(f"Content not found or inactive: {missing}.")
+    return message.answer("\n".join(lines))
+
+
+def _purchases_keyboard(page: ContentPage) -> InlineKeyboardMarkup:
+    view = {
+        "has_prev": page.has_prev,
+        "has_next": page.has_next,
+        "first_id": page.first_id,
+        "last_id": page.last_id,
+    }
+    paging = _page_keyboard(view, "mypurchases")
+    rows = [
+        [
+            InlineKeyboardButton(
+                text="📥 Send these to me",
+                callback_data=f"mypurchases:send:{page.first_id}:{page.last_id}",
+            )
+        ]
+    ]
+    if paging:
+        rows.extend(paging.inline_keyboard)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+async def _send_my_purchases(
+    message: types.Message,
+    db: AsyncSession,
+    user: Optional[User],
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    edit: bool = False,
+):
+    user = await _require_role(message, user, "client")
+    if not user:
         return
 
-    async with AsyncSessionLocal() as db:
-        content = await get_content_by_id(db, content_id)
-        if not content or not content.is_active:
-            await message.answer("Content not found or inactive.")
-            return
+    page = await page_client_purchases(db, user.id, after_id=after_id, before_id=before_id)
+    if not page.items and (after_id or before_id):
+        page = await page_client_purchases(db, user.id)
+    if not page.items:
+        return message.answer("You have no purchases yet. Use /list_content to browse.")
 
-        await create_purchase(db, content, user)
-        await message.answer(f"Purchase recorded for content #{content_id}.")
+    lines = ["Your purchases:"]
+    for item in page.items:
+        lines.append(f"#{item.content_id} {item.title} - ${item.price_paid}")
+    return await _show_content_page(message, "\n".join(lines), _purchases_keyboard(page), edit)
 
 
-async def on_startup(bot: Bot):
-    await init_redis()
-    webhook_url = f"{_require_webhook_base_url()}{WEBHOOK_PATH}"
-    await bot.set_webhook(webhook_url, drop_pending_updates=True)
+async def my_purchases_handler(message: types.Message, db: AsyncSession, user: Optional[User]):
+    return await _send_my_purchases(message, db, user)
 
 
-async def on_shutdown(bot: Bot):
-    await bot.delete_webhook()
-    await close_redis()
+async def _deliver_purchase_page(query: CallbackQuery, user: Optional[User], data: str):
+    parts = data.split(":")
+    if not user or user.role != "client" or len(parts) != 4 or not (parts[2] + parts[3]).isdigit():
+        return query.answer()
+    queued = await _queue_delivery(user, query.message.chat.id, int(parts[2]), int(parts[3]))
+    return query.answer("Sending your content…" if queued else "Please try again in a moment.")
+
+
+def build_bots() -> tuple[Bot, Optional[Bot]]:
+    """The main bot and, if ADMIN_BOT_TOKEN is set, the admin bot."""
+    bot = Bot(token=_require_bot_token(), session=_bot_session())
+    admin_bot = None
+    if settings.admin_bot_token:
+        admin_bot = Bot(token=settings.admin_bot_token, session=_bot_session())
+    return bot, admin_bot
+
+
+async def set_webhooks(bot: Bot, admin_bot: Optional[Bot] = None):
+    calls = [bot.set_webhook(f"{_require_webhook_base_url()}{WEBHOOK_PATH}", drop_pending_updates=True)]
+    if admin_bot:
+        admin_webhook_base = _admin_webhook_base_url()
+        if not admin_webhook_base:
+            raise RuntimeError("ADMIN_BOT_WEBHOOK_BASE_URL is required")
+        calls.append(
+            admin_bot.set_webhook(f"{admin_webhook_base}{ADMIN_WEBHOOK_PATH}", drop_pending_updates=True)
+        )
+    await asyncio.gather(*calls)
+
+
+async def delete_webhooks(bot: Bot, admin_bot: Optional[Bot] = None):
+    await asyncio.gather(bot.delete_webhook(), *([admin_bot.delete_webhook()] if admin_bot else []))
+
+
+async def on_startup(bot: Bot, admin_bot: Optional[Bot] = None):
+    # Network round trips that don't depend on each other. Under
+    # bot/launcher.py the launcher sets the webhooks once for all workers.
+    calls = [prewarm_pool()]
+    if settings.webhook_register:
+        calls.append(set_webhooks(bot, admin_bot))
+    await asyncio.gather(*calls)
+
+
+async def on_shutdown(bot: Bot, admin_bot: Optional[Bot] = None):
+    if settings.webhook_register:
+        await delete_webhooks(bot, admin_bot)
+    await cache.close_redis()
     await bot.session.close()
+    if admin_bot:
+        await admin_bot.session.close()
+    await engine.dispose()
 
 
-def main():
-    _init_sentry()
+def _launched() -> bool:
+    """True in a worker of bot/launcher.py, which shares the port with other processes."""
+    return settings.webhook_socket_fd is not None
 
-    bot = Bot(token=_require_bot_token())
-    dp = Dispatcher()
 
-    admin_bot = None
+def _signal_ready() -> None:
+    """Tell bot/launcher.py this worker is about to serve."""
+    if settings.webhook_ready_fd is not None:
+        os.write(settings.webhook_ready_fd, b"1")
+        os.close(settings.webhook_ready_fd)
+
+
+def main():
+    init_sentry()
+
+    bot, admin_bot = build_bots()
+    dp = Dispatcher(storage=_build_fsm_storage())
+    dp.update.outer_middleware(UpdateDeduplicationMiddleware(SENDER_MAIN))
+    if settings.rate_limit_enabled:
+        throttling = ThrottlingMiddleware()
+        dp.message.outer_middleware(throttling)
+        dp.callback_query.outer_middleware(throttling)
+    dp.message.middleware(UserContextMiddleware())
+    dp.callback_query.middleware(UserContextMiddleware())
+
     admin_dp = None
-    if settings.admin_bot_token:
-        admin_bot = Bot(token=settings.admin_bot_token)
+    if admin_bot:
         admin_dp = Dispatcher()
+        admin_dp.update.outer_middleware(UpdateDeduplicationMiddleware(SENDER_ADMIN))
 
     dp.message.register(start_handler, Command("start"))
     dp.message.register(menu_handler, Command("menu"))
@@ -888,45 +1089,78 @@ def main():
     dp.message.register(list_content_handler, Command("list_content"))
     dp.message.register(my_content_handler, Command("my_content"))
     dp.message.register(buy_content_handler, Command("buy_content"))
+    dp.message.register(my_purchases_handler, Command("my_purchases"))
     dp.callback_query.register(callback_handler)
-    dp.message.register(registration_input_handler)
+    dp.message.register(
+        registration_input_handler,
+        StateFilter(Registration.email, Registration.display_name),
+        flags={USER_PROFILES_FLAG: True},
+    )
 
     if admin_dp and admin_bot:
         admin_dp.message.register(admin_start_handler, Command("start"))
         admin_dp.message.register(admin_release_escrow_handler, Command("release_escrow"))
         admin_dp.callback_query.register(admin_callback_handler)
 
+    scheduler = None
+    if settings.webhook_mode == "ordered":
+        scheduler = UpdateScheduler(
+            settings.update_concurrency,
+            settings.update_queue_size,
+            settings.update_queue_timeout,
+            shared_lanes=_launched(),
+        )
+    elif settings.webhook_mode != "inline":
+        raise RuntimeError("WEBHOOK_MODE must be 'ordered' or 'inline'")
+
+    def request_handler(dispatcher: Dispatcher, dispatcher_bot: Bot, namespace: str):
+        if scheduler is None:
+            return InlineRequestHandler(dispatcher, dispatcher_bot)
+        return OrderedRequestHandler(dispatcher, dispatcher_bot, scheduler, namespace)
+
+    publisher: Optional[asyncio.Task] = None
+
     async def handle_startup(app: web.Application):
-        await on_startup(bot)
-        if admin_bot:
-            admin_webhook_base = _admin_webhook_base_url()
-            if not admin_webhook_base:
-                raise RuntimeError("ADMIN_BOT_WEBHOOK_BASE_URL is required")
-            await admin_bot.set_webhook(
-                f"{admin_webhook_base}{ADMIN_WEBHOOK_PATH}",
-                drop_pending_updates=True,
+        nonlocal publisher
+        if scheduler is not None:
+            scheduler.start()
+        await on_startup(bot, admin_bot)
+        if _launched():
+            publisher = asyncio.create_task(
+                cluster_metrics.publish_forever(settings.metrics_publish_interval)
             )
+        startup_profile["ready"] = time.time()
+        _signal_ready()
 
     async def handle_shutdown(app: web.Application):
-        await on_shutdown(bot)
-        if admin_bot:
-            await admin_bot.delete_webhook()
-            await admin_bot.session.close()
-
-    app = web.Application()
+        if scheduler is not None:
+            # Finish queued updates while the bots can still reply.
+            await scheduler.close(settings.update_drain_timeout)
+        if publisher is not None:
+            publisher.cancel()
+            await cluster_metrics.withdraw()
+        await on_shutdown(bot, admin_bot)
+
+    startup_profile = {"imports_done": _IMPORTS_DONE}
+    middlewares = [_startup_profile_middleware(startup_profile)] if settings.startup_profile else []
+    app = web.Application(middlewares=middlewares)
     app.on_startup.append(handle_startup)
     app.on_shutdown.append(handle_shutdown)
+    if settings.metrics_token:
+        app.router.add_get(METRICS_PATH, metrics_handler)
 
-    SimpleRequestHandler(dispatcher=dp, bot=bot).register(app, path=WEBHOOK_PATH)
+    request_handler(dp, bot, SENDER_MAIN).register(app, path=WEBHOOK_PATH)
     if admin_bot and admin_dp:
-        SimpleRequestHandler(dispatcher=admin_dp, bot=admin_bot).register(
-            app, path=ADMIN_WEBHOOK_PATH
-        )
+        request_handler(admin_dp, admin_bot, SENDER_ADMIN).register(app, path=ADMIN_WEBHOOK_PATH)
     setup_application(app, dp, bot=bot)
     if admin_bot and admin_dp:
         setup_application(app, admin_dp, bot=admin_bot)
 
-    web.run_app(app, host=settings.webhook_host, port=settings.webhook_port)
+    if _launched():
+        # Serve the socket the launcher listens on.
+        web.run_app(app, sock=socket.socket(fileno=settings.webhook_socket_fd))
+    else:
+        web.run_app(app, host=settings.webhook_host, port=settings.webhook_port)
 
 
 if __name__ == "__main__":
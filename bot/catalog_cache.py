@@ -0,0 +1,88 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import cache
+import metrics
+from config import settings
+
+NAMESPACE = "catalog"
+VERSION_KEY = "catalog:version"
+_LOCK_TTL_MS = 5000
+_WAIT_INTERVAL = 0.05
+_WAIT_ATTEMPTS = 20
+
+# Rebuilds in flight in this process, so concurrent misses share one query.
+_inflight: Dict[str, "asyncio.Future[dict]"] = {}
+
+
+def _page_key(version: int, after_id: Optional[int], before_id: Optional[int]) -> str:
+    cursor = f"prev:{before_id}" if before_id is not None else f"next:{after_id or 0}"
+    return f"catalog:v{version}:{cursor}"
+
+
+async def bump_catalog_version() -> None:
+    """Invalidate every cached page; call after any write that changes the catalog."""
+    await cache.incr(VERSION_KEY, namespace=NAMESPACE)
+
+
+async def _rebuild(render: Callable[[], Awaitable[dict]]) -> dict:
+    started = time.perf_counter()
+    page = await render()
+    metrics.observe("catalog.rebuild", time.perf_counter() - started)
+    return page
+
+
+async def _rebuild_shared(key: str, render: Callable[[], Awaitable[dict]]) -> dict:
+    token = await cache.acquire_lock(f"{key}:lock", _LOCK_TTL_MS, namespace=NAMESPACE)
+    if token is None:
+        # Another worker holds the lock: give it a moment to publish the page.
+        for _ in range(_WAIT_ATTEMPTS):
+            await asyncio.sleep(_WAIT_INTERVAL)
+            page = await cache.get_json(key, namespace=NAMESPACE, record=False)
+            if page is not None:
+                return page
+        metrics.incr("catalog.lock_timeout")
+        return await _rebuild(render)
+
+    try:
+        page = await _rebuild(render)
+        await cache.set_json(key, page, ttl=settings.catalog_cache_ttl, namespace=NAMESPACE)
+        return page
+    finally:
+        await cache.release_lock(f"{key}:lock", token, namespace=NAMESPACE)
+
+
+async def get_catalog_page(
+    render: Callable[[], Awaitable[dict]],
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+) -> dict:
+    """Return a rendered catalog page, rebuilding it with ``render`` on a miss.
+
+    Pages are keyed by cursor under the current catalog version, so bumping
+    the version makes every older page unreachable. Misses are coalesced in
+    process and across workers with a short Redis lock.
+    """
+    version = await cache.get_json(VERSION_KEY, namespace=NAMESPACE, record=False) or 0
+    key = _page_key(version, after_id, before_id)
+    page = await cache.get_json(key, namespace=NAMESPACE)
+    if page is not None:
+        return page
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        page = await _rebuild_shared(key, render)
+        future.set_result(page)
+        return page
+    except BaseException as exc:
+        future.set_exception(exc)
+        future.exception()  # mark retrieved when nobody else was waiting
+        raise
+    finally:
+        _inflight.pop(key, None)
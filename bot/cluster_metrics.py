@@ -0,0 +1,79 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from collections import defaultdict
+from typing import Dict
+
+from redis.exceptions import RedisError
+
+import cache
+import metrics
+
+# Hash of worker id -> latest metrics snapshot (JSON).
+KEY = "metrics:bot"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def publish_forever(interval: float) -> None:
+    """Publish this worker's snapshot every ``interval`` seconds, so /metrics on
+    any worker can report all of them."""
+    while True:
+        redis = cache.get_redis()
+        if redis is not None:
+            snapshot = {**metrics.snapshot(), "published_at": time.time()}
+            try:
+                await redis.hset(KEY, WORKER_ID, json.dumps(snapshot))
+                await redis.expire(KEY, int(interval * 3) + 1)
+            except (RedisError, OSError):
+                metrics.incr("cache.metrics.error")
+        await asyncio.sleep(interval)
+
+
+async def withdraw() -> None:
+    redis = cache.get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.hdel(KEY, WORKER_ID)
+    except (RedisError, OSError):
+        metrics.incr("cache.metrics.error")
+
+
+async def collect(interval: float) -> Dict[str, object]:
+    """Counters and gauges summed over the workers that published recently.
+
+    Timings are per worker only (percentiles do not add up) and are left out.
+    Workers silent for three intervals are considered gone and removed.
+    """
+    redis = cache.get_redis()
+    if redis is None:
+        return {}
+    try:
+        published = await redis.hgetall(KEY)
+    except (RedisError, OSError):
+        metrics.incr("cache.metrics.error")
+        return {}
+
+    counters: Dict[str, float] = defaultdict(int)
+    gauges: Dict[str, float] = defaultdict(float)
+    workers, gone = [], []
+    now = time.time()
+    for worker, raw in published.items():
+        snapshot = json.loads(raw)
+        if now - snapshot["published_at"] > interval * 3:
+            gone.append(worker)
+            continue
+        workers.append(worker.decode() if isinstance(worker, bytes) else worker)
+        for name, value in snapshot["counters"].items():
+            counters[name] += value
+        for name, value in snapshot["gauges"].items():
+            gauges[name] += value
+    if gone:
+        try:
+            await redis.hdel(KEY, *gone)
+        except (RedisError, OSError):
+            metrics.incr("cache.metrics.error")
+    return {"workers": sorted(workers), "counters": dict(counters), "gauges": dict(gauges)}
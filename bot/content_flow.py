@@ -1,9 +1,36 @@
-from typing import Optional, List
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Iterable, Optional, List, Sequence, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import Row, Select, func, insert, literal, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models import ContentPurchase, DigitalContent, User
+from catalog_cache import bump_catalog_version
+from models import ClientProfile, ContentPurchase, DigitalContent, ModelProfile, User
+from outbox import enqueue_notification
+
+CATALOG_PAGE_SIZE = 20
+# One library page is delivered as one album, and Telegram albums hold 10 items.
+PURCHASES_PAGE_SIZE = 10
+# Upper bound on purchases delivered by one fulfilment job.
+MAX_DELIVERY_ITEMS = 50
+
+
+@dataclass
+class ContentPage:
+    """One keyset page of (id, title, price) rows, ordered by id."""
+
+    items: List[Row]
+    has_prev: bool
+    has_next: bool
+
+    @property
+    def first_id(self) -> Optional[int]:
+        return self.items[0].id if self.items else None
+
+    @property
+    def last_id(self) -> Optional[int]:
+        return self.items[-1].id if self.items else None
 
 
 def parse_content_args(text: str) -> Optional[dict]:
@@ -45,7 +72,10 @@ async def create_content(
     description: str,
     telegram_file_id: Optional[str] = None,
     preview_file_id: Optional[str] = None,
+    announce: Optional[Callable[[DigitalContent], Iterable[Tuple[Optional[int], str]]]] = None,
 ) -> DigitalContent:
+    """Create a content item; ``announce`` returns (chat_id, text) notifications
+    that are queued in the same transaction once the item has an id."""
     content = DigitalContent(
         model_id=model.id,
         content_type=content_type,
@@ -56,23 +86,136 @@ async def create_content(
         preview_file_id=preview_file_id,
     )
     db.add(content)
+    if announce is not None:
+        await db.flush()
+        for chat_id, text in announce(content):
+            enqueue_notification(db, chat_id, text)
     await db.commit()
     await db.refresh(content)
+    await bump_catalog_version()
     return content
 
 
-async def list_active_content(db: AsyncSession) -> List[DigitalContent]:
+async def set_content_active(db: AsyncSession, content_id: int, is_active: bool) -> bool:
     result = await db.execute(
-        select(DigitalContent).where(DigitalContent.is_active.is_(True)).order_by(DigitalContent.id)
+        update(DigitalContent)
+        .where(DigitalContent.id == content_id, DigitalContent.is_active.is_not(is_active))
+        .values(is_active=is_active)
     )
-    return list(result.scalars().all())
+    await db.commit()
+    if not result.rowcount:
+        return False
+    await bump_catalog_version()
+    return True
 
 
-async def list_model_content(db: AsyncSession, model_id: int) -> List[DigitalContent]:
+async def _keyset_page(
+    db: AsyncSession,
+    stmt: Select,
+    id_column: Any,
+    after_id: Optional[int],
+    before_id: Optional[int],
+    limit: int,
+) -> ContentPage:
+    # Fetch one extra row to learn whether another page exists in that direction.
+    if before_id is not None:
+        result = await db.execute(
+            stmt.where(id_column < before_id).order_by(id_column.desc()).limit(limit + 1)
+        )
+        rows = list(result.all())
+        return ContentPage(
+            items=list(reversed(rows[:limit])),
+            has_prev=len(rows) > limit,
+            has_next=True,
+        )
+
+    if after_id is not None:
+        stmt = stmt.where(id_column > after_id)
+    result = await db.execute(stmt.order_by(id_column).limit(limit + 1))
+    rows = list(result.all())
+    return ContentPage(
+        items=rows[:limit],
+        has_prev=after_id is not None,
+        has_next=len(rows) > limit,
+    )
+
+
+async def _content_page(
+    db: AsyncSession,
+    criteria: Sequence[Any],
+    after_id: Optional[int],
+    before_id: Optional[int],
+    limit: int,
+) -> ContentPage:
+    stmt = select(DigitalContent.id, DigitalContent.title, DigitalContent.price).where(*criteria)
+    return await _keyset_page(db, stmt, DigitalContent.id, after_id, before_id, limit)
+
+
+async def page_active_content(
+    db: AsyncSession,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = CATALOG_PAGE_SIZE,
+) -> ContentPage:
+    return await _content_page(
+        db, [DigitalContent.is_active.is_(True)], after_id, before_id, limit
+    )
+
+
+async def page_model_content(
+    db: AsyncSession,
+    model_id: int,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = CATALOG_PAGE_SIZE,
+) -> ContentPage:
+    return await _content_page(
+        db, [DigitalContent.model_id == model_id], after_id, before_id, limit
+    )
+
+
+async def page_client_purchases(
+    db: AsyncSession,
+    client_id: int,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = PURCHASES_PAGE_SIZE,
+) -> ContentPage:
+    """Keyset page of a client's purchases: (id, content_id, title, price_paid), by purchase id."""
+    stmt = (
+        select(
+            ContentPurchase.id,
+            ContentPurchase.content_id,
+            DigitalContent.title,
+            ContentPurchase.price_paid,
+        )
+        .join(DigitalContent, DigitalContent.id == ContentPurchase.content_id)
+        .where(ContentPurchase.client_id == client_id)
+    )
+    return await _keyset_page(db, stmt, ContentPurchase.id, after_id, before_id, limit)
+
+
+async def get_purchased_content(
+    db: AsyncSession, client_id: int, first_id: int, last_id: int
+) -> List[Row]:
+    """The client's purchases with ids in [first_id, last_id] and what is needed to deliver them."""
     result = await db.execute(
-        select(DigitalContent).where(DigitalContent.model_id == model_id).order_by(DigitalContent.id)
+        select(
+            ContentPurchase.id,
+            DigitalContent.id.label("content_id"),
+            DigitalContent.title,
+            DigitalContent.telegram_file_id,
+            DigitalContent.media_asset_id,
+        )
+        .join(DigitalContent, DigitalContent.id == ContentPurchase.content_id)
+        .where(
+            ContentPurchase.client_id == client_id,
+            ContentPurchase.id.between(first_id, last_id),
+        )
+        .order_by(ContentPurchase.id)
+        .limit(MAX_DELIVERY_ITEMS)
     )
-    return list(result.scalars().all())
+    return list(result.all())
 
 
 async def get_content_by_id(db: AsyncSession, content_id: int) -> Optional[DigitalContent]:
@@ -82,19 +225,55 @@ async def get_content_by_id(db: AsyncSession, content_id: int) -> Optional[Digit
 
 async def create_purchase(
     db: AsyncSession,
-    content: DigitalContent,
+    content_id: int,
     client: User,
-) -> ContentPurchase:
-    purchase = ContentPurchase(
-        content_id=content.id,
-        client_id=client.id,
-        price_paid=content.price,
-    )
-    db.add(purchase)
-
-    content.total_sales += 1
-    content.total_revenue += content.price or 0
+) -> Optional[ContentPurchase]:
+    """Record a purchase and bump every counter it affects in one statement.
 
+    The sales/revenue, model earnings and client spend updates are
+    server-side increments chained as data-modifying CTEs, so concurrent
+    buyers never lose an increment. Returns None if the content does not
+    exist or is inactive.
+    """
+    bumped = (
+        update(DigitalContent)
+        .where(DigitalContent.id == content_id, DigitalContent.is_active.is_(True))
+        .values(
+            total_sales=func.coalesce(DigitalContent.total_sales, 0) + 1,
+            total_revenue=func.coalesce(DigitalContent.total_revenue, 0)
+            + func.coalesce(DigitalContent.price, 0),
+        )
+        .returning(DigitalContent.id, DigitalContent.model_id, DigitalContent.price)
+        .cte("bumped")
+    )
+    amount = func.coalesce(bumped.c.price, 0)
+    earnings = (
+        update(ModelProfile)
+        .where(ModelProfile.user_id == bumped.c.model_id)
+        .values(total_earnings=func.coalesce(ModelProfile.total_earnings, 0) + amount)
+        .cte("earnings")
+    )
+    spent = (
+        update(ClientProfile)
+        .where(ClientProfile.user_id == client.id, select(bumped.c.id).exists())
+        .values(
+            total_spent=func.coalesce(ClientProfile.total_spent, 0)
+            + select(amount).scalar_subquery()
+        )
+        .cte("spent")
+    )
+    stmt = (
+        insert(ContentPurchase)
+        .from_select(
+            ["content_id", "client_id", "price_paid", "purchased_at"],
+            select(bumped.c.id, literal(client.id), bumped.c.price, literal(datetime.utcnow())),
+        )
+        .returning(ContentPurchase)
+        .add_cte(earnings, spent)
+    )
+    result = await db.execute(stmt)
+    purchase = result.scalar_one_or_none()
     await db.commit()
-    await db.refresh(purchase)
+    if purchase:
+        await bump_catalog_version()
     return purchase
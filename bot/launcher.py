@@ -0,0 +1,179 @@
+"""Pre-fork launcher: several bot.py workers serving one webhook port.
+
+The launcher binds WEBHOOK_HOST:WEBHOOK_PORT and hands the listening
+socket to every worker, so connections wait in one accept queue whichever
+workers happen to be running. It sets the webhooks once the workers are
+up and deletes them when it stops; the workers leave them alone.
+
+Signals: SIGHUP replaces the workers one at a time, each new worker
+serving before the old one is told to drain and exit (a rolling restart,
+which also picks up new code). SIGTERM or SIGINT stops everything. A
+worker that dies is started again.
+
+Usage: python launcher.py [--workers N]
+"""
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+import signal
+import socket
+import sys
+from typing import List, Optional
+
+from bot import build_bots, delete_webhooks, set_webhooks
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+BOT_SCRIPT = Path(__file__).resolve().parent / "bot.py"
+_RESPAWN_DELAY = 1.0
+
+
+class Launcher:
+    def __init__(self, workers: int, sock: socket.socket):
+        self.size = workers
+        self.sock = sock
+        self.slots: List[Optional[asyncio.subprocess.Process]] = [None] * workers
+        self._stop = asyncio.Event()
+        self._restart = asyncio.Event()
+        self._watchers: List[asyncio.Task] = []
+
+    async def _spawn(self) -> Optional[asyncio.subprocess.Process]:
+        """Start a worker and wait until it serves; None if it died or took too long."""
+        read_fd, write_fd = os.pipe()
+        env = {
+            **os.environ,
+            "WEBHOOK_SOCKET_FD": str(self.sock.fileno()),
+            "WEBHOOK_READY_FD": str(write_fd),
+            "WEBHOOK_REGISTER": "0",
+        }
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                str(BOT_SCRIPT),
+                cwd=BOT_SCRIPT.parent,
+                env=env,
+                pass_fds=(self.sock.fileno(), write_fd),
+            )
+        finally:
+            os.close(write_fd)
+
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(read_fd, "rb", 0)
+        )
+        try:
+            # The worker's end closes if it exits, which ends the read early.
+            ready = await asyncio.wait_for(reader.read(1), settings.webhook_worker_timeout)
+        except asyncio.TimeoutError:
+            ready = b""
+        except asyncio.CancelledError:
+            await self._retire(process)
+            raise
+        finally:
+            transport.close()
+        if not ready:
+            logger.error("Worker %s did not start serving", process.pid)
+            await self._retire(process)
+            return None
+        logger.info("Worker %s serving", process.pid)
+        return process
+
+    async def _retire(self, process: asyncio.subprocess.Process) -> None:
+        """SIGTERM a worker (it stops accepting, drains its updates and exits); SIGKILL if it hangs."""
+        if process.returncode is None:
+            process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), settings.webhook_worker_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Worker %s did not exit; killing it", process.pid)
+            process.kill()
+            await process.wait()
+
+    def _adopt(self, slot: int, process: asyncio.subprocess.Process) -> None:
+        self.slots[slot] = process
+        self._watchers = [watcher for watcher in self._watchers if not watcher.done()]
+        self._watchers.append(asyncio.create_task(self._watch(slot, process)))
+
+    async def _fill(self, slot: int) -> None:
+        while not self._stop.is_set():
+            process = await self._spawn()
+            if process is not None:
+                self._adopt(slot, process)
+                return
+            await asyncio.sleep(_RESPAWN_DELAY)
+
+    async def _watch(self, slot: int, process: asyncio.subprocess.Process) -> None:
+        code = await process.wait()
+        if self._stop.is_set() or self.slots[slot] is not process:
+            return  # stopped or replaced on purpose
+        logger.error("Worker %s exited with %s; restarting it", process.pid, code)
+        self.slots[slot] = None
+        await asyncio.sleep(_RESPAWN_DELAY)
+        await self._fill(slot)
+
+    async def _rolling_restart(self) -> None:
+        for slot, old in enumerate(self.slots):
+            new = await self._spawn()
+            if new is None:
+                logger.error("Rolling restart aborted; the remaining workers keep running")
+                return
+            self._adopt(slot, new)
+            if old is not None:
+                await self._retire(old)
+        logger.info("Rolling restart complete")
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, self._restart.set)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self._stop.set)
+
+        bot, admin_bot = build_bots()
+        try:
+            await asyncio.gather(*(self._fill(slot) for slot in range(self.size)))
+            await set_webhooks(bot, admin_bot)
+            logger.info("Serving with %s workers", self.size)
+            while not self._stop.is_set():
+                restart = asyncio.create_task(self._restart.wait())
+                stop = asyncio.create_task(self._stop.wait())
+                await asyncio.wait({restart, stop}, return_when=asyncio.FIRST_COMPLETED)
+                restart.cancel()
+                stop.cancel()
+                if self._restart.is_set() and not self._stop.is_set():
+                    self._restart.clear()
+                    await self._rolling_restart()
+        finally:
+            self._stop.set()
+            for watcher in self._watchers:
+                watcher.cancel()
+            try:
+                await delete_webhooks(bot, admin_bot)
+            finally:
+                await asyncio.gather(*(self._retire(p) for p in self.slots if p is not None))
+                await bot.session.close()
+                if admin_bot:
+                    await admin_bot.session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the bot webhooks from several processes")
+    parser.add_argument("--workers", type=int, default=settings.webhook_workers, help="Default: WEBHOOK_WORKERS")
+    args = parser.parse_args()
+    if args.workers > 1 and not settings.redis_url:
+        # FSM state, update de-duplication and lanes would each be per process.
+        raise RuntimeError("REDIS_URL is required to run more than one worker")
+
+    logging.basicConfig(level=logging.INFO)
+    sock = socket.create_server((settings.webhook_host, settings.webhook_port), backlog=1024)
+    try:
+        asyncio.run(Launcher(args.workers, sock).run())
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+
+import cache
+import metrics
+from config import settings
+from db import AsyncSessionLocal
+from rate_limit import Limit, match_rule, take
+from session_flow import resolve_user
+
+# Handler flag: load the user from the DB with model/client profiles attached.
+USER_PROFILES_FLAG = "user_profiles"
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """Open one DB session per update and resolve the sender's User once.
+
+    Handlers receive them as the ``db`` and ``user`` keyword arguments, so they
+    no longer open their own sessions or look the user up again.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        async with AsyncSessionLocal() as db:
+            data["db"] = db
+            data["user"] = None
+            if from_user is not None:
+                data["user"] = await resolve_user(
+                    db=db,
+                    telegram_id=from_user.id,
+                    username=from_user.username,
+                    first_name=from_user.first_name,
+                    last_name=from_user.last_name,
+                    with_profiles=bool(get_flag(data, USER_PROFILES_FLAG, default=False)),
+                )
+            return await handler(event, data)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Token-bucket anti-flood check, registered as an outer middleware.
+
+    It runs before UserContextMiddleware, so a throttled update never
+    opens a DB session. Throttled callbacks get a cheap answer (Telegram
+    keeps the button spinning otherwise); throttled messages are dropped.
+    """
+
+    def __init__(self):
+        self.rules = settings.rate_limits
+        self.default_limit = Limit(settings.rate_limit_user_rate, settings.rate_limit_user_burst)
+        self.global_limit = Limit(settings.rate_limit_global_rate, settings.rate_limit_global_burst)
+
+    @staticmethod
+    def _rule_key(event: TelegramObject) -> str:
+        if isinstance(event, CallbackQuery):
+            return event.data or ""
+        if isinstance(event, Message):
+            text = event.text or event.caption or ""
+            if text.startswith("/"):
+                # "/buy_content@velvet_bot 3" -> "/buy_content"
+                return text.split(maxsplit=1)[0].split("@", 1)[0].lower()
+        return ""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is None:
+            return await handler(event, data)
+
+        rule = match_rule(self._rule_key(event), self.rules)
+        limit = Limit(*self.rules[rule]) if rule in self.rules else self.default_limit
+        decision = await take(from_user.id, rule, limit, self.global_limit)
+        if decision.allowed:
+            metrics.incr("ratelimit.allowed")
+            return await handler(event, data)
+
+        metrics.incr("ratelimit.dropped")
+        metrics.incr(f"ratelimit.dropped.{decision.scope}")
+        metrics.incr(f"ratelimit.rule.{rule}.dropped")
+        if isinstance(event, CallbackQuery):
+            return event.answer(f"Slow down - try again in {max(1, round(decision.retry_after))}s.")
+        return None
+
+
+class UpdateDeduplicationMiddleware(BaseMiddleware):
+    """Drop webhook updates Telegram redelivers, by update_id.
+
+    Registered as an outer update middleware, so a duplicate is dropped
+    before routing, filters or any DB work. The first delivery claims the
+    update_id with SET NX; if it fails, the claim is released so
+    Telegram's retry runs. update_ids are per bot, hence ``namespace``.
+    Without Redis, a bounded in-process record of recent update_ids still
+    catches redeliveries that reach the same process.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self.ttl = settings.update_dedup_ttl
+        self._recent: "OrderedDict[int, None]" = OrderedDict()
+
+    def _seen_locally(self, update_id: int) -> bool:
+        if update_id in self._recent:
+            return True
+        self._recent[update_id] = None
+        if len(self._recent) > settings.update_dedup_local_size:
+            self._recent.popitem(last=False)
+        return False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        key = f"updates:{self.namespace}:{event.update_id}"
+        claimed = await cache.set_once(key, self.ttl, namespace="dedup")
+        if claimed is None:
+            metrics.incr("dedup.fallback")
+            claimed = not self._seen_locally(event.update_id)
+        if not claimed:
+            metrics.incr("dedup.duplicate")
+            metrics.incr(f"dedup.{self.namespace}.duplicate")
+            return None
+
+        try:
+            return await handler(event, data)
+        except Exception:
+            await cache.delete(key, namespace="dedup")
+            self._recent.pop(event.update_id, None)
+            raise
@@ -1,10 +1,28 @@
 import secrets
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence
 
-from sqlalchemy import select
+from sqlalchemy import Row, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from models import User, Session, EscrowAccount
+from config import settings
+from models import AdminAction, ClientProfile, ModelProfile, User, Session, EscrowAccount
+from user_cache import invalidate_user, invalidate_users, load_user, store_user
+
+# Target status -> statuses it may be entered from.
+SESSION_TRANSITIONS = {
+    "active": ("pending",),
+    "completed": ("active",),
+    "disputed": ("pending", "active", "completed"),
+}
+ESCROW_TRANSITIONS = {
+    "released": ("held",),
+    "disputed": ("held",),
+    "refunded": ("held", "disputed"),
+}
 
 
 def generate_session_ref() -> str:
@@ -16,6 +34,41 @@ async def get_user_by_telegram_id(db: AsyncSession, telegram_id: int) -> Optiona
     return result.scalar_one_or_none()
 
 
+async def get_user_with_profiles(db: AsyncSession, telegram_id: int) -> Optional[User]:
+    result = await db.execute(
+        select(User)
+        .options(joinedload(User.model_profile), joinedload(User.client_profile))
+        .where(User.telegram_id == telegram_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_cached_user(db: AsyncSession, telegram_id: int) -> Optional[User]:
+    """Read-through lookup for handlers that only need to read the user."""
+    user = await load_user(telegram_id)
+    if user:
+        return user
+
+    user = await get_user_by_telegram_id(db, telegram_id)
+    if user:
+        await store_user(user)
+    return user
+
+
+USER_IMPORT_BATCH_SIZE = 500
+_PROFILE_FIELDS = ("username", "first_name", "last_name")
+
+
+def _upsert_users_stmt(rows: List[dict]):
+    # New users get ``role``; existing users keep theirs and only have their
+    # Telegram profile fields refreshed.
+    stmt = pg_insert(User).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={field: getattr(stmt.excluded, field) for field in _PROFILE_FIELDS},
+    )
+
+
 async def get_or_create_user(
     db: AsyncSession,
     telegram_id: int,
@@ -24,27 +77,154 @@ async def get_or_create_user(
     last_name: Optional[str],
     role: str,
 ) -> User:
-    user = await get_user_by_telegram_id(db, telegram_id)
-    if user:
-        return user
+    """Insert or refresh the user in one INSERT ... ON CONFLICT ... RETURNING.
 
-    user = User(
+    Race-free for simultaneous updates from the same user, and keeps
+    username/first_name/last_name in sync with Telegram.
+    """
+    stmt = _upsert_users_stmt(
+        [
+            {
+                "telegram_id": telegram_id,
+                "username": username,
+                "first_name": first_name,
+                "last_name": last_name,
+                "role": role,
+            }
+        ]
+    ).returning(User)
+    result = await db.execute(stmt.execution_options(populate_existing=True))
+    user = result.scalar_one()
+    await db.commit()
+    await store_user(user)
+    return user
+
+
+async def upsert_users(
+    db: AsyncSession,
+    users: Iterable[dict],
+    batch_size: int = USER_IMPORT_BATCH_SIZE,
+) -> int:
+    """Bulk variant of get_or_create_user for imports and backfills.
+
+    Each dict needs ``telegram_id`` and may carry username, first_name,
+    last_name and role (default "unassigned"). Commits once per batch and
+    returns the number of rows written.
+    """
+    total = 0
+    batch: List[dict] = []
+
+    async def flush():
+        nonlocal total
+        if not batch:
+            return
+        # ON CONFLICT cannot touch the same row twice in one statement.
+        rows = list({row["telegram_id"]: row for row in batch}.values())
+        await db.execute(_upsert_users_stmt(rows))
+        await db.commit()
+        await invalidate_users([row["telegram_id"] for row in rows])
+        total += len(rows)
+        batch.clear()
+
+    for user in users:
+        batch.append(
+            {
+                "telegram_id": user["telegram_id"],
+                "username": user.get("username"),
+                "first_name": user.get("first_name"),
+                "last_name": user.get("last_name"),
+                "role": user.get("role") or "unassigned",
+            }
+        )
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+    return total
+
+
+async def resolve_user(
+    db: AsyncSession,
+    telegram_id: int,
+    username: Optional[str],
+    first_name: Optional[str],
+    last_name: Optional[str],
+    with_profiles: bool = False,
+) -> User:
+    """Resolve the sender of an update, registering them as unassigned if new.
+
+    With ``with_profiles`` the user is loaded from the DB, attached to ``db``
+    and has ``model_profile``/``client_profile`` populated; otherwise it may be
+    a detached copy served from the user cache.
+    """
+    if with_profiles:
+        user = await get_user_with_profiles(db, telegram_id)
+        if user:
+            return user
+    else:
+        user = await get_cached_user(db, telegram_id)
+        if user and (user.username, user.first_name, user.last_name) == (
+            username,
+            first_name,
+            last_name,
+        ):
+            return user
+
+    # New user or a changed Telegram profile: one upsert round trip.
+    user = await get_or_create_user(
+        db=db,
         telegram_id=telegram_id,
         username=username,
         first_name=first_name,
         last_name=last_name,
-        role=role,
+        role="unassigned",
     )
-    db.add(user)
+    if with_profiles:
+        set_committed_value(user, "model_profile", None)
+        set_committed_value(user, "client_profile", None)
+    return user
+
+
+async def _update_user_columns(db: AsyncSession, user: User, **values) -> User:
+    # Works for detached (cached) users as well as attached ones.
+    await db.execute(update(User).where(User.id == user.id).values(**values))
     await db.commit()
-    await db.refresh(user)
+    for key, value in values.items():
+        set_committed_value(user, key, value)
+    await invalidate_user(user.telegram_id)
     return user
 
 
 async def update_user_role(db: AsyncSession, user: User, role: str) -> User:
-    user.role = role
+    return await _update_user_columns(db, user, role=role)
+
+
+async def update_user_email(db: AsyncSession, user: User, email: str) -> User:
+    return await _update_user_columns(db, user, email=email)
+
+
+async def complete_client_registration(db: AsyncSession, user: User, email: str) -> User:
+    """Set email and role and create the client profile in one commit.
+
+    ``user`` must come from ``get_user_with_profiles``/``resolve_user(with_profiles=True)``.
+    """
+    user.email = email
+    user.role = "client"
+    if user.client_profile is None:
+        user.client_profile = ClientProfile(user_id=user.id)
     await db.commit()
-    await db.refresh(user)
+    await invalidate_user(user.telegram_id)
+    return user
+
+
+async def complete_model_registration(db: AsyncSession, user: User, display_name: str) -> User:
+    """Set the model role and create or rename the model profile in one commit."""
+    user.role = "model"
+    if user.model_profile is None:
+        user.model_profile = ModelProfile(user_id=user.id, display_name=display_name)
+    else:
+        user.model_profile.display_name = display_name
+    await db.commit()
+    await invalidate_user(user.telegram_id)
     return user
 
 
@@ -83,25 +263,226 @@ async def get_session_by_ref(db: AsyncSession, session_ref: str) -> Optional[Ses
     return result.scalar_one_or_none()
 
 
-async def set_session_status(db: AsyncSession, session: Session, status: str):
-    session.status = status
+async def _finish_transition(db: AsyncSession, row):
+    # Whatever the caller added to ``db`` (audit rows etc.) shares the outcome.
+    # A losing UPDATE changed nothing, so instead of a rollback (which would
+    # expire every loaded object) just drop the caller's pending rows.
+    if row is None:
+        for obj in list(db.new):
+            db.expunge(obj)
+        return None
     await db.commit()
-    await db.refresh(session)
+    return row
+
+
+async def transition_session(
+    db: AsyncSession, session_id: int, status: str, **values
+) -> Optional[Session]:
+    """Compare-and-set the session status in one UPDATE ... RETURNING.
 
+    Extra ``values`` are written in the same statement. Returns the updated
+    session, or None if the session is not in a status that may move to
+    ``status`` (including losing a race to another update).
+    """
+    values["status"] = status
+    if status == "completed":
+        values["completed_at"] = datetime.utcnow()
+    result = await db.execute(
+        update(Session)
+        .where(Session.id == session_id, Session.status.in_(SESSION_TRANSITIONS[status]))
+        .values(**values)
+        .returning(Session)
+        .execution_options(populate_existing=True)
+    )
+    return await _finish_transition(db, result.scalar_one_or_none())
+
+
+def session_duration(session_type: Optional[str]) -> timedelta:
+    minutes = settings.session_durations.get(session_type or "", settings.session_default_minutes)
+    return timedelta(minutes=minutes)
+
+
+async def start_session(db: AsyncSession, session: Session) -> Optional[Session]:
+    """Activate a pending session and fix its end time from the session type."""
+    now = datetime.utcnow()
+    return await transition_session(
+        db,
+        session.id,
+        "active",
+        actual_start=now,
+        scheduled_end=now + session_duration(session.session_type),
+    )
 
-async def set_escrow_status(
+
+async def complete_expired_sessions(db: AsyncSession, session_ids: Sequence[int]) -> List[Row]:
+    """Complete the given sessions that are still active and past their end; the caller commits."""
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(Session)
+        .where(
+            Session.id.in_(session_ids),
+            Session.status.in_(SESSION_TRANSITIONS["completed"]),
+            Session.scheduled_end <= now,
+        )
+        .values(status="completed", completed_at=now)
+        .returning(Session.id, Session.session_ref, Session.client_id, Session.model_id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.all()
+
+
+async def get_active_sessions(db: AsyncSession, session_ids: Sequence[int]) -> List[Row]:
+    result = await db.execute(
+        select(Session.id, Session.session_ref, Session.client_id, Session.model_id).where(
+            Session.id.in_(session_ids), Session.status == "active"
+        )
+    )
+    return result.all()
+
+
+async def page_active_session_ends(
+    db: AsyncSession, after: Optional[tuple], limit: int
+) -> List[Row]:
+    """Keyset page of (scheduled_end, id) for active sessions, for re-arming timers."""
+    query = select(Session.scheduled_end, Session.id).where(
+        Session.status == "active", Session.scheduled_end.is_not(None)
+    )
+    if after is not None:
+        query = query.where(tuple_(Session.scheduled_end, Session.id) > tuple_(*after))
+    result = await db.execute(query.order_by(Session.scheduled_end, Session.id).limit(limit))
+    return result.all()
+
+
+async def get_telegram_ids(db: AsyncSession, user_ids: Iterable[int]) -> Dict[int, int]:
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    result = await db.execute(select(User.id, User.telegram_id).where(User.id.in_(user_ids)))
+    return {row.id: row.telegram_id for row in result}
+
+
+async def transition_escrow(
     db: AsyncSession,
-    escrow: EscrowAccount,
+    session_id: int,
     status: str,
     reason: Optional[str] = None,
-):
-    escrow.status = status
+) -> Optional[EscrowAccount]:
+    values = {"status": status}
     if reason is not None:
-        escrow.dispute_reason = reason
-    await db.commit()
-    await db.refresh(escrow)
+        values["dispute_reason"] = reason
+    result = await db.execute(
+        update(EscrowAccount)
+        .where(
+            EscrowAccount.session_id == session_id,
+            EscrowAccount.status.in_(ESCROW_TRANSITIONS[status]),
+        )
+        .values(**values)
+        .returning(EscrowAccount)
+        .execution_options(populate_existing=True)
+    )
+    return await _finish_transition(db, result.scalar_one_or_none())
+
+
+async def dispute_session(db: AsyncSession, session_id: int, reason: str) -> Optional[Session]:
+    """Move the session and its escrow to disputed together in one statement.
+
+    The escrow row is locked first, so a concurrent release or a second
+    dispute either wins outright or finds nothing to update here. Sessions
+    only become disputed through this path, so once the escrow row is ours
+    the session update cannot miss.
+    """
+    session_open = (
+        select(Session.id)
+        .where(Session.id == session_id, Session.status.in_(SESSION_TRANSITIONS["disputed"]))
+        .exists()
+    )
+    escrow = (
+        update(EscrowAccount)
+        .where(
+            EscrowAccount.session_id == session_id,
+            EscrowAccount.status.in_(ESCROW_TRANSITIONS["disputed"]),
+            session_open,
+        )
+        .values(status="disputed", dispute_reason=reason)
+        .returning(EscrowAccount.session_id)
+        .cte("disputed_escrow")
+    )
+    stmt = (
+        update(Session)
+        .where(
+            Session.id == session_id,
+            Session.status.in_(SESSION_TRANSITIONS["disputed"]),
+            select(escrow.c.session_id).exists(),
+        )
+        .values(status="disputed")
+        .returning(*Session.__table__.columns)
+    )
+    # The ORM cannot map RETURNING rows of a statement carrying a DML CTE,
+    # so map them explicitly.
+    result = await db.execute(
+        select(Session).from_statement(stmt).execution_options(populate_existing=True)
+    )
+    return await _finish_transition(db, result.scalar_one_or_none())
 
 
 async def get_escrow_for_session(db: AsyncSession, session_id: int) -> Optional[EscrowAccount]:
     result = await db.execute(select(EscrowAccount).where(EscrowAccount.session_id == session_id))
     return result.scalar_one_or_none()
+
+
+async def release_due_escrows(db: AsyncSession, grace: timedelta, limit: int) -> List[Row]:
+    """Release up to ``limit`` held escrows whose session completed before ``grace`` ago.
+
+    Candidates are locked with ``FOR UPDATE SKIP LOCKED`` and released by a
+    single ``UPDATE ... FROM ... RETURNING``, so concurrent sweepers split the
+    work and a dispute racing the sweep either lands first or finds the
+    escrow already released. One audit row is inserted per release; the
+    caller commits.
+    """
+    cutoff = datetime.utcnow() - grace
+    due = (
+        select(EscrowAccount.id)
+        .join(Session, Session.id == EscrowAccount.session_id)
+        .where(
+            EscrowAccount.status.in_(ESCROW_TRANSITIONS["released"]),
+            Session.status == "completed",
+            Session.completed_at <= cutoff,
+        )
+        .order_by(Session.completed_at)
+        .limit(limit)
+        .with_for_update(of=EscrowAccount, skip_locked=True)
+        .cte("due")
+    )
+    result = await db.execute(
+        update(EscrowAccount)
+        .where(
+            EscrowAccount.id == due.c.id,
+            EscrowAccount.status.in_(ESCROW_TRANSITIONS["released"]),
+            Session.id == EscrowAccount.session_id,
+            Session.status == "completed",
+        )
+        .values(status="released")
+        .returning(
+            EscrowAccount.session_id,
+            EscrowAccount.amount,
+            Session.session_ref,
+            Session.model_id,
+        )
+    )
+    released = result.all()
+    if released:
+        await db.execute(
+            insert(AdminAction),
+            [
+                {
+                    "admin_id": None,
+                    "action_type": "auto_release_escrow",
+                    "target_user_id": row.model_id,
+                    "target_type": "session",
+                    "target_id": row.session_id,
+                    "details": {"session_ref": row.session_ref, "amount": row.amount},
+                }
+                for row in released
+            ],
+        )
+    return released
@@ -0,0 +1,6 @@
+from aiogram.fsm.state import State, StatesGroup
+
+
+class Registration(StatesGroup):
+    email = State()
+    display_name = State()
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import secrets
+import time
+from collections import deque
+from functools import partial
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from redis.exceptions import RedisError
+
+import cache
+import metrics
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[Any]]
+
+# Shared lanes: how long a ticket may stay at the front of a user's lane
+# before the other processes skip it, and how often they check their turn.
+_LANE_TICKET_TTL_MS = 30000
+_LANE_POLL_INTERVAL = 0.02
+
+_POP_IF_HEAD = """
+if redis.call('LINDEX', KEYS[1], 0) == ARGV[1] then
+    return redis.call('LPOP', KEYS[1])
+end
+return false
+"""
+
+
+def lane_key(update: Dict[str, Any]) -> Hashable:
+    """The user an update belongs to, read from the raw JSON without parsing it into models.
+
+    Updates without a user or chat (polls, for example) get their own lane.
+    """
+    for name, event in update.items():
+        if name == "update_id" or not isinstance(event, dict):
+            continue
+        for field in ("from", "user", "chat"):
+            owner = event.get(field)
+            if isinstance(owner, dict) and "id" in owner:
+                return owner["id"]
+        message = event.get("message")
+        if isinstance(message, dict) and isinstance(message.get("chat"), dict):
+            return message["chat"]["id"]
+    return ("update", update.get("update_id"))
+
+
+class UpdateScheduler:
+    """Runs webhook updates in the background: in order per lane, concurrently across lanes.
+
+    A lane is one user of one bot. At most one update per lane runs at a
+    time and the rest wait behind it in arrival order, so multi-step flows
+    (registration) see their messages in sequence. ``concurrency`` workers
+    serve the lanes round-robin. ``max_pending`` bounds the updates
+    accepted but not yet finished; once it is reached, submit() waits up to
+    ``submit_timeout`` for room and then refuses, and the webhook answers
+    503 so Telegram retries later.
+
+    With ``shared_lanes`` (several processes behind one port) lanes are
+    also queued in Redis, so one user's updates never run concurrently in
+    different processes and take turns in the order the processes reached
+    them. Within a process a lane stays FIFO.
+    """
+
+    def __init__(
+        self, concurrency: int, max_pending: int, submit_timeout: float, shared_lanes: bool = False
+    ):
+        self.concurrency = max(1, concurrency)
+        self.submit_timeout = submit_timeout
+        self.shared_lanes = shared_lanes
+        self._capacity = asyncio.Semaphore(max(1, max_pending))
+        self._lanes: Dict[Hashable, Deque[Tuple[float, Job]]] = {}
+        self._ready: "asyncio.Queue[Hashable]" = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._pending = 0
+        self._closing = False
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._work(), name=f"update-worker-{index}")
+                for index in range(self.concurrency)
+            ]
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("updates.queue_depth", self._pending)
+        metrics.set_gauge("updates.lanes", len(self._lanes))
+
+    async def submit(self, key: Hashable, job: Job) -> bool:
+        """Queue ``job`` on lane ``key``; False if the scheduler is full or closing."""
+        if self._closing:
+            return False
+        try:
+            await asyncio.wait_for(self._capacity.acquire(), timeout=self.submit_timeout)
+        except asyncio.TimeoutError:
+            metrics.incr("updates.rejected")
+            return False
+
+        self._pending += 1
+        lane = self._lanes.get(key)
+        if lane is None:
+            self._lanes[key] = deque([(time.perf_counter(), job)])
+            self._ready.put_nowait(key)
+        else:
+            # The lane is queued or running; its worker will come back for this.
+            lane.append((time.perf_counter(), job))
+        metrics.incr("updates.accepted")
+        self._update_gauges()
+        return True
+
+    async def _claim_lane(self, key: Hashable) -> Optional[Tuple[str, str]]:
+        """Wait for this process's turn on a shared lane; (queue key, ticket) to release, if any.
+
+        Each process takes a ticket at the back of the lane's Redis list
+        and runs once it reaches the front. A local lane is serial, so a
+        process has at most one ticket per lane.
+        """
+        if not self.shared_lanes:
+            return None
+        namespace, owner = key
+        if isinstance(owner, tuple):
+            return None  # no user: a lane of its own
+        redis = cache.get_redis()
+        if redis is None:
+            return None
+        queue_key = f"updates:lane:{namespace}:{owner}"
+        ticket = secrets.token_hex(8)
+        started = time.perf_counter()
+        try:
+            await redis.rpush(queue_key, ticket)
+            await redis.pexpire(queue_key, _LANE_TICKET_TTL_MS)
+            head, head_since = None, time.monotonic()
+            while True:
+                current = await redis.lindex(queue_key, 0)
+                if current is None:
+                    # The list expired under us: every ticket was abandoned.
+                    await redis.rpush(queue_key, ticket)
+                elif current.decode() == ticket:
+                    metrics.observe("updates.lane_wait", time.perf_counter() - started)
+                    return queue_key, ticket
+                elif current != head:
+                    head, head_since = current, time.monotonic()
+                elif time.monotonic() - head_since > _LANE_TICKET_TTL_MS / 1000:
+                    # Its process died or hung with the turn; skip it.
+                    await redis.eval(_POP_IF_HEAD, 1, queue_key, head)
+                    metrics.incr("updates.lane_ticket_expired")
+                await asyncio.sleep(_LANE_POLL_INTERVAL)
+        except asyncio.CancelledError:
+            await self._release_lane((queue_key, ticket))
+            raise
+        except (RedisError, OSError):
+            metrics.incr("cache.updates.error")
+            await self._release_lane((queue_key, ticket))
+            return None
+
+    @staticmethod
+    async def _release_lane(claim: Tuple[str, str]) -> None:
+        redis = cache.get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.lrem(claim[0], 1, claim[1])
+        except (RedisError, OSError):
+            metrics.incr("cache.updates.error")
+
+    async def _work(self) -> None:
+        while True:
+            key = await self._ready.get()
+            lane = self._lanes[key]
+            queued_at, job = lane.popleft()
+            claim = await self._claim_lane(key)
+            started = time.perf_counter()
+            metrics.observe("updates.queue_wait", started - queued_at)
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - one bad update must not stop the lane
+                metrics.incr("updates.failed")
+                logger.exception("Update handling failed")
+            finally:
+                if claim is not None:
+                    await self._release_lane(claim)
+                metrics.observe("updates.run", time.perf_counter() - started)
+                self._pending -= 1
+                self._capacity.release()
+                # One update per turn, then to the back of the line, so a busy user can't starve others.
+                if lane:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._lanes[key]
+                self._update_gauges()
+
+    async def close(self, timeout: float) -> None:
+        """Stop accepting updates and give the queued ones ``timeout`` seconds to finish."""
+        self._closing = True
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._pending:
+            logger.warning("Dropping %s queued updates at shutdown", self._pending)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+class OrderedRequestHandler(SimpleRequestHandler):
+    """Webhook handler that acks at once and hands the update to an UpdateScheduler.
+
+    ``namespace`` keeps lanes of different bots apart.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        scheduler: UpdateScheduler,
+        namespace: str,
+        secret_token: Optional[str] = None,
+        **data: Any,
+    ) -> None:
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.scheduler = scheduler
+        self.namespace = namespace
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        accepted = await self.scheduler.submit(
+            (self.namespace, lane_key(update)), partial(self._background_feed_update, bot, update)
+        )
+        if not accepted:
+            return web.Response(status=503, text="Busy, retry later")
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+
+class InlineRequestHandler(SimpleRequestHandler):
+    """Webhook handler that runs each update before answering it.
+
+    A handler that returns its reply (``return message.answer(...)``)
+    instead of awaiting it has the method written into the webhook
+    response, and Telegram executes it: one Bot API round trip fewer per
+    update. Telegram does not report the outcome of such a call.
+    """
+
+    def __init__(
+        self, dispatcher: Dispatcher, bot: Bot, secret_token: Optional[str] = None, **data: Any
+    ) -> None:
+        super().__init__(dispatcher, bot, handle_in_background=False, secret_token=secret_token, **data)
+
+    def _build_response_writer(self, bot: Bot, result: Optional[TelegramMethod[Any]]):
+        if result:
+            metrics.incr("webhook.reply_in_response")
+        return super()._build_response_writer(bot, result)
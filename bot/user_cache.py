@@ -0,0 +1,66 @@
+from datetime import datetime
+from typing import Iterable, Optional
+
+import cache
+from config import settings
+from models import User
+
+NAMESPACE = "user"
+_FIELDS = (
+    "id",
+    "telegram_id",
+    "username",
+    "first_name",
+    "last_name",
+    "email",
+    "role",
+    "status",
+    "wallet_balance",
+)
+
+
+def _key(telegram_id: int) -> str:
+    return f"user:tg:{telegram_id}"
+
+
+def _serialize(user: User) -> dict:
+    data = {field: getattr(user, field) for field in _FIELDS}
+    data["created_at"] = user.created_at.isoformat() if user.created_at else None
+    return data
+
+
+def _deserialize(data: dict) -> User:
+    created_at = data.get("created_at")
+    return User(
+        **{field: data.get(field) for field in _FIELDS},
+        created_at=datetime.fromisoformat(created_at) if created_at else None,
+    )
+
+
+async def load_user(telegram_id: int) -> Optional[User]:
+    """Return a detached User from Redis, or None on a miss.
+
+    The returned object is not attached to any DB session, so writes must go
+    through the session_flow helpers (which invalidate this cache).
+    """
+    data = await cache.get_json(_key(telegram_id), namespace=NAMESPACE)
+    if data is None:
+        return None
+    return _deserialize(data)
+
+
+async def store_user(user: User) -> None:
+    await cache.set_json(
+        _key(user.telegram_id),
+        _serialize(user),
+        ttl=settings.user_cache_ttl,
+        namespace=NAMESPACE,
+    )
+
+
+async def invalidate_user(telegram_id: int) -> None:
+    await cache.delete(_key(telegram_id), namespace=NAMESPACE)
+
+
+async def invalidate_users(telegram_ids: Iterable[int]) -> None:
+    await cache.delete(*(_key(telegram_id) for telegram_id in telegram_ids), namespace=NAMESPACE)
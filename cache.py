@@ -0,0 +1,144 @@
+import json
+import secrets
+from typing import TYPE_CHECKING, Any, Optional
+
+from redis.exceptions import RedisError
+
+import metrics
+from config import settings
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+_redis: Optional["Redis"] = None
+
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def set_redis(client: Optional["Redis"]) -> None:
+    global _redis
+    _redis = client
+
+
+def get_redis() -> Optional["Redis"]:
+    """Return the shared client, creating it from REDIS_URL on first use.
+
+    Creating a client does not connect; the first command does.
+    """
+    global _redis
+    if _redis is None and settings.redis_url:
+        from redis.asyncio import Redis
+
+        _redis = Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.redis_socket_timeout,
+            socket_connect_timeout=settings.redis_socket_timeout,
+        )
+    return _redis
+
+
+async def close_redis() -> None:
+    global _redis
+    client, _redis = _redis, None
+    if client is not None:
+        await client.close()
+
+
+async def get_json(key: str, namespace: str, record: bool = True) -> Optional[Any]:
+    """Read a cached JSON value. Redis failures are counted and treated as a miss.
+
+    ``record=False`` skips the hit/miss counters (e.g. while polling for a
+    value another worker is rebuilding).
+    """
+    redis = get_redis()
+    if redis is None:
+        if record:
+            metrics.incr(f"cache.{namespace}.miss")
+        return None
+    try:
+        raw = await redis.get(key)
+    except (RedisError, OSError):
+        metrics.incr(f"cache.{namespace}.error")
+        if record:
+            metrics.incr(f"cache.{namespace}.miss")
+        return None
+    if record:
+        metrics.incr(f"cache.{namespace}.hit" if raw is not None else f"cache.{namespace}.miss")
+    return json.loads(raw) if raw is not None else None
+
+
+async def set_json(key: str, value: Any, ttl: int, namespace: str) -> None:
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.set(key, json.dumps(value), ex=ttl)
+    except (RedisError, OSError):
+        metrics.incr(f"cache.{namespace}.error")
+
+
+async def delete(*keys: str, namespace: str) -> None:
+    redis = get_redis()
+    if redis is None or not keys:
+        return
+    try:
+        await redis.delete(*keys)
+    except (RedisError, OSError):
+        metrics.incr(f"cache.{namespace}.error")
+
+
+async def incr(key: str, namespace: str) -> Optional[int]:
+    redis = get_redis()
+    if redis is None:
+        return None
+    try:
+        return await redis.incr(key)
+    except (RedisError, OSError):
+        metrics.incr(f"cache.{namespace}.error")
+        return None
+
+
+async def set_once(key: str, ttl: int, namespace: str) -> Optional[bool]:
+    """SET NX ``key`` for ``ttl`` seconds: True if this call set it, False if it
+    already existed, None if Redis could not answer."""
+    redis = get_redis()
+    if redis is None:
+        return None
+    try:
+        return bool(await redis.set(key, 1, nx=True, ex=ttl))
+    except (RedisError, OSError):
+        metrics.incr(f"cache.{namespace}.error")
+        return None
+
+
+async def acquire_lock(key: str, ttl_ms: int, namespace: str) -> Optional[str]:
+    """SET NX a short-lived lock; returns the owner token, or None if it is held.
+
+    Without a reachable Redis there is nobody to coordinate with, so the
+    caller gets an empty token and proceeds on its own.
+    """
+    redis = get_redis()
+    if redis is None:
+        return ""
+    token = secrets.token_hex(8)
+    try:
+        acquired = await redis.set(key, token, nx=True, px=ttl_ms)
+    except (RedisError, OSError):
+        metrics.incr(f"cache.{namespace}.error")
+        return ""
+    return token if acquired else None
+
+
+async def release_lock(key: str, token: str, namespace: str) -> None:
+    redis = get_redis()
+    if redis is None or not token:
+        return
+    try:
+        await redis.eval(_RELEASE_LOCK, 1, key, token)
+    except (RedisError, OSError):
+        metrics.incr(f"cache.{namespace}.error")
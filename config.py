@@ -1,6 +1,6 @@
 import os
-from dataclasses import dataclass
-from typing import Optional, Tuple, List
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple, List
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -24,23 +24,139 @@ def _get_int_with_default(value: Optional[str], default: int) -> int:
     return int(value)
 
 
+def _get_int_map(value: Optional[str]) -> Dict[str, int]:
+    """Parse ``name=4,other=2`` into a dict."""
+    if not value:
+        return {}
+    result = {}
+    for part in value.split(","):
+        if "=" not in part:
+            continue
+        name, number = part.split("=", 1)
+        result[name.strip()] = int(number)
+    return result
+
+
+def _get_rate_map(value: Optional[str]) -> Dict[str, Tuple[float, float]]:
+    """Parse ``/buy_content=0.2/3,catalog:=2/6`` into {prefix: (rate per second, burst)}."""
+    if not value:
+        return {}
+    result = {}
+    for part in value.split(","):
+        if "=" not in part or "/" not in part:
+            continue
+        prefix, limit = part.rsplit("=", 1)
+        rate, burst = limit.split("/", 1)
+        result[prefix.strip()] = (float(rate), float(burst))
+    return result
+
+
+def _get_bool_with_default(value: Optional[str], default: bool) -> bool:
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _get_float_with_default(value: Optional[str], default: float) -> float:
+    if value is None or value == "":
+        return default
+    return float(value)
+
+
 @dataclass(frozen=True)
 class Settings:
     bot_token: Optional[str] = os.getenv("BOT_TOKEN")
     admin_bot_token: Optional[str] = os.getenv("ADMIN_BOT_TOKEN")
     database_url: Optional[str] = os.getenv("DATABASE_URL")
+    # Pool sizing is per process. DB_PGBOUNCER=true disables asyncpg's prepared
+    # statement caches, which break under PgBouncer transaction pooling (Neon's pooler).
+    db_pool_size: int = _get_int_with_default(os.getenv("DB_POOL_SIZE"), 5)
+    db_max_overflow: int = _get_int_with_default(os.getenv("DB_MAX_OVERFLOW"), 10)
+    db_pool_timeout: float = _get_float_with_default(os.getenv("DB_POOL_TIMEOUT"), 30.0)
+    db_pool_recycle: int = _get_int_with_default(os.getenv("DB_POOL_RECYCLE"), 1800)
+    db_pool_pre_ping: bool = _get_bool_with_default(os.getenv("DB_POOL_PRE_PING"), True)
+    db_pool_prewarm: int = _get_int_with_default(os.getenv("DB_POOL_PREWARM"), 2)
+    db_statement_cache_size: int = _get_int_with_default(os.getenv("DB_STATEMENT_CACHE_SIZE"), 100)
+    db_pgbouncer: bool = _get_bool_with_default(os.getenv("DB_PGBOUNCER"), False)
     redis_url: Optional[str] = os.getenv("REDIS_URL")
+    redis_socket_timeout: float = _get_float_with_default(os.getenv("REDIS_SOCKET_TIMEOUT"), 0.5)
+    # Anti-flood token buckets (tokens per second, burst), shared by all bot
+    # processes through Redis. RATE_LIMITS overrides the per-user bucket for
+    # a command or callback-data prefix; the longest matching prefix wins.
+    rate_limit_enabled: bool = _get_bool_with_default(os.getenv("RATE_LIMIT_ENABLED"), True)
+    rate_limit_user_rate: float = _get_float_with_default(os.getenv("RATE_LIMIT_USER_RATE"), 1.0)
+    rate_limit_user_burst: float = _get_float_with_default(os.getenv("RATE_LIMIT_USER_BURST"), 8.0)
+    rate_limit_global_rate: float = _get_float_with_default(os.getenv("RATE_LIMIT_GLOBAL_RATE"), 300.0)
+    rate_limit_global_burst: float = _get_float_with_default(os.getenv("RATE_LIMIT_GLOBAL_BURST"), 600.0)
+    rate_limits: Dict[str, Tuple[float, float]] = field(default_factory=lambda: _get_rate_map(os.getenv("RATE_LIMITS")))
+    # Telegram keeps retrying an unacknowledged update for up to 24 hours.
+    update_dedup_ttl: int = _get_int_with_default(os.getenv("UPDATE_DEDUP_TTL"), 86400)
+    update_dedup_local_size: int = _get_int_with_default(os.getenv("UPDATE_DEDUP_LOCAL_SIZE"), 10000)
+    user_cache_ttl: int = _get_int_with_default(os.getenv("USER_CACHE_TTL"), 300)
+    catalog_cache_ttl: int = _get_int_with_default(os.getenv("CATALOG_CACHE_TTL"), 600)
+    fsm_state_ttl: int = _get_int_with_default(os.getenv("FSM_STATE_TTL"), 3600)
+
+    # Point the bots at a local Bot API server (or a fake one in benchmarks).
+    telegram_api_base_url: Optional[str] = os.getenv("TELEGRAM_API_BASE_URL")
+    # Print import/ready/first-webhook timings once the first update is served.
+    startup_profile: bool = _get_bool_with_default(os.getenv("STARTUP_PROFILE"), False)
 
     webhook_base_url: Optional[str] = os.getenv("WEBHOOK_BASE_URL")
     admin_bot_webhook_base_url: Optional[str] = os.getenv("ADMIN_BOT_WEBHOOK_BASE_URL")
     webhook_host: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
     webhook_port: int = _get_int_with_default(os.getenv("WEBHOOK_PORT"), 8080)
+    # "ordered": ack at once, then run updates in per-user order with at most
+    # update_concurrency in flight and update_queue_size accepted. "inline":
+    # run each update before answering the webhook, which carries the
+    # handler's returned reply, saving a Bot API call per update.
+    webhook_mode: str = os.getenv("WEBHOOK_MODE", "ordered")
+    update_concurrency: int = _get_int_with_default(os.getenv("UPDATE_CONCURRENCY"), 10)
+    update_queue_size: int = _get_int_with_default(os.getenv("UPDATE_QUEUE_SIZE"), 1000)
+    update_queue_timeout: float = _get_float_with_default(os.getenv("UPDATE_QUEUE_TIMEOUT"), 5.0)
+    update_drain_timeout: float = _get_float_with_default(os.getenv("UPDATE_DRAIN_TIMEOUT"), 10.0)
+    # bot/launcher.py: processes serving the webhook port (--workers default).
+    # Workers it starts get the listening socket and a readiness pipe as
+    # inherited fds, and leave webhook registration to it (WEBHOOK_REGISTER=0).
+    webhook_workers: int = _get_int_with_default(os.getenv("WEBHOOK_WORKERS"), 1)
+    webhook_socket_fd: Optional[int] = _get_int(os.getenv("WEBHOOK_SOCKET_FD"))
+    webhook_ready_fd: Optional[int] = _get_int(os.getenv("WEBHOOK_READY_FD"))
+    webhook_register: bool = _get_bool_with_default(os.getenv("WEBHOOK_REGISTER"), True)
+    webhook_worker_timeout: float = _get_float_with_default(os.getenv("WEBHOOK_WORKER_TIMEOUT"), 60.0)
+    # Bearer token for GET /metrics on the webhook port; not served when unset.
+    metrics_token: Optional[str] = os.getenv("METRICS_TOKEN")
+    metrics_publish_interval: float = _get_float_with_default(os.getenv("METRICS_PUBLISH_INTERVAL"), 5.0)
     admin_telegram_ids: Tuple[int, ...] = tuple(_get_int_list(os.getenv("ADMIN_TELEGRAM_IDS")))
 
     main_gallery_channel_id: Optional[int] = _get_int(os.getenv("MAIN_GALLERY_CHANNEL_ID"))
     model_dashboard_channel_id: Optional[int] = _get_int(os.getenv("MODEL_DASHBOARD_CHANNEL_ID"))
     escrow_log_channel_id: Optional[int] = _get_int(os.getenv("ESCROW_LOG_CHANNEL_ID"))
 
+    outbox_batch_size: int = _get_int_with_default(os.getenv("OUTBOX_BATCH_SIZE"), 50)
+    outbox_max_attempts: int = _get_int_with_default(os.getenv("OUTBOX_MAX_ATTEMPTS"), 8)
+    outbox_poll_interval: float = _get_float_with_default(os.getenv("OUTBOX_POLL_INTERVAL"), 1.0)
+    outbox_chat_interval: float = _get_float_with_default(os.getenv("OUTBOX_CHAT_INTERVAL"), 3.0)
+
+    job_default_concurrency: int = _get_int_with_default(os.getenv("JOB_DEFAULT_CONCURRENCY"), 4)
+    # Per queued job type, e.g. JOB_CONCURRENCY="purchases.deliver=8,media.ingest=2"
+    job_concurrency: Dict[str, int] = field(default_factory=lambda: _get_int_map(os.getenv("JOB_CONCURRENCY")))
+    job_max_attempts: int = _get_int_with_default(os.getenv("JOB_MAX_ATTEMPTS"), 5)
+    job_visibility_timeout: int = _get_int_with_default(os.getenv("JOB_VISIBILITY_TIMEOUT"), 120)
+    job_stream_maxlen: int = _get_int_with_default(os.getenv("JOB_STREAM_MAXLEN"), 100000)
+    worker_shutdown_timeout: float = _get_float_with_default(os.getenv("WORKER_SHUTDOWN_TIMEOUT"), 30.0)
+    worker_metrics_port: Optional[int] = _get_int(os.getenv("WORKER_METRICS_PORT"))
+
+    # Session length in minutes by session type, e.g. SESSION_DURATIONS="video=30,voice=20"
+    session_durations: Dict[str, int] = field(default_factory=lambda: _get_int_map(os.getenv("SESSION_DURATIONS")))
+    session_default_minutes: int = _get_int_with_default(os.getenv("SESSION_DEFAULT_MINUTES"), 30)
+    session_warning_minutes: int = _get_int_with_default(os.getenv("SESSION_WARNING_MINUTES"), 5)
+    session_timer_batch_size: int = _get_int_with_default(os.getenv("SESSION_TIMER_BATCH_SIZE"), 500)
+    session_timer_poll_interval: float = _get_float_with_default(os.getenv("SESSION_TIMER_POLL_INTERVAL"), 1.0)
+    session_timer_reseed_interval: float = _get_float_with_default(os.getenv("SESSION_TIMER_RESEED_INTERVAL"), 600.0)
+
+    escrow_release_grace_hours: float = _get_float_with_default(os.getenv("ESCROW_RELEASE_GRACE_HOURS"), 48.0)
+    escrow_release_batch_size: int = _get_int_with_default(os.getenv("ESCROW_RELEASE_BATCH_SIZE"), 100)
+    escrow_sweep_interval: float = _get_float_with_default(os.getenv("ESCROW_SWEEP_INTERVAL"), 300.0)
+
     paystack_secret_key: Optional[str] = os.getenv("PAYSTACK_SECRET_KEY")
     flutterwave_secret_key: Optional[str] = os.getenv("FLUTTERWAVE_SECRET_KEY")
 
@@ -49,6 +165,18 @@ class Settings:
     supabase_url: Optional[str] = os.getenv("SUPABASE_URL")
     supabase_service_key: Optional[str] = os.getenv("SUPABASE_SERVICE_KEY")
     supabase_bucket: str = os.getenv("SUPABASE_BUCKET", "media")
+    # Files at or above this size use resumable (TUS) uploads in chunks of
+    # storage_chunk_size; Supabase expects 6 MB chunks.
+    storage_resumable_threshold: int = _get_int_with_default(os.getenv("STORAGE_RESUMABLE_THRESHOLD"), 6 * 1024 * 1024)
+    storage_chunk_size: int = _get_int_with_default(os.getenv("STORAGE_CHUNK_SIZE"), 6 * 1024 * 1024)
+    storage_timeout: float = _get_float_with_default(os.getenv("STORAGE_TIMEOUT"), 60.0)
+    storage_max_retries: int = _get_int_with_default(os.getenv("STORAGE_MAX_RETRIES"), 5)
+    storage_resume_dir: Optional[str] = os.getenv("STORAGE_RESUME_DIR")
+    storage_concurrency: int = _get_int_with_default(os.getenv("STORAGE_CONCURRENCY"), 8)
+    # Telegram file_ids not confirmed with getFile for this long are re-checked.
+    media_revalidate_days: float = _get_float_with_default(os.getenv("MEDIA_REVALIDATE_DAYS"), 7.0)
+    media_revalidate_batch_size: int = _get_int_with_default(os.getenv("MEDIA_REVALIDATE_BATCH_SIZE"), 100)
+    media_revalidate_interval: float = _get_float_with_default(os.getenv("MEDIA_REVALIDATE_INTERVAL"), 3600.0)
 
     secret_key: Optional[str] = os.getenv("SECRET_KEY")
     encryption_key: Optional[str] = os.getenv("ENCRYPTION_KEY")
@@ -1,14 +1,108 @@
+import asyncio
+import time
+from uuid import uuid4
+
+from sqlalchemy import event, exc, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import metrics
 from config import settings
 
 if not settings.database_url:
     raise RuntimeError("DATABASE_URL is required")
 
-engine = create_async_engine(settings.database_url, echo=False)
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records checkout wait time, timeouts and overflow connections."""
+
+    def _do_get(self):
+        overflow_before = self._overflow
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            metrics.incr("db.pool.timeout")
+            raise
+        finally:
+            # Includes connecting when the pool had to open a new connection.
+            metrics.observe("db.pool.checkout_wait", time.perf_counter() - started)
+        if self._overflow > overflow_before and self._overflow > 0:
+            metrics.incr("db.pool.overflow_connect")
+        return record
+
+
+def _connect_args() -> dict:
+    if settings.db_pgbouncer:
+        # Transaction pooling hands each transaction a different server
+        # connection, so named prepared statements can't be reused or even
+        # relied on to be unique.
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {"prepared_statement_cache_size": settings.db_statement_cache_size}
+
+
+engine = create_async_engine(
+    settings.database_url,
+    echo=False,
+    poolclass=InstrumentedPool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    connect_args=_connect_args(),
+)
 AsyncSessionLocal = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 
+_in_use_peak = 0
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _record_in_use_peak(*_args) -> None:
+    global _in_use_peak
+    in_use = engine.pool.checkedout()
+    if in_use > _in_use_peak:
+        _in_use_peak = in_use
+        metrics.set_gauge("db.pool.in_use_peak", in_use)
+
+
+def pool_stats() -> dict:
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "idle": pool.checkedin(),
+        "in_use": pool.checkedout(),
+        "overflow": max(0, pool.overflow()),
+        "max_overflow": settings.db_max_overflow,
+    }
+
+
+async def prewarm_pool(connections: int = settings.db_pool_prewarm) -> int:
+    """Open ``connections`` pooled connections up front so the first requests
+    don't pay for TCP/TLS setup and authentication."""
+    connections = min(connections, settings.db_pool_size)
+    if connections <= 0:
+        return 0
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(engine.connect().start() for _ in range(connections)), return_exceptions=True
+    )
+    opened = [conn for conn in results if not isinstance(conn, BaseException)]
+    try:
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in opened))
+    finally:
+        # Closing returns them to the pool, still connected.
+        await asyncio.gather(*(conn.close() for conn in opened))
+    metrics.observe("db.pool.prewarm", time.perf_counter() - started)
+    return len(opened)
+
+
 async def get_db_session():
     async with AsyncSessionLocal() as session:
         yield session
@@ -0,0 +1,69 @@
+import json
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+from redis.exceptions import RedisError
+
+import cache
+import metrics
+from config import settings
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+STREAM_PREFIX = "jobs:"
+DEAD_SUFFIX = ":dead"
+DELAYED_KEY = "jobs:delayed"
+GROUP = "workers"
+
+
+def stream_key(job_type: str) -> str:
+    return f"{STREAM_PREFIX}{job_type}"
+
+
+def dead_key(job_type: str) -> str:
+    return f"{STREAM_PREFIX}{job_type}{DEAD_SUFFIX}"
+
+
+def job_fields(payload: Any, attempts: int = 0, enqueued_at: Optional[float] = None) -> dict:
+    return {
+        "payload": json.dumps(payload),
+        "attempts": attempts,
+        "enqueued_at": enqueued_at if enqueued_at is not None else time.time(),
+    }
+
+
+def delayed_member(job_type: str, fields: dict, job_id: str) -> str:
+    # The original id keeps identical payloads from collapsing into one zset member.
+    return json.dumps({"id": job_id, "type": job_type, **fields})
+
+
+async def enqueue_job(
+    job_type: str,
+    payload: Any,
+    delay: float = 0,
+    redis: Optional["Redis"] = None,
+) -> Optional[str]:
+    """Queue a job for the worker; returns its stream id, or None if Redis is unavailable.
+
+    Delivery is at least once, so handlers must be idempotent.
+    """
+    redis = redis or cache.get_redis()
+    if redis is None:
+        metrics.incr("jobs.enqueue_error")
+        return None
+    fields = job_fields(payload)
+    try:
+        if delay > 0:
+            job_id = f"delayed-{time.time_ns()}"
+            await redis.zadd(DELAYED_KEY, {delayed_member(job_type, fields, job_id): time.time() + delay})
+        else:
+            job_id = await redis.xadd(
+                stream_key(job_type), fields, maxlen=settings.job_stream_maxlen, approximate=True
+            )
+            job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+    except (RedisError, OSError):
+        metrics.incr("jobs.enqueue_error")
+        return None
+    metrics.incr(f"jobs.{job_type}.enqueued")
+    return job_id
@@ -0,0 +1,145 @@
+"""Content-hash registry of media and the Telegram file_ids that point at it.
+
+Bytes are stored once in Supabase under their SHA-256. Every bot that has
+sent (or received) an asset records its own file_id, so later deliveries
+reference the file_id instead of uploading the bytes again.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import metrics
+from async_storage import download_data, upload_data
+from config import settings
+from models import MediaAsset, MediaFileId
+
+STORAGE_PREFIX = "media/sha256"
+
+CONTENT_TYPES = {
+    "photo": "image/jpeg",
+    "video": "video/mp4",
+    "animation": "video/mp4",
+}
+
+
+def storage_path_for(sha256: str) -> str:
+    return f"{STORAGE_PREFIX}/{sha256[:2]}/{sha256}"
+
+
+async def get_asset(db: AsyncSession, asset_id: int) -> Optional[MediaAsset]:
+    return await db.get(MediaAsset, asset_id)
+
+
+async def get_assets(db: AsyncSession, asset_ids: Iterable[int]) -> Dict[int, MediaAsset]:
+    ids = set(asset_ids)
+    if not ids:
+        return {}
+    result = await db.execute(select(MediaAsset).where(MediaAsset.id.in_(ids)))
+    return {asset.id: asset for asset in result.scalars().all()}
+
+
+async def find_asset_by_file_unique_id(db: AsyncSession, file_unique_id: str) -> Optional[MediaAsset]:
+    """file_unique_id is the same for every bot, so any bot's record will do."""
+    result = await db.execute(
+        select(MediaAsset)
+        .join(MediaFileId, MediaFileId.asset_id == MediaAsset.id)
+        .where(MediaFileId.file_unique_id == file_unique_id)
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def register_media(db: AsyncSession, data: bytes, media_type: str) -> Tuple[MediaAsset, bool]:
+    """Return the asset for ``data``, storing the bytes only if the hash is new.
+
+    The second value is True when this call uploaded the bytes. The object
+    is uploaded before the row is written, so a row always has its bytes;
+    a concurrent registration of the same file ends up with one row.
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    existing = await db.execute(select(MediaAsset).where(MediaAsset.sha256 == sha256))
+    asset = existing.scalar_one_or_none()
+    if asset is not None:
+        metrics.incr("media.register_dedup")
+        return asset, False
+
+    path = storage_path_for(sha256)
+    await upload_data(data, settings.supabase_bucket, path, CONTENT_TYPES.get(media_type, "application/octet-stream"))
+    await db.execute(
+        insert(MediaAsset)
+        .values(sha256=sha256, media_type=media_type, size_bytes=len(data), storage_path=path)
+        .on_conflict_do_nothing(index_elements=[MediaAsset.sha256])
+    )
+    result = await db.execute(select(MediaAsset).where(MediaAsset.sha256 == sha256))
+    metrics.incr("media.register_new")
+    metrics.incr("media.stored_bytes", len(data))
+    return result.scalar_one(), True
+
+
+async def load_media(asset: MediaAsset) -> bytes:
+    data = await download_data(settings.supabase_bucket, asset.storage_path)
+    if data is None:
+        raise FileNotFoundError(f"Media asset {asset.id} is missing from storage ({asset.storage_path})")
+    return data
+
+
+async def get_file_id(db: AsyncSession, asset_id: int, sender: str) -> Optional[str]:
+    result = await db.execute(
+        select(MediaFileId.file_id).where(MediaFileId.asset_id == asset_id, MediaFileId.sender == sender)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_file_ids(db: AsyncSession, asset_ids: Iterable[int], sender: str) -> Dict[int, str]:
+    ids = set(asset_ids)
+    if not ids:
+        return {}
+    result = await db.execute(
+        select(MediaFileId.asset_id, MediaFileId.file_id).where(
+            MediaFileId.asset_id.in_(ids), MediaFileId.sender == sender
+        )
+    )
+    return {row.asset_id: row.file_id for row in result.all()}
+
+
+async def remember_file_id(
+    db: AsyncSession, asset_id: int, sender: str, file_id: str, file_unique_id: Optional[str]
+) -> None:
+    values = {"file_id": file_id, "file_unique_id": file_unique_id, "validated_at": datetime.utcnow()}
+    await db.execute(
+        insert(MediaFileId)
+        .values(asset_id=asset_id, sender=sender, **values)
+        .on_conflict_do_update(constraint="uq_media_file_ids_asset_id_sender", set_=values)
+    )
+
+
+async def forget_file_id(db: AsyncSession, asset_id: int, sender: str) -> None:
+    await db.execute(
+        delete(MediaFileId).where(MediaFileId.asset_id == asset_id, MediaFileId.sender == sender)
+    )
+
+
+async def file_ids_due_for_validation(
+    db: AsyncSession, senders: List[str], max_age: timedelta, limit: int
+) -> List[MediaFileId]:
+    result = await db.execute(
+        select(MediaFileId)
+        .where(
+            MediaFileId.sender.in_(senders),
+            MediaFileId.validated_at < datetime.utcnow() - max_age,
+        )
+        .order_by(MediaFileId.validated_at)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def mark_validated(db: AsyncSession, ids: List[int]) -> None:
+    if ids:
+        await db.execute(
+            update(MediaFileId).where(MediaFileId.id.in_(ids)).values(validated_at=datetime.utcnow())
+        )
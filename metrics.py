@@ -0,0 +1,66 @@
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict
+
+_SAMPLE_SIZE = 512
+
+_counters: Dict[str, int] = defaultdict(int)
+_gauges: Dict[str, float] = {}
+_timings: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=_SAMPLE_SIZE))
+_timing_totals: Dict[str, list] = defaultdict(lambda: [0, 0.0, 0.0])
+
+STARTED_AT = time.time()
+
+
+def incr(name: str, value: int = 1) -> None:
+    _counters[name] += value
+
+
+def set_gauge(name: str, value: float) -> None:
+    _gauges[name] = value
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record a duration; the last few hundred samples are kept for percentiles."""
+    _timings[name].append(seconds)
+    totals = _timing_totals[name]
+    totals[0] += 1
+    totals[1] += seconds
+    totals[2] = max(totals[2], seconds)
+
+
+def counter(name: str) -> int:
+    return _counters.get(name, 0)
+
+
+def ratio(hits: str, misses: str) -> float:
+    hit_count = counter(hits)
+    total = hit_count + counter(misses)
+    return hit_count / total if total else 0.0
+
+
+def _percentile(samples: list, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))
+    return samples[index]
+
+
+def snapshot() -> dict:
+    timings = {}
+    for name, samples in _timings.items():
+        ordered = sorted(samples)
+        count, total, maximum = _timing_totals[name]
+        timings[name] = {
+            "count": count,
+            "avg": total / count if count else 0.0,
+            "p50": _percentile(ordered, 0.5),
+            "p95": _percentile(ordered, 0.95),
+            "max": maximum,
+        }
+    return {
+        "uptime": time.time() - STARTED_AT,
+        "counters": dict(_counters),
+        "gauges": dict(_gauges),
+        "timings": timings,
+    }
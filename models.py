@@ -9,8 +9,11 @@ from sqlalchemy import (
     ForeignKey,
     Boolean,
     Text,
+    Index,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.sql import text as sql_text
 from sqlalchemy.dialects.postgresql import JSONB, ARRAY
 
 Base = declarative_base()
@@ -36,6 +39,7 @@ class User(Base):
 
 class ModelProfile(Base):
     __tablename__ = "model_profiles"
+    __table_args__ = (Index("ix_model_profiles_user_id", "user_id"),)
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -53,6 +57,7 @@ class ModelProfile(Base):
 
 class ClientProfile(Base):
     __tablename__ = "client_profiles"
+    __table_args__ = (Index("ix_client_profiles_user_id", "user_id"),)
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -63,6 +68,21 @@ class ClientProfile(Base):
 
 class Session(Base):
     __tablename__ = "sessions"
+    __table_args__ = (
+        Index("ix_sessions_client_id", "client_id"),
+        Index("ix_sessions_model_id_status", "model_id", "status"),
+        Index(
+            "ix_sessions_active_scheduled_end",
+            "scheduled_end",
+            "id",
+            postgresql_where=sql_text("status = 'active'"),
+        ),
+        Index(
+            "ix_sessions_completed_at_completed",
+            "completed_at",
+            postgresql_where=sql_text("status = 'completed'"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     session_ref = Column(String, unique=True, nullable=False)
@@ -73,11 +93,16 @@ class Session(Base):
     status = Column(String, default="pending")
     actual_start = Column(DateTime)
     scheduled_end = Column(DateTime)
+    completed_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class DigitalContent(Base):
     __tablename__ = "digital_content"
+    __table_args__ = (
+        Index("ix_digital_content_is_active_id", "is_active", "id"),
+        Index("ix_digital_content_model_id_id", "model_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     model_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -87,6 +112,8 @@ class DigitalContent(Base):
     price = Column(Float)
     telegram_file_id = Column(String)
     preview_file_id = Column(String)
+    # Set by the media.ingest job once the upload has been hashed and stored.
+    media_asset_id = Column(Integer, ForeignKey("media_assets.id"))
     is_active = Column(Boolean, default=True)
     total_sales = Column(Integer, default=0)
     total_revenue = Column(Float, default=0.0)
@@ -95,6 +122,10 @@ class DigitalContent(Base):
 
 class ContentPurchase(Base):
     __tablename__ = "content_purchases"
+    __table_args__ = (
+        Index("ix_content_purchases_client_id_content_id", "client_id", "content_id"),
+        Index("ix_content_purchases_client_id_id", "client_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     content_id = Column(Integer, ForeignKey("digital_content.id"), nullable=False)
@@ -106,6 +137,9 @@ class ContentPurchase(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True)
     transaction_ref = Column(String, unique=True)
@@ -121,6 +155,9 @@ class Transaction(Base):
 
 class EscrowAccount(Base):
     __tablename__ = "escrow_accounts"
+    __table_args__ = (
+        UniqueConstraint("session_id", name="uq_escrow_accounts_session_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False)
@@ -134,10 +171,67 @@ class AdminAction(Base):
     __tablename__ = "admin_actions"
 
     id = Column(Integer, primary_key=True)
-    admin_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # NULL for actions taken by the system (e.g. escrow auto-release).
+    admin_id = Column(Integer, ForeignKey("users.id"))
     action_type = Column(String)
     target_user_id = Column(Integer, ForeignKey("users.id"))
     target_type = Column(String)
     target_id = Column(Integer)
     details = Column(JSONB)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox_messages"
+    __table_args__ = (
+        Index(
+            "ix_outbox_messages_pending",
+            "available_at",
+            postgresql_where=sql_text("status = 'pending'"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    sender = Column(String, nullable=False, default="main")
+    chat_id = Column(BigInteger, nullable=False)
+    text = Column(Text, nullable=False)
+    # When set, the message is sent as this media with ``text`` as its caption.
+    media_asset_id = Column(Integer, ForeignKey("media_assets.id"))
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text)
+    sent_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class MediaAsset(Base):
+    """A media file identified by the SHA-256 of its bytes, stored once in Supabase."""
+
+    __tablename__ = "media_assets"
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), unique=True, nullable=False)
+    media_type = Column(String, nullable=False)
+    size_bytes = Column(BigInteger)
+    storage_path = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class MediaFileId(Base):
+    """Telegram file_id of an asset; file_ids are only valid for the bot that got them."""
+
+    __tablename__ = "media_file_ids"
+    __table_args__ = (
+        UniqueConstraint("asset_id", "sender", name="uq_media_file_ids_asset_id_sender"),
+        Index("ix_media_file_ids_file_unique_id", "file_unique_id"),
+        Index("ix_media_file_ids_validated_at", "validated_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    asset_id = Column(Integer, ForeignKey("media_assets.id", ondelete="CASCADE"), nullable=False)
+    sender = Column(String, nullable=False)
+    file_id = Column(String, nullable=False)
+    file_unique_id = Column(String)
+    validated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
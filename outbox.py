@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import OutboxMessage
+
+SENDER_MAIN = "main"
+SENDER_ADMIN = "admin"
+
+# How long a claimed message stays invisible to other drainers while it is sent.
+CLAIM_LEASE = timedelta(seconds=60)
+MAX_BACKOFF_SECONDS = 600
+
+
+def enqueue_notification(
+    db: AsyncSession,
+    chat_id: Optional[int],
+    text: str,
+    sender: str = SENDER_MAIN,
+    media_asset_id: Optional[int] = None,
+) -> None:
+    """Queue a Telegram message to be sent by the worker.
+
+    With ``media_asset_id`` the message goes out as that media with ``text``
+    as the caption. Nothing is flushed here: the row commits (or rolls
+    back) together with the caller's business write.
+    """
+    if not chat_id:
+        return
+    db.add(OutboxMessage(sender=sender, chat_id=chat_id, text=text, media_asset_id=media_asset_id))
+
+
+async def claim_outbox_batch(db: AsyncSession, limit: int) -> List[OutboxMessage]:
+    """Lease up to ``limit`` due messages, oldest first.
+
+    ``FOR UPDATE SKIP LOCKED`` lets several drainers run side by side; the
+    lease pushes ``available_at`` forward so a crashed drainer's messages
+    are retried once it expires.
+    """
+    now = datetime.utcnow()
+    due = (
+        select(OutboxMessage.id)
+        .where(OutboxMessage.status == "pending", OutboxMessage.available_at <= now)
+        .order_by(OutboxMessage.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(due))
+        .values(available_at=now + CLAIM_LEASE, attempts=OutboxMessage.attempts + 1)
+        .returning(OutboxMessage)
+        .execution_options(populate_existing=True)
+    )
+    messages = sorted(result.scalars().all(), key=lambda message: message.id)
+    await db.commit()
+    return messages
+
+
+async def mark_sent(db: AsyncSession, message_id: int) -> None:
+    await db.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id == message_id)
+        .values(status="sent", sent_at=datetime.utcnow(), last_error=None)
+    )
+    await db.commit()
+
+
+async def mark_retry(
+    db: AsyncSession,
+    message: OutboxMessage,
+    error: str,
+    max_attempts: int,
+    delay: Optional[float] = None,
+) -> bool:
+    """Reschedule a failed send with exponential backoff; returns False once it is dead."""
+    if message.attempts >= max_attempts:
+        await mark_failed(db, message.id, error)
+        return False
+    if delay is None:
+        delay = min(2 ** message.attempts, MAX_BACKOFF_SECONDS)
+    await db.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id == message.id)
+        .values(available_at=datetime.utcnow() + timedelta(seconds=delay), last_error=error)
+    )
+    await db.commit()
+    return True
+
+
+async def postpone(db: AsyncSession, message_id: int, delay: float) -> None:
+    """Push a message back without counting the claim as an attempt (rate limiting)."""
+    await db.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id == message_id)
+        .values(
+            available_at=datetime.utcnow() + timedelta(seconds=delay),
+            attempts=OutboxMessage.attempts - 1,
+        )
+    )
+    await db.commit()
+
+
+async def mark_failed(db: AsyncSession, message_id: int, error: str) -> None:
+    await db.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id == message_id)
+        .values(status="failed", last_error=error)
+    )
+    await db.commit()
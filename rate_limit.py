@@ -0,0 +1,104 @@
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+import cache
+import metrics
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+KEY_PREFIX = "ratelimit:"
+GLOBAL_KEY = f"{KEY_PREFIX}global"
+DEFAULT_RULE = "default"
+
+# Refill both buckets, then take one token from each only if both have one,
+# so a rejected request costs nothing. Buckets are hashes {tokens, ts} that
+# expire once they would have refilled anyway.
+_TAKE = """
+local now = tonumber(ARGV[1])
+local function level(key, rate, burst)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    return math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+end
+local function store(key, tokens, rate, burst)
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+end
+local user_rate, user_burst = tonumber(ARGV[2]), tonumber(ARGV[3])
+local global_rate, global_burst = tonumber(ARGV[4]), tonumber(ARGV[5])
+local user = level(KEYS[1], user_rate, user_burst)
+if user < 1 then
+    return {0, 1, math.ceil((1 - user) * 1000 / user_rate)}
+end
+local global = level(KEYS[2], global_rate, global_burst)
+if global < 1 then
+    return {0, 2, math.ceil((1 - global) * 1000 / global_rate)}
+end
+store(KEYS[1], user - 1, user_rate, user_burst)
+store(KEYS[2], global - 1, global_rate, global_burst)
+return {1, 0, 0}
+"""
+
+_SCOPES = {1: "user", 2: "global"}
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float  # tokens per second
+    burst: float
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    scope: Optional[str] = None  # "user" or "global" when throttled
+    retry_after: float = 0.0
+
+
+def match_rule(key: str, rules: Dict[str, Tuple[float, float]]) -> str:
+    """Longest configured prefix of ``key`` (a command or callback data), or DEFAULT_RULE."""
+    best = DEFAULT_RULE
+    for prefix in rules:
+        if key.startswith(prefix) and (best == DEFAULT_RULE or len(prefix) > len(best)):
+            best = prefix
+    return best
+
+
+async def take(
+    user_id: int,
+    rule: str,
+    user_limit: Limit,
+    global_limit: Limit,
+    redis: Optional["Redis"] = None,
+) -> Decision:
+    """Take a token from the user's bucket for ``rule`` and from the global bucket.
+
+    Without a reachable Redis the request is allowed: throttling is a
+    safeguard and must not take the bot down with it.
+    """
+    redis = redis or cache.get_redis()
+    if redis is None:
+        return Decision(True)
+    try:
+        allowed, scope, retry_ms = await redis.eval(
+            _TAKE,
+            2,
+            f"{KEY_PREFIX}{user_id}:{rule}",
+            GLOBAL_KEY,
+            int(time.time() * 1000),
+            user_limit.rate,
+            user_limit.burst,
+            global_limit.rate,
+            global_limit.burst,
+        )
+    except (RedisError, OSError):
+        metrics.incr("ratelimit.error")
+        return Decision(True)
+    if allowed:
+        return Decision(True)
+    return Decision(False, _SCOPES.get(int(scope)), int(retry_ms) / 1000)
@@ -0,0 +1,267 @@
+"""Incremental, deduplicated database backups to Supabase Storage.
+
+backup:  pg_dump (plain SQL) is read as a stream and cut into
+         content-defined chunks. Each chunk is stored once, zlib-compressed,
+         under its SHA-256. A manifest lists the chunks in order. Chunks
+         already in storage are skipped, whichever earlier backup stored
+         them, including runs that failed before writing their manifest.
+restore: the manifest's chunks are fetched, verified and written out in
+         order, to stdout, a file, or straight into psql.
+
+Chunk boundaries fall after dump lines whose hash matches a mask, never
+at fixed offsets. A changed row therefore only changes the chunk around
+it, and unchanged tables produce identical chunks from night to night.
+Compression is per chunk, after chunking; compressing the whole stream
+first would shift every later byte and defeat deduplication. Memory is
+bounded by max chunk size x upload concurrency, whatever the database size.
+"""
+import argparse
+import hashlib
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import subprocess
+import sys
+import time
+import zlib
+from collections import deque
+from typing import BinaryIO, Deque, Iterator, List, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from config import settings  # noqa: E402
+from supabase_storage import download_bytes, list_objects, upload_bytes  # noqa: E402
+
+PREFIX = "backups/db"
+MANIFEST_VERSION = 1
+MIN_CHUNK = 256 * 1024
+AVG_CHUNK = 1024 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
+# A boundary is allowed after roughly one line in (AVG_CHUNK / average line length).
+_BOUNDARY_MASK = (1 << 13) - 1
+
+
+# Query parameters libpq understands; anything else in DATABASE_URL is for
+# SQLAlchemy/asyncpg (prepared_statement_cache_size, command_timeout, ...)
+# and makes pg_dump fail with "invalid URI query parameter".
+_LIBPQ_PARAMS = {
+    "host", "hostaddr", "port", "dbname", "user", "password", "passfile",
+    "channel_binding", "connect_timeout", "client_encoding", "options",
+    "application_name", "fallback_application_name", "keepalives",
+    "keepalives_idle", "keepalives_interval", "keepalives_count",
+    "tcp_user_timeout", "sslmode", "sslnegotiation", "sslcompression",
+    "sslcert", "sslkey", "sslpassword", "sslcertmode", "sslrootcert",
+    "sslcrl", "sslcrldir", "sslsni", "requirepeer",
+    "ssl_min_protocol_version", "ssl_max_protocol_version", "gssencmode",
+    "krbsrvname", "gsslib", "gssdelegation", "service",
+    "target_session_attrs", "load_balance_hosts",
+}
+_SSL_TO_SSLMODE = {"true": "require", "false": "disable"}
+
+
+def _libpq_url(database_url: str) -> str:
+    """postgresql+asyncpg://...?ssl=require -> postgresql://...?sslmode=require for pg_dump/psql."""
+    parts = urlsplit(database_url)
+    query = {}
+    for key, value in parse_qsl(parts.query, keep_blank_values=True):
+        if key == "ssl":
+            key, value = "sslmode", _SSL_TO_SSLMODE.get(value.lower(), value)
+        if key in _LIBPQ_PARAMS:
+            query.setdefault(key, value)
+    return urlunsplit(parts._replace(scheme=parts.scheme.split("+", 1)[0], query=urlencode(query)))
+
+
+def _chunk_key(digest: str) -> str:
+    return f"{PREFIX}/chunks/{digest[:2]}/{digest}"
+
+
+def _manifest_key(name: str) -> str:
+    return f"{PREFIX}/manifests/{name}.json"
+
+
+def iter_chunks(stream: BinaryIO) -> Iterator[bytes]:
+    """Yield content-defined chunks of MIN_CHUNK..MAX_CHUNK bytes from a line-oriented stream."""
+    parts: List[bytes] = []
+    size = 0
+    while True:
+        # readline(limit) keeps a single huge line (large bytea) from blowing the bound.
+        line = stream.readline(MAX_CHUNK - size)
+        if not line:
+            break
+        parts.append(line)
+        size += len(line)
+        at_boundary = size >= MIN_CHUNK and (zlib.crc32(line) & _BOUNDARY_MASK) == 0
+        if at_boundary or size >= MAX_CHUNK or (size >= AVG_CHUNK * 2 and line.endswith(b"\n")):
+            yield b"".join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b"".join(parts)
+
+
+def _load_manifest(name: str) -> Optional[dict]:
+    raw = download_bytes(settings.supabase_bucket, _manifest_key(name))
+    return json.loads(raw) if raw is not None else None
+
+
+def _stored_chunks(concurrency: int) -> Set[str]:
+    """Digests of every chunk in storage, whichever backup uploaded it."""
+    def listing(prefix: str) -> List[dict]:
+        return list_objects(settings.supabase_bucket, f"{PREFIX}/chunks{prefix}")
+
+    # Chunks sit one folder down (chunks/aa/<digest>); folders have no id.
+    folders = [f"/{entry['name']}" for entry in listing("") if entry.get("id") is None]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return {
+            entry["name"]
+            for entries in pool.map(listing, folders)
+            for entry in entries
+            if entry.get("id") is not None
+        }
+
+
+def _upload_chunk(digest: str, raw: bytes) -> int:
+    stored = zlib.compress(raw, 6)
+    upload_bytes(stored, settings.supabase_bucket, _chunk_key(digest))
+    return len(stored)
+
+
+def backup(args) -> None:
+    known = _stored_chunks(args.concurrency)
+
+    command = [args.pg_dump, "--format=plain", "--no-owner", "--no-privileges", _libpq_url(settings.database_url)]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=1024 * 1024)
+
+    chunks = []
+    new_chunks = new_bytes = raw_total = 0
+    in_flight: Deque[Future] = deque()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for raw in iter_chunks(process.stdout):
+            digest = hashlib.sha256(raw).hexdigest()
+            raw_total += len(raw)
+            chunks.append([digest, len(raw)])
+            if digest in known:
+                continue
+            known.add(digest)
+            new_chunks += 1
+            new_bytes += len(raw)
+            # Bounded window: never more than `concurrency` chunks waiting in memory.
+            if len(in_flight) >= args.concurrency:
+                in_flight.popleft().result()
+            in_flight.append(pool.submit(_upload_chunk, digest, raw))
+        for future in in_flight:
+            future.result()
+
+    if process.wait() != 0:
+        raise SystemExit(f"pg_dump exited with {process.returncode}; no manifest written")
+
+    name = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "name": name,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "format": "plain",
+        "compression": "zlib",
+        "raw_bytes": raw_total,
+        "new_chunks": new_chunks,
+        "new_raw_bytes": new_bytes,
+        "chunks": chunks,
+    }
+    payload = json.dumps(manifest).encode()
+    upload_bytes(payload, settings.supabase_bucket, _manifest_key(name), "application/json")
+    upload_bytes(payload, settings.supabase_bucket, _manifest_key("latest"), "application/json")
+
+    reused = len(chunks) - new_chunks
+    print(
+        f"✅ Backup {name}: {raw_total / 1e6:.1f} MB in {len(chunks)} chunks, "
+        f"{new_chunks} new ({new_bytes / 1e6:.1f} MB uploaded before compression), "
+        f"{reused} reused, {time.perf_counter() - started:.1f} s"
+    )
+
+
+def _fetch_chunk(digest: str) -> bytes:
+    stored = download_bytes(settings.supabase_bucket, _chunk_key(digest))
+    if stored is None:
+        raise SystemExit(f"Chunk {digest} is missing from storage")
+    raw = zlib.decompress(stored)
+    if hashlib.sha256(raw).hexdigest() != digest:
+        raise SystemExit(f"Chunk {digest} failed verification")
+    return raw
+
+
+def restore(args) -> None:
+    manifest = _load_manifest(args.name)
+    if manifest is None:
+        raise SystemExit(f"No manifest named {args.name!r}")
+
+    psql = None
+    if args.into_database:
+        psql = subprocess.Popen(
+            [args.psql, "--quiet", "--set=ON_ERROR_STOP=1", _libpq_url(args.into_database)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+        )
+        out = psql.stdin
+    elif args.output == "-":
+        out = sys.stdout.buffer
+    else:
+        out = open(args.output, "wb")
+
+    started = time.perf_counter()
+    written = 0
+    try:
+        # Prefetch a few chunks ahead, but write strictly in manifest order.
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            pending: Deque[Future] = deque()
+            digests = iter(chunk[0] for chunk in manifest["chunks"])
+            for digest in digests:
+                pending.append(pool.submit(_fetch_chunk, digest))
+                if len(pending) >= args.concurrency:
+                    break
+            while pending:
+                raw = pending.popleft().result()
+                out.write(raw)
+                written += len(raw)
+                next_digest = next(digests, None)
+                if next_digest is not None:
+                    pending.append(pool.submit(_fetch_chunk, next_digest))
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    if psql is not None and psql.wait() != 0:
+        raise SystemExit(f"psql exited with {psql.returncode}")
+    print(
+        f"✅ Restored {manifest['name']}: {written / 1e6:.1f} MB in {time.perf_counter() - started:.1f} s",
+        file=sys.stderr,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental deduplicated database backups")
+    parser.add_argument("--concurrency", type=int, default=settings.storage_concurrency)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backup_parser = commands.add_parser("backup", help="Dump DATABASE_URL and upload new chunks")
+    backup_parser.add_argument("--pg-dump", default="pg_dump", help="pg_dump binary")
+
+    restore_parser = commands.add_parser("restore", help="Reassemble a backup from its manifest")
+    restore_parser.add_argument("name", nargs="?", default="latest", help="Manifest name (default: latest)")
+    target = restore_parser.add_mutually_exclusive_group()
+    target.add_argument("--output", default="-", help="Write the SQL dump here (default: stdout)")
+    target.add_argument("--into-database", help="Pipe the dump into psql for this database URL")
+    restore_parser.add_argument("--psql", default="psql", help="psql binary")
+
+    args = parser.parse_args()
+    if args.command == "backup":
+        if not settings.database_url:
+            raise RuntimeError("DATABASE_URL is required")
+        backup(args)
+    else:
+        restore(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,50 @@
 import argparse
-from supabase_storage import upload_file
+import asyncio
+from async_storage import TransferItem, upload_many
+from supabase_storage import UploadProgress, upload_file
 from config import settings
 
 
+def _print_progress(progress: UploadProgress) -> None:
+    percent = progress.sent * 100 / progress.total if progress.total else 100
+    print(
+        f"\r{percent:5.1f}% {progress.sent / 1e6:.1f}/{progress.total / 1e6:.1f} MB "
+        f"at {progress.bytes_per_second / 1e6:.2f} MB/s",
+        end="",
+        flush=True,
+    )
+
+
+def _remote_path(local_path: str) -> str:
+    return f"backups/{local_path.rsplit('/', 1)[-1]}"
+
+
 def main():
-    parser = argparse.ArgumentParser(description="Upload a backup file to Supabase Storage")
-    parser.add_argument("file", help="Path to backup file")
-    parser.add_argument("--remote", default=None, help="Remote storage path")
+    parser = argparse.ArgumentParser(description="Upload backup files to Supabase Storage")
+    parser.add_argument("files", nargs="+", help="Path(s) to backup files")
+    parser.add_argument("--remote", default=None, help="Remote storage path (single file only)")
+    parser.add_argument("--concurrency", type=int, default=settings.storage_concurrency)
     args = parser.parse_args()
 
-    remote_path = args.remote or f"backups/{args.file.rsplit('/', 1)[-1]}"
-    upload_file(args.file, settings.supabase_bucket, remote_path)
-    print(f"✅ Uploaded to supabase://{settings.supabase_bucket}/{remote_path}")
+    if len(args.files) == 1:
+        remote_path = args.remote or _remote_path(args.files[0])
+        upload_file(args.files[0], settings.supabase_bucket, remote_path, on_progress=_print_progress)
+        print()
+        print(f"✅ Uploaded to supabase://{settings.supabase_bucket}/{remote_path}")
+        return
+    if args.remote:
+        parser.error("--remote can only be used with a single file")
+
+    items = [TransferItem(path, _remote_path(path), settings.supabase_bucket) for path in args.files]
+    result = asyncio.run(upload_many(items, concurrency=args.concurrency))
+    print(
+        f"✅ Uploaded {len(result.succeeded)}/{len(items)} files "
+        f"({result.bytes / 1e6:.1f} MB in {result.seconds:.1f} s)"
+    )
+    for failure in result.failed:
+        print(f"❌ {failure.item.local_path}: {failure.error} after {failure.attempts} attempts")
+    if result.failed:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
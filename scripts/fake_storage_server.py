@@ -0,0 +1,186 @@
+"""In-memory stand-in for the parts of Supabase Storage the bot uses.
+
+Covers object upload (POST with x-upsert, PUT), download, listing, remove
+and TUS resumable uploads. ``patch_fail_every`` makes every Nth TUS PATCH store
+only half its chunk and then fail, to exercise resume logic;
+``latency`` adds a delay to every request.
+
+Run standalone with ``python scripts/fake_storage_server.py --port 54321``
+and point SUPABASE_URL at it (any SUPABASE_SERVICE_KEY works), or start it
+in-process with :func:`start_fake_storage`.
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+from collections import Counter
+from typing import Dict, Optional
+
+from aiohttp import web
+
+TUS_HEADERS = {"Tus-Resumable": "1.0.0"}
+
+
+class FakeStorage:
+    def __init__(self, patch_fail_every: int = 0, latency: float = 0.0):
+        self.objects: Dict[str, bytes] = {}
+        self.uploads: Dict[str, dict] = {}
+        self.requests: Counter = Counter()
+        self.patch_fail_every = patch_fail_every
+        self.latency = latency
+        self._upload_ids = itertools.count(1)
+        self._patches = 0
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._count], client_max_size=1024 ** 3)
+        app.router.add_post("/storage/v1/upload/resumable", self.tus_create)
+        app.router.add_route("HEAD", "/storage/v1/upload/resumable/{upload_id}", self.tus_head)
+        app.router.add_patch("/storage/v1/upload/resumable/{upload_id}", self.tus_patch)
+        # Before the upload route, which would otherwise take "list" for a bucket.
+        app.router.add_post("/storage/v1/object/list/{bucket}", self.list)
+        app.router.add_get("/storage/v1/object/public/{bucket}/{path:.+}", self.download)
+        app.router.add_get("/storage/v1/object/authenticated/{bucket}/{path:.+}", self.download)
+        app.router.add_get("/storage/v1/object/{bucket}/{path:.+}", self.download)
+        app.router.add_post("/storage/v1/object/{bucket}/{path:.+}", self.upload)
+        app.router.add_put("/storage/v1/object/{bucket}/{path:.+}", self.upload)
+        app.router.add_delete("/storage/v1/object/{bucket}", self.remove)
+        return app
+
+    @web.middleware
+    async def _count(self, request: web.Request, handler):
+        self.requests[request.method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    @staticmethod
+    def _key(bucket: str, path: str) -> str:
+        return f"{bucket}/{path}"
+
+    async def upload(self, request: web.Request) -> web.Response:
+        key = self._key(request.match_info["bucket"], request.match_info["path"])
+        upsert = request.headers.get("x-upsert", "false").lower() == "true"
+        if request.method == "POST" and key in self.objects and not upsert:
+            return web.json_response(
+                {"statusCode": "409", "error": "Duplicate", "message": "The resource already exists"},
+                status=400,
+            )
+        if request.content_type.startswith("multipart/"):
+            form = await request.post()
+            data = form["file"].file.read()
+        else:
+            data = await request.read()
+        self.objects[key] = data
+        return web.json_response({"Key": key, "Id": key})
+
+    async def download(self, request: web.Request) -> web.Response:
+        key = self._key(request.match_info["bucket"], request.match_info["path"])
+        if key not in self.objects:
+            return web.json_response({"statusCode": "404", "error": "not_found", "message": "Object not found"}, status=400)
+        return web.Response(body=self.objects[key], content_type="application/octet-stream")
+
+    async def list(self, request: web.Request) -> web.Response:
+        """One level under ``prefix``, by name, like Storage; folders have a null id."""
+        body = await request.json()
+        folder = body.get("prefix", "").strip("/")
+        prefix = self._key(request.match_info["bucket"], f"{folder}/" if folder else "")
+        entries = {}
+        for key in self.objects:
+            if key.startswith(prefix):
+                name, _, rest = key[len(prefix):].partition("/")
+                entries[name] = None if rest else prefix + name
+        page = sorted(entries.items())[body.get("offset", 0):][: body.get("limit", 100)]
+        return web.json_response([{"name": name, "id": key} for name, key in page])
+
+    async def remove(self, request: web.Request) -> web.Response:
+        bucket = request.match_info["bucket"]
+        body = await request.json()
+        removed = []
+        for path in body.get("prefixes", []):
+            if self.objects.pop(self._key(bucket, path), None) is not None:
+                removed.append({"name": path})
+        return web.json_response(removed)
+
+    async def tus_create(self, request: web.Request) -> web.Response:
+        metadata = {}
+        for item in request.headers.get("Upload-Metadata", "").split(","):
+            if " " in item:
+                name, value = item.split(" ", 1)
+                metadata[name] = base64.b64decode(value).decode()
+        key = self._key(metadata["bucketName"], metadata["objectName"])
+        upsert = request.headers.get("x-upsert", "false").lower() == "true"
+        if key in self.objects and not upsert:
+            return web.Response(status=409, text="The resource already exists", headers=TUS_HEADERS)
+        upload_id = str(next(self._upload_ids))
+        self.uploads[upload_id] = {
+            "key": key,
+            "length": int(request.headers["Upload-Length"]),
+            "data": bytearray(),
+        }
+        self._finish_if_complete(upload_id)
+        return web.Response(
+            status=201,
+            headers={**TUS_HEADERS, "Location": f"/storage/v1/upload/resumable/{upload_id}"},
+        )
+
+    async def tus_head(self, request: web.Request) -> web.Response:
+        upload = self.uploads.get(request.match_info["upload_id"])
+        if upload is None:
+            return web.Response(status=404, headers=TUS_HEADERS)
+        return web.Response(
+            headers={
+                **TUS_HEADERS,
+                "Upload-Offset": str(len(upload["data"])),
+                "Upload-Length": str(upload["length"]),
+                "Cache-Control": "no-store",
+            }
+        )
+
+    async def tus_patch(self, request: web.Request) -> web.Response:
+        upload_id = request.match_info["upload_id"]
+        upload = self.uploads.get(upload_id)
+        if upload is None:
+            return web.Response(status=404, headers=TUS_HEADERS)
+        offset = int(request.headers["Upload-Offset"])
+        if offset != len(upload["data"]):
+            return web.Response(status=409, text="Upload-Offset mismatch", headers=TUS_HEADERS)
+        chunk = await request.read()
+        self._patches += 1
+        if self.patch_fail_every and self._patches % self.patch_fail_every == 0:
+            upload["data"] += chunk[: len(chunk) // 2]
+            return web.Response(status=500, text="injected failure", headers=TUS_HEADERS)
+        upload["data"] += chunk
+        self._finish_if_complete(upload_id)
+        return web.Response(
+            status=204, headers={**TUS_HEADERS, "Upload-Offset": str(len(upload["data"]))}
+        )
+
+    def _finish_if_complete(self, upload_id: str) -> None:
+        upload = self.uploads[upload_id]
+        if len(upload["data"]) >= upload["length"]:
+            self.objects[upload["key"]] = bytes(upload["data"])
+
+
+async def start_fake_storage(
+    host: str, port: int, storage: Optional[FakeStorage] = None
+) -> "tuple[web.AppRunner, FakeStorage]":
+    storage = storage or FakeStorage()
+    runner = web.AppRunner(storage.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an in-memory Supabase Storage stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--patch-fail-every", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    storage = FakeStorage(patch_fail_every=args.patch_fail_every, latency=args.latency)
+    web.run_app(storage.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
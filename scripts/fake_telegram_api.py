@@ -0,0 +1,155 @@
+"""Minimal stand-in for the Telegram Bot API, for local benchmarks.
+
+Point a bot at it with TELEGRAM_API_BASE_URL=http://127.0.0.1:<port>.
+Every method succeeds; sendMessage echoes a plausible Message back.
+Editing a message to the text and markup it already has fails with
+"message is not modified", as on Telegram.
+Media sends store uploaded bytes and hand out a file_id that later sends,
+getFile and file downloads accept; unknown file_ids are rejected the way
+Telegram rejects them.
+"""
+import hashlib
+import itertools
+import json
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+_message_ids = itertools.count(1)
+
+
+def fake_message(chat_id, text: Optional[str] = None) -> dict:
+    return {
+        "message_id": next(_message_ids),
+        "date": int(time.time()),
+        "chat": {"id": int(chat_id), "type": "private"},
+        "text": text,
+    }
+
+
+_MEDIA_METHODS = {
+    "sendphoto": "photo",
+    "sendvideo": "video",
+    "sendanimation": "animation",
+    "sendaudio": "audio",
+    "senddocument": "document",
+}
+
+
+async def _read_params(request: web.Request) -> dict:
+    if request.content_type == "application/json":
+        return await request.json()
+    return dict(await request.post())
+
+
+def _media_file(files: Dict[str, bytes], params: dict, value) -> Optional[dict]:
+    """Store an uploaded part, or look up a file_id; None if the id is unknown."""
+    if isinstance(value, str) and value.startswith("attach://"):
+        value = params.get(value[len("attach://"):])
+    if hasattr(value, "file"):
+        data = value.file.read()
+        digest = hashlib.sha1(data).hexdigest()[:16]
+        files[f"f-{digest}"] = data
+        value = f"f-{digest}"
+    elif value not in files:
+        return None
+    return {"file_id": value, "file_unique_id": f"u-{value[2:]}", "file_size": len(files[value])}
+
+
+def _media_field(field: str, media: dict):
+    """The Message attribute for a sent file, with the fields aiogram requires for its kind."""
+    if field == "photo":
+        return [{**media, "width": 1, "height": 1}]
+    if field in ("video", "animation"):
+        return {**media, "width": 1, "height": 1, "duration": 1}
+    if field == "audio":
+        return {**media, "duration": 1}
+    return media
+
+
+def _bad_request(description: str) -> web.Response:
+    return web.json_response(
+        {"ok": False, "error_code": 400, "description": f"Bad Request: {description}"}, status=400
+    )
+
+
+def build_app(
+    calls: List[dict], latency: float = 0.0, files: Optional[Dict[str, bytes]] = None
+) -> web.Application:
+    files = {} if files is None else files
+    edited: Dict[tuple, tuple] = {}
+
+    async def handle(request: web.Request) -> web.Response:
+        params = await _read_params(request)
+        calls.append({"method": request.match_info["method"], "params": params, "at": time.perf_counter()})
+        method = request.match_info["method"].lower()
+        if latency:
+            import asyncio
+
+            await asyncio.sleep(latency)
+        if method == "editmessagetext":
+            key = (str(params.get("chat_id")), str(params.get("message_id")))
+            content = (params.get("text"), str(params.get("reply_markup")))
+            if edited.get(key) == content:
+                return _bad_request(
+                    "message is not modified: specified new message content and reply markup "
+                    "are exactly the same as a current content and reply markup of the message"
+                )
+            edited[key] = content
+        if method in {"sendmessage", "editmessagetext"}:
+            result = fake_message(params.get("chat_id", 0), params.get("text"))
+        elif method in _MEDIA_METHODS:
+            field = _MEDIA_METHODS[method]
+            media = _media_file(files, params, params.get(field))
+            if media is None:
+                return _bad_request("wrong file identifier/HTTP URL specified")
+            result = fake_message(params.get("chat_id", 0))
+            result["caption"] = params.get("caption")
+            result[field] = _media_field(field, media)
+        elif method == "sendmediagroup":
+            items = params.get("media")
+            items = json.loads(items) if isinstance(items, str) else items
+            result = []
+            for item in items:
+                media = _media_file(files, params, item["media"])
+                if media is None:
+                    return _bad_request("wrong file identifier/HTTP URL specified")
+                message = fake_message(params.get("chat_id", 0))
+                message["caption"] = item.get("caption")
+                message[item["type"]] = _media_field(item["type"], media)
+                result.append(message)
+        elif method == "getfile":
+            media = _media_file(files, params, params.get("file_id"))
+            if media is None:
+                return _bad_request("wrong file_id specified")
+            result = {**media, "file_path": f"files/{media['file_id']}"}
+        elif method == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def download(request: web.Request) -> web.Response:
+        data = files.get(request.match_info["path"].rsplit("/", 1)[-1])
+        if data is None:
+            return web.Response(status=404)
+        return web.Response(body=data)
+
+    app = web.Application(client_max_size=64 * 1024 ** 2)
+    app.router.add_post("/bot{token}/{method}", handle)
+    app.router.add_get("/file/bot{token}/{path:.+}", download)
+    return app
+
+
+async def start_fake_api(
+    host: str,
+    port: int,
+    calls: List[dict],
+    latency: float = 0.0,
+    files: Optional[Dict[str, bytes]] = None,
+) -> web.AppRunner:
+    runner = web.AppRunner(build_app(calls, latency, files))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+import csv
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "bot"))
+
+from db import AsyncSessionLocal, engine  # noqa: E402
+from session_flow import USER_IMPORT_BATCH_SIZE, upsert_users  # noqa: E402
+
+
+def _read_rows(path: str):
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if not row.get("telegram_id"):
+                continue
+            yield {
+                "telegram_id": int(row["telegram_id"]),
+                "username": row.get("username") or None,
+                "first_name": row.get("first_name") or None,
+                "last_name": row.get("last_name") or None,
+                "role": row.get("role") or None,
+            }
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Import or backfill users from a CSV (telegram_id,username,first_name,last_name,role)"
+    )
+    parser.add_argument("file", help="Path to CSV file with a header row")
+    parser.add_argument("--batch-size", type=int, default=USER_IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    try:
+        async with AsyncSessionLocal() as db:
+            total = await upsert_users(db, _read_rows(args.file), batch_size=args.batch_size)
+        print(f"✅ Upserted {total} users")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+import asyncio
+from pathlib import Path
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from config import settings  # noqa: E402
+
+
+async def main():
+    if not settings.database_url:
+        raise RuntimeError("DATABASE_URL is required")
+
+    engine = create_async_engine(settings.database_url, echo=False)
+    try:
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                text(
+                    "SELECT table_name, column_name, is_nullable FROM information_schema.columns "
+                    "WHERE table_schema='public' AND table_name IN ('sessions', 'admin_actions')"
+                )
+            )
+            columns = {(row[0], row[1]): row[2] for row in result.fetchall()}
+
+            statements = []
+            if ("sessions", "completed_at") not in columns:
+                statements.append("ALTER TABLE sessions ADD COLUMN completed_at TIMESTAMP")
+            if columns.get(("admin_actions", "admin_id")) == "NO":
+                statements.append("ALTER TABLE admin_actions ALTER COLUMN admin_id DROP NOT NULL")
+
+            if not statements:
+                print("No escrow auto-release migrations needed.")
+                return
+
+            for stmt in statements:
+                await conn.execute(text(stmt))
+            print("✅ Escrow auto-release columns migrated:")
+            for stmt in statements:
+                print(stmt)
+            print(
+                "Sessions completed before this migration have no completed_at and are "
+                "left for manual /release_escrow. Run scripts/migrate_indexes.py next."
+            )
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
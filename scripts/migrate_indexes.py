@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import json
+from pathlib import Path
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from config import settings  # noqa: E402
+
+# (index name, unique, definition after "CREATE [UNIQUE] INDEX CONCURRENTLY <name>")
+INDEXES = [
+    ("uq_escrow_accounts_session_id", True, "ON escrow_accounts (session_id)"),
+    ("ix_digital_content_is_active_id", False, "ON digital_content (is_active, id)"),
+    ("ix_digital_content_model_id_id", False, "ON digital_content (model_id, id)"),
+    (
+        "ix_content_purchases_client_id_content_id",
+        False,
+        "ON content_purchases (client_id, content_id)",
+    ),
+    ("ix_content_purchases_client_id_id", False, "ON content_purchases (client_id, id)"),
+    ("ix_sessions_client_id", False, "ON sessions (client_id)"),
+    ("ix_sessions_model_id_status", False, "ON sessions (model_id, status)"),
+    (
+        "ix_sessions_active_scheduled_end",
+        False,
+        "ON sessions (scheduled_end, id) WHERE status = 'active'",
+    ),
+    (
+        "ix_sessions_completed_at_completed",
+        False,
+        "ON sessions (completed_at) WHERE status = 'completed'",
+    ),
+    ("ix_transactions_user_id_created_at", False, "ON transactions (user_id, created_at)"),
+    ("ix_model_profiles_user_id", False, "ON model_profiles (user_id)"),
+    ("ix_client_profiles_user_id", False, "ON client_profiles (user_id)"),
+]
+
+# Unique indexes that should also be attached as named table constraints.
+CONSTRAINTS = [("escrow_accounts", "uq_escrow_accounts_session_id")]
+
+# Hot queries for the --explain benchmark: (label, parameter lookup, query).
+BENCHMARKS = [
+    (
+        "escrow by session",
+        "SELECT session_id FROM escrow_accounts ORDER BY id DESC LIMIT 1",
+        "SELECT * FROM escrow_accounts WHERE session_id = :p",
+    ),
+    (
+        "active catalog page",
+        "SELECT id FROM digital_content ORDER BY id LIMIT 1 OFFSET 1000",
+        "SELECT id, title, price FROM digital_content "
+        "WHERE is_active IS true AND id > :p ORDER BY id LIMIT 21",
+    ),
+    (
+        "model content page",
+        "SELECT model_id FROM digital_content ORDER BY id DESC LIMIT 1",
+        "SELECT id, title, price FROM digital_content WHERE model_id = :p ORDER BY id LIMIT 21",
+    ),
+    (
+        "purchases by client",
+        "SELECT client_id FROM content_purchases ORDER BY id DESC LIMIT 1",
+        "SELECT * FROM content_purchases WHERE client_id = :p ORDER BY content_id",
+    ),
+    (
+        "purchase library page",
+        "SELECT client_id FROM content_purchases ORDER BY id DESC LIMIT 1",
+        "SELECT p.id, p.content_id, c.title, p.price_paid FROM content_purchases p "
+        "JOIN digital_content c ON c.id = p.content_id "
+        "WHERE p.client_id = :p AND p.id > 0 ORDER BY p.id LIMIT 11",
+    ),
+    (
+        "sessions by client",
+        "SELECT client_id FROM sessions ORDER BY id DESC LIMIT 1",
+        "SELECT * FROM sessions WHERE client_id = :p",
+    ),
+    (
+        "active sessions by model",
+        "SELECT model_id FROM sessions ORDER BY id DESC LIMIT 1",
+        "SELECT * FROM sessions WHERE model_id = :p AND status = 'active'",
+    ),
+    (
+        "escrow auto-release candidates",
+        "SELECT now() - interval '48 hours'",
+        "SELECT id FROM sessions WHERE status = 'completed' AND completed_at <= :p "
+        "ORDER BY completed_at LIMIT 100",
+    ),
+    (
+        "recent transactions by user",
+        "SELECT user_id FROM transactions ORDER BY id DESC LIMIT 1",
+        "SELECT * FROM transactions WHERE user_id = :p ORDER BY created_at DESC LIMIT 20",
+    ),
+]
+
+
+async def _index_state(conn, name: str):
+    result = await conn.execute(
+        text(
+            "SELECT i.indisvalid FROM pg_class c "
+            "JOIN pg_index i ON i.indexrelid = c.oid "
+            "WHERE c.relname = :name"
+        ),
+        {"name": name},
+    )
+    row = result.fetchone()
+    return None if row is None else row[0]
+
+
+def _scan_node(node: dict) -> dict:
+    """First scan node in the plan tree (Limit/Sort wrappers hide the access path)."""
+    if "Scan" in node["Node Type"]:
+        return node
+    for child in node.get("Plans", []):
+        found = _scan_node(child)
+        if found:
+            return found
+    return node
+
+
+async def _explain(conn) -> dict:
+    plans = {}
+    for label, param_sql, query in BENCHMARKS:
+        param = (await conn.execute(text(param_sql))).scalar()
+        params = {"p": param if param is not None else 0}
+        await conn.execute(text(query), params)  # warm the cache so runs are comparable
+        result = await conn.execute(
+            text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}"), params
+        )
+        raw = result.scalar()
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+        node = plan["Plan"]
+        scan = _scan_node(node)
+        plans[label] = {
+            "node": scan["Node Type"] + (f" using {scan['Index Name']}" if "Index Name" in scan else ""),
+            "ms": plan["Execution Time"],
+            "buffers": node.get("Shared Hit Blocks", 0) + node.get("Shared Read Blocks", 0),
+        }
+    return plans
+
+
+def _print_comparison(before: dict, after: dict):
+    print(f"{'query':<30} {'before':>12} {'after':>12}  plan (after)")
+    for label, plan in after.items():
+        old = before[label]
+        print(
+            f"{label:<30} {old['ms']:>9.3f} ms {plan['ms']:>9.3f} ms  "
+            f"{plan['node']} ({old['buffers']} -> {plan['buffers']} buffers)"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Create hot-path indexes with CREATE INDEX CONCURRENTLY (no write locks)"
+    )
+    parser.add_argument(
+        "--explain", action="store_true", help="Print EXPLAIN ANALYZE timings before and after"
+    )
+    args = parser.parse_args()
+
+    if not settings.database_url:
+        raise RuntimeError("DATABASE_URL is required")
+
+    engine = create_async_engine(settings.database_url, echo=False)
+    try:
+        # CONCURRENTLY cannot run inside a transaction block.
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+
+            before = await _explain(conn) if args.explain else None
+
+            duplicates = await conn.execute(
+                text(
+                    "SELECT session_id FROM escrow_accounts "
+                    "GROUP BY session_id HAVING count(*) > 1 LIMIT 10"
+                )
+            )
+            duplicate_ids = [row[0] for row in duplicates.fetchall()]
+            if duplicate_ids:
+                raise RuntimeError(
+                    f"Duplicate escrow rows for sessions {duplicate_ids}; resolve them before "
+                    "adding uq_escrow_accounts_session_id"
+                )
+
+            created = []
+            for name, unique, definition in INDEXES:
+                valid = await _index_state(conn, name)
+                if valid:
+                    continue
+                if valid is False:
+                    # Left behind by an interrupted concurrent build.
+                    await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                kind = "UNIQUE INDEX" if unique else "INDEX"
+                await conn.execute(text(f"CREATE {kind} CONCURRENTLY {name} {definition}"))
+                created.append(name)
+
+            for table, name in CONSTRAINTS:
+                result = await conn.execute(
+                    text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": name}
+                )
+                if result.fetchone():
+                    continue
+                # Attaching an existing index only needs a brief lock, never a table scan.
+                await conn.execute(text("SET lock_timeout = '5s'"))
+                await conn.execute(
+                    text(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}")
+                )
+                await conn.execute(text("RESET lock_timeout"))
+                created.append(f"{name} (constraint)")
+
+            if created:
+                print("✅ Indexes created:")
+                for name in created:
+                    print(name)
+            else:
+                print("No index migrations needed.")
+
+            if args.explain:
+                tables = sorted({definition.split()[1] for _, _, definition in INDEXES})
+                await conn.execute(text(f"ANALYZE {', '.join(tables)}"))
+                _print_comparison(before, await _explain(conn))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
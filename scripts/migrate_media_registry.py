@@ -0,0 +1,55 @@
+import asyncio
+from pathlib import Path
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from config import settings  # noqa: E402
+from models import MediaAsset, MediaFileId  # noqa: E402
+
+
+async def main():
+    if not settings.database_url:
+        raise RuntimeError("DATABASE_URL is required")
+
+    engine = create_async_engine(settings.database_url, echo=False)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                lambda sync_conn: MediaAsset.metadata.create_all(
+                    sync_conn, tables=[MediaAsset.__table__, MediaFileId.__table__]
+                )
+            )
+            result = await conn.execute(
+                text(
+                    "SELECT table_name, column_name FROM information_schema.columns "
+                    "WHERE table_schema='public' AND column_name='media_asset_id'"
+                )
+            )
+            existing = {row[0] for row in result.fetchall()}
+
+            statements = [
+                f"ALTER TABLE {table} ADD COLUMN media_asset_id INTEGER REFERENCES media_assets(id)"
+                for table in ("digital_content", "outbox_messages")
+                if table not in existing
+            ]
+            for stmt in statements:
+                await conn.execute(text(stmt))
+
+            print("✅ Media registry tables are in place.")
+            for stmt in statements:
+                print(stmt)
+            print(
+                "Content added before this migration keeps its telegram_file_id and has no "
+                "registry asset until it is re-added with media."
+            )
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
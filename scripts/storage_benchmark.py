@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import os
+from pathlib import Path
+import socket
+import sys
+import tempfile
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from fake_storage_server import FakeStorage, start_fake_storage  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(args) -> None:
+    port = _free_port()
+    # Settings are read at import, so configure before importing the facade.
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["SUPABASE_SERVICE_KEY"] = "stand-in.service.key"
+    os.environ["STORAGE_CONCURRENCY"] = str(args.concurrency)
+    from async_storage import TransferItem, download_many, upload_many
+
+    runner, _ = await start_fake_storage("127.0.0.1", port, FakeStorage(latency=args.latency))
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            items = []
+            for index in range(args.files):
+                path = Path(tmp, f"file_{index}.bin")
+                path.write_bytes(os.urandom(args.size))
+                items.append(TransferItem(str(path), f"bench/file_{index}.bin", bucket="media"))
+
+            print(
+                f"{args.files} files x {args.size / 1024:.0f} KB, "
+                f"{args.latency * 1000:.0f} ms simulated latency per request"
+            )
+            timings = {}
+            for label, concurrency in (("sequential", 1), (f"concurrent x{args.concurrency}", args.concurrency)):
+                result = await upload_many(items, concurrency=concurrency)
+                timings[label] = result.seconds
+                print(
+                    f"  upload {label:<16} {result.seconds:7.2f} s  "
+                    f"{result.bytes_per_second / 1e6:6.2f} MB/s  failed={len(result.failed)}"
+                )
+            print(f"  speedup: {timings['sequential'] / timings[label]:.1f}x")
+
+            downloads = [
+                TransferItem(str(Path(tmp, f"copy_{index}.bin")), item.remote_path, bucket="media")
+                for index, item in enumerate(items)
+            ]
+            result = await download_many(downloads, concurrency=args.concurrency)
+            print(
+                f"  download concurrent x{args.concurrency} {result.seconds:5.2f} s  "
+                f"failed={len(result.failed)}"
+            )
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare sequential and concurrent uploads against the local storage stand-in"
+    )
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--size", type=int, default=256 * 1024, help="Bytes per file")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to each request")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+import cache
+import metrics
+
+TIMERS_KEY = "sessions:timers"
+WARN = "warn"
+END = "end"
+
+# Pop due timers atomically so concurrent workers never fire the same one.
+_POP_DUE = """
+local due = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #due > 0 then
+    redis.call('zrem', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+def _timestamp(moment: datetime) -> float:
+    # Columns hold naive UTC (datetime.utcnow()).
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _member(session_id: int, kind: str) -> str:
+    return f"{session_id}:{kind}"
+
+
+async def schedule_session(
+    session_id: int,
+    scheduled_end: datetime,
+    warn_before_seconds: float,
+    redis: Optional[Redis] = None,
+) -> bool:
+    """Arm the warning and end timers for an active session."""
+    return await schedule_many([(session_id, scheduled_end)], warn_before_seconds, redis=redis) > 0
+
+
+async def schedule_many(
+    sessions: Iterable[Tuple[int, datetime]],
+    warn_before_seconds: float,
+    redis: Optional[Redis] = None,
+) -> int:
+    """ZADD timers for many sessions in one call.
+
+    Warnings that would already be in the past are skipped, so re-seeding
+    from the database can be repeated without re-sending them.
+    """
+    redis = redis or cache.get_redis()
+    if redis is None:
+        return 0
+    now = datetime.now(timezone.utc).timestamp()
+    timers = {}
+    for session_id, scheduled_end in sessions:
+        end_at = _timestamp(scheduled_end)
+        timers[_member(session_id, END)] = end_at
+        if end_at - warn_before_seconds > now:
+            timers[_member(session_id, WARN)] = end_at - warn_before_seconds
+    if not timers:
+        return 0
+    try:
+        await redis.zadd(TIMERS_KEY, timers)
+    except (RedisError, OSError):
+        metrics.incr("sessions.timer_error")
+        return 0
+    return len(timers)
+
+
+async def cancel_session(session_id: int, redis: Optional[Redis] = None) -> None:
+    redis = redis or cache.get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.zrem(TIMERS_KEY, _member(session_id, WARN), _member(session_id, END))
+    except (RedisError, OSError):
+        metrics.incr("sessions.timer_error")
+
+
+async def pop_due(limit: int, redis: Optional[Redis] = None) -> List[Tuple[int, str]]:
+    """Remove and return up to ``limit`` due (session_id, kind) timers, soonest first."""
+    redis = redis or cache.get_redis()
+    if redis is None:
+        return []
+    now = datetime.now(timezone.utc).timestamp()
+    members = await redis.eval(_POP_DUE, 1, TIMERS_KEY, now, limit)
+    due = []
+    for member in members:
+        member = member.decode() if isinstance(member, bytes) else member
+        session_id, kind = member.split(":", 1)
+        due.append((int(session_id), kind))
+    return due
+
+
+async def requeue(timers: Iterable[Tuple[int, str]], delay: float, redis: Optional[Redis] = None) -> None:
+    """Put popped timers back, e.g. when handling them failed."""
+    redis = redis or cache.get_redis()
+    timers = list(timers)
+    if redis is None or not timers:
+        return
+    due_at = datetime.now(timezone.utc).timestamp() + delay
+    try:
+        await redis.zadd(TIMERS_KEY, {_member(session_id, kind): due_at for session_id, kind in timers})
+    except (RedisError, OSError):
+        metrics.incr("sessions.timer_error")
+
+
+async def pending_count(redis: Optional[Redis] = None) -> int:
+    redis = redis or cache.get_redis()
+    if redis is None:
+        return 0
+    return await redis.zcard(TIMERS_KEY)
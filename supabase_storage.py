@@ -1,31 +1,315 @@
-from typing import Optional
+import base64
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+import httpx
 
-from supabase import create_client, Client
 from config import settings
 
-if not settings.supabase_url or not settings.supabase_service_key:
-    raise RuntimeError("SUPABASE_URL or SUPABASE_SERVICE_KEY missing from .env")
+if TYPE_CHECKING:
+    from supabase import Client
+
+TUS_VERSION = "1.0.0"
+TUS_HEADERS = {"Tus-Resumable": TUS_VERSION}
+RESUMABLE_ENDPOINT = "storage/v1/upload/resumable"
+
+
+@dataclass
+class UploadProgress:
+    remote_path: str
+    sent: int
+    total: int
+    elapsed: float
+    # Bytes already on the server when this call resumed the upload.
+    resumed_from: int = 0
+
+    @property
+    def bytes_per_second(self) -> float:
+        transferred = self.sent - self.resumed_from
+        return transferred / self.elapsed if self.elapsed > 0 else 0.0
+
+
+ProgressCallback = Callable[[UploadProgress], None]
+
+
+def _base_url() -> str:
+    if not settings.supabase_url or not settings.supabase_service_key:
+        raise RuntimeError("SUPABASE_URL or SUPABASE_SERVICE_KEY missing from .env")
+    supabase_url = settings.supabase_url
+    if not supabase_url.endswith("/"):
+        supabase_url += "/"
+    return supabase_url
+
+
+@lru_cache(maxsize=1)
+def get_supabase() -> "Client":
+    """Create the Supabase client on first use; importing this module stays cheap."""
+    from supabase import create_client
+
+    return create_client(_base_url(), settings.supabase_service_key)
+
 
-supabase_url = settings.supabase_url
-if not supabase_url.endswith("/"):
-    supabase_url += "/"
+@lru_cache(maxsize=1)
+def _http() -> httpx.Client:
+    """Shared client for the raw Storage endpoints; reuses connections across threads."""
+    key = settings.supabase_service_key
+    return httpx.Client(
+        base_url=_base_url(),
+        headers={"Authorization": f"Bearer {key}", "apikey": key},
+        timeout=settings.storage_timeout,
+    )
 
-supabase: Client = create_client(supabase_url, settings.supabase_service_key)
 
-def upload_file(local_path: str, bucket: Optional[str], remote_path: str):
-    """Upload a file to Supabase Storage, overwriting if it already exists."""
+def _content_type(local_path: str, content_type: Optional[str]) -> str:
+    return content_type or mimetypes.guess_type(local_path)[0] or "application/octet-stream"
+
+
+def upload_file(
+    local_path: str,
+    bucket: Optional[str],
+    remote_path: str,
+    content_type: Optional[str] = None,
+    on_progress: Optional[ProgressCallback] = None,
+):
+    """Upload a file to Supabase Storage, overwriting if it already exists.
+
+    Overwrites use upsert, so the old object stays readable until the new
+    one is stored. Files of ``storage_resumable_threshold`` bytes or more go
+    through :func:`resumable_upload`.
+    """
     bucket = bucket or settings.supabase_bucket
-    # Delete first if exists
-    try:
-        supabase.storage.from_(bucket).remove([remote_path])
-    except Exception:
-        pass  # ignore if it doesn't exist
+    size = os.path.getsize(local_path)
+    if size >= settings.storage_resumable_threshold:
+        return resumable_upload(
+            local_path, bucket, remote_path, content_type=content_type, on_progress=on_progress
+        )
 
+    started = time.perf_counter()
     with open(local_path, "rb") as f:
-        res = supabase.storage.from_(bucket).upload(remote_path, f)
+        res = get_supabase().storage.from_(bucket).upload(
+            remote_path,
+            f,
+            file_options={"upsert": "true", "content-type": _content_type(local_path, content_type)},
+        )
+    if on_progress:
+        on_progress(UploadProgress(remote_path, size, size, time.perf_counter() - started))
     return res
 
+
+class _ResumeState:
+    """Remembers the TUS upload URL for a file so a later call can pick it up."""
+
+    def __init__(self, local_path: str, bucket: str, remote_path: str, state_dir: Optional[str]):
+        stat = os.stat(local_path)
+        fingerprint = hashlib.sha256(
+            f"{Path(local_path).resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{bucket}/{remote_path}".encode()
+        ).hexdigest()[:32]
+        directory = Path(state_dir or settings.storage_resume_dir or Path(tempfile.gettempdir()) / "velvet_uploads")
+        self.path = directory / f"{fingerprint}.json"
+
+    def load(self) -> Optional[str]:
+        try:
+            return json.loads(self.path.read_text())["upload_url"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, upload_url: str) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps({"upload_url": upload_url}))
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def _b64(value: str) -> str:
+    return base64.b64encode(value.encode()).decode()
+
+
+def _tus_offset(http: httpx.Client, upload_url: str) -> Optional[int]:
+    """Ask the server how much of the upload it has; None if it no longer knows it."""
+    response = http.head(upload_url, headers=TUS_HEADERS)
+    if response.status_code in (404, 410):
+        return None
+    response.raise_for_status()
+    return int(response.headers["Upload-Offset"])
+
+
+def _tus_create(
+    http: httpx.Client, bucket: str, remote_path: str, size: int, content_type: str
+) -> str:
+    metadata = {
+        "bucketName": bucket,
+        "objectName": remote_path,
+        "contentType": content_type,
+        "cacheControl": "3600",
+    }
+    response = http.post(
+        RESUMABLE_ENDPOINT,
+        headers={
+            **TUS_HEADERS,
+            "Upload-Length": str(size),
+            "Upload-Metadata": ",".join(f"{key} {_b64(value)}" for key, value in metadata.items()),
+            "x-upsert": "true",
+        },
+    )
+    response.raise_for_status()
+    return str(response.url.join(response.headers["Location"]))
+
+
+def _retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        # 409: offset mismatch, resync and carry on. 423: upload locked by a dying request.
+        return exc.response.status_code in (409, 423, 429) or exc.response.status_code >= 500
+    return False
+
+
+def resumable_upload(
+    local_path: str,
+    bucket: Optional[str],
+    remote_path: str,
+    content_type: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    max_retries: Optional[int] = None,
+    state_dir: Optional[str] = None,
+) -> str:
+    """Upload ``local_path`` with the TUS protocol, one chunk in memory at a time.
+
+    After a failed chunk the server is asked for its offset and the upload
+    continues from there. If the call gives up, the upload URL is kept on
+    disk and the next call for the same unchanged file resumes it. Returns
+    the ``bucket/path`` key.
+    """
+    bucket = bucket or settings.supabase_bucket
+    chunk_size = chunk_size or settings.storage_chunk_size
+    max_retries = settings.storage_max_retries if max_retries is None else max_retries
+    size = os.path.getsize(local_path)
+    state = _ResumeState(local_path, bucket, remote_path, state_dir)
+    http = _http()
+
+    started = time.perf_counter()
+    upload_url = state.load()
+    offset = _tus_offset(http, upload_url) if upload_url else None
+    if offset is None:
+        upload_url = _tus_create(
+            http, bucket, remote_path, size, _content_type(local_path, content_type)
+        )
+        state.save(upload_url)
+        offset = 0
+    resumed_from = offset
+
+    failures = 0
+    with open(local_path, "rb") as f:
+        while offset < size:
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            try:
+                response = http.patch(
+                    upload_url,
+                    content=chunk,
+                    headers={
+                        **TUS_HEADERS,
+                        "Upload-Offset": str(offset),
+                        "Content-Type": "application/offset+octet-stream",
+                    },
+                )
+                response.raise_for_status()
+                offset = int(response.headers["Upload-Offset"])
+                failures = 0
+            except (httpx.TransportError, httpx.HTTPStatusError) as exc:
+                failures += 1
+                if not _retryable(exc) or failures > max_retries:
+                    raise
+                time.sleep(min(0.25 * 2 ** failures, 10.0))
+                try:
+                    server_offset = _tus_offset(http, upload_url)
+                except (httpx.TransportError, httpx.HTTPStatusError):
+                    continue  # retry the same chunk
+                if server_offset is None:
+                    state.clear()
+                    raise
+                offset = server_offset
+            if on_progress:
+                on_progress(
+                    UploadProgress(
+                        remote_path, offset, size, time.perf_counter() - started, resumed_from
+                    )
+                )
+    state.clear()
+    return f"{bucket}/{remote_path}"
+
+
+def upload_bytes(
+    data: bytes, bucket: Optional[str], remote_path: str, content_type: str = "application/octet-stream"
+) -> None:
+    """Upsert a small in-memory object in one request."""
+    bucket = bucket or settings.supabase_bucket
+    response = _http().post(
+        f"storage/v1/object/{bucket}/{remote_path}",
+        content=data,
+        headers={"Content-Type": content_type, "x-upsert": "true"},
+    )
+    response.raise_for_status()
+
+
+def download_bytes(bucket: Optional[str], remote_path: str) -> Optional[bytes]:
+    """Fetch a small object; None if it doesn't exist."""
+    bucket = bucket or settings.supabase_bucket
+    response = _http().get(f"storage/v1/object/{bucket}/{remote_path}")
+    # Storage reports a missing object as 400 with a not_found body, or 404.
+    if response.status_code in (400, 404) and "not_found" in response.text.lower().replace(" ", "_"):
+        return None
+    response.raise_for_status()
+    return response.content
+
+
+def list_objects(bucket: Optional[str], prefix: str, page_size: int = 1000) -> List[dict]:
+    """Entries directly under ``prefix`` (objects, and folders with a null id), all pages."""
+    bucket = bucket or settings.supabase_bucket
+    entries: List[dict] = []
+    while True:
+        response = _http().post(
+            f"storage/v1/object/list/{bucket}",
+            json={
+                "prefix": prefix,
+                "limit": page_size,
+                "offset": len(entries),
+                "sortBy": {"column": "name", "order": "asc"},
+            },
+        )
+        response.raise_for_status()
+        page = response.json()
+        entries.extend(page)
+        if len(page) < page_size:
+            return entries
+
+
+def download_file(
+    bucket: Optional[str], remote_path: str, local_path: str, chunk_size: int = 1024 * 1024
+) -> int:
+    """Stream an object to ``local_path`` without holding it in memory; returns its size."""
+    bucket = bucket or settings.supabase_bucket
+    written = 0
+    with _http().stream("GET", f"storage/v1/object/{bucket}/{remote_path}") as response:
+        response.raise_for_status()
+        with open(local_path, "wb") as f:
+            for chunk in response.iter_bytes(chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+    return written
+
+
 def get_public_url(bucket: Optional[str], remote_path: str) -> str:
     """Return the public URL of a file in Supabase storage."""
     bucket = bucket or settings.supabase_bucket
-    return supabase.storage.from_(bucket).get_public_url(remote_path)
+    return get_supabase().storage.from_(bucket).get_public_url(remote_path)
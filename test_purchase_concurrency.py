@@ -0,0 +1,90 @@
+import asyncio
+from pathlib import Path
+import secrets
+import sys
+
+from sqlalchemy import delete, select
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT / "bot"))
+
+from content_flow import create_purchase  # noqa: E402
+from db import AsyncSessionLocal, engine  # noqa: E402
+from models import ClientProfile, ContentPurchase, DigitalContent, ModelProfile, User  # noqa: E402
+
+PARALLEL_PURCHASES = 50
+PRICE = 2.5
+
+
+async def _create_fixtures():
+    suffix = secrets.randbelow(10**9)
+    async with AsyncSessionLocal() as db:
+        model = User(telegram_id=-(10**10) - suffix, role="model")
+        client = User(telegram_id=-(2 * 10**10) - suffix, role="client")
+        db.add_all([model, client])
+        await db.flush()
+        db.add_all(
+            [
+                ModelProfile(user_id=model.id, display_name="concurrency-test", total_earnings=0),
+                ClientProfile(user_id=client.id, total_spent=0),
+            ]
+        )
+        content = DigitalContent(
+            model_id=model.id, content_type="photo", title="concurrency-test", price=PRICE
+        )
+        db.add(content)
+        await db.commit()
+        return model, client, content
+
+
+async def _buy(content_id: int, client: User):
+    async with AsyncSessionLocal() as db:
+        return await create_purchase(db, content_id, client)
+
+
+async def _cleanup(model: User, client: User, content: DigitalContent):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(ContentPurchase).where(ContentPurchase.content_id == content.id))
+        await db.execute(delete(DigitalContent).where(DigitalContent.id == content.id))
+        await db.execute(delete(ModelProfile).where(ModelProfile.user_id == model.id))
+        await db.execute(delete(ClientProfile).where(ClientProfile.user_id == client.id))
+        await db.execute(delete(User).where(User.id.in_([model.id, client.id])))
+        await db.commit()
+
+
+async def test_parallel_purchases():
+    model, client, content = await _create_fixtures()
+    try:
+        purchases = await asyncio.gather(
+            *(_buy(content.id, client) for _ in range(PARALLEL_PURCHASES))
+        )
+        assert all(purchases), "every purchase should be recorded"
+
+        async with AsyncSessionLocal() as db:
+            sales, revenue = (
+                await db.execute(
+                    select(DigitalContent.total_sales, DigitalContent.total_revenue).where(
+                        DigitalContent.id == content.id
+                    )
+                )
+            ).one()
+            earnings = await db.scalar(
+                select(ModelProfile.total_earnings).where(ModelProfile.user_id == model.id)
+            )
+            spent = await db.scalar(
+                select(ClientProfile.total_spent).where(ClientProfile.user_id == client.id)
+            )
+
+        expected = PARALLEL_PURCHASES * PRICE
+        assert sales == PARALLEL_PURCHASES, f"total_sales={sales}"
+        assert revenue == expected, f"total_revenue={revenue}"
+        assert earnings == expected, f"total_earnings={earnings}"
+        assert spent == expected, f"total_spent={spent}"
+        print(f"✅ {PARALLEL_PURCHASES} parallel purchases, counters exact: {sales} sales, ${revenue}")
+    finally:
+        await _cleanup(model, client, content)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_parallel_purchases())
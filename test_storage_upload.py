@@ -0,0 +1,70 @@
+"""Upload smoke test against the local storage stand-in (no Supabase account needed)."""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT / "scripts"))
+
+from fake_storage_server import FakeStorage, start_fake_storage  # noqa: E402
+
+PORT = 54329
+os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ["SUPABASE_SERVICE_KEY"] = "stand-in.service.key"
+os.environ["STORAGE_RESUMABLE_THRESHOLD"] = str(1024 * 1024)
+os.environ["STORAGE_CHUNK_SIZE"] = str(256 * 1024)
+
+import httpx  # noqa: E402
+
+from supabase_storage import resumable_upload, upload_file  # noqa: E402
+
+storage = FakeStorage(patch_fail_every=3)
+ready = threading.Event()
+
+
+def _serve():
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(start_fake_storage("127.0.0.1", PORT, storage))
+    ready.set()
+    loop.run_forever()
+
+
+threading.Thread(target=_serve, daemon=True).start()
+ready.wait()
+
+with tempfile.TemporaryDirectory() as tmp:
+    small = Path(tmp, "small.bin")
+    small.write_bytes(b"first")
+    upload_file(str(small), "media", "test/small.bin")
+    small.write_bytes(b"second version")
+    upload_file(str(small), "media", "test/small.bin")
+    assert storage.objects["media/test/small.bin"] == b"second version"
+    assert storage.requests["DELETE"] == 0
+    print("✅ Small upload overwrote in place (upsert, no remove)")
+
+    large = Path(tmp, "large.bin")
+    large.write_bytes(os.urandom(3 * 1024 * 1024 + 123))
+    rates = []
+    upload_file(str(large), "media", "test/large.bin", on_progress=lambda p: rates.append(p))
+    assert storage.objects["media/test/large.bin"] == large.read_bytes()
+    print(f"✅ Resumable upload survived injected failures: {len(rates)} progress reports, "
+          f"last {rates[-1].bytes_per_second / 1e6:.1f} MB/s")
+
+    # Give up on the first failure, then resume the same upload from the server's offset.
+    state_dir = Path(tmp, "state")
+    try:
+        resumable_upload(str(large), "media", "test/resumed.bin", max_retries=0, state_dir=str(state_dir))
+        raise AssertionError("expected the injected failure to abort the upload")
+    except httpx.HTTPStatusError:
+        pass
+    creates = storage.requests["POST"]
+    progress = []
+    resumable_upload(str(large), "media", "test/resumed.bin", state_dir=str(state_dir), on_progress=progress.append)
+    assert storage.requests["POST"] == creates, "resume must not create a new upload"
+    assert progress[0].resumed_from > 0
+    assert storage.objects["media/test/resumed.bin"] == large.read_bytes()
+    assert not any(state_dir.iterdir())
+    print(f"✅ Second call resumed from byte {progress[0].resumed_from}")
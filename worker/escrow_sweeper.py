@@ -0,0 +1,56 @@
+import time
+from datetime import timedelta
+from typing import List
+
+from sqlalchemy import Row
+
+import metrics
+from config import settings
+from db import AsyncSessionLocal
+from outbox import enqueue_notification
+from session_flow import release_due_escrows
+
+# Telegram rejects messages over 4096 characters.
+_MESSAGE_LIMIT = 4000
+
+
+def _batch_summary(released: List[Row], grace_hours: float) -> str:
+    total = sum(row.amount or 0 for row in released)
+    header = (
+        f"Escrow auto-released for {len(released)} sessions (${total:.2f}) "
+        f"completed over {grace_hours:g}h ago without a dispute:"
+    )
+    lines = [header]
+    length = len(header)
+    for index, row in enumerate(released):
+        line = f"{row.session_ref} - ${row.amount or 0:.2f}"
+        if length + len(line) + 40 > _MESSAGE_LIMIT:
+            lines.append(f"...and {len(released) - index} more")
+            break
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)
+
+
+async def sweep_escrow() -> bool:
+    """Release one batch of due escrows.
+
+    Returns True after a full batch, which tells the runner there is probably
+    more to do and to call again straight away instead of waiting.
+    """
+    batch_size = settings.escrow_release_batch_size
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        released = await release_due_escrows(
+            db, timedelta(hours=settings.escrow_release_grace_hours), batch_size
+        )
+        if released:
+            enqueue_notification(
+                db,
+                settings.escrow_log_channel_id,
+                _batch_summary(released, settings.escrow_release_grace_hours),
+            )
+        await db.commit()
+    metrics.observe("escrow.sweep", time.perf_counter() - started)
+    metrics.incr("escrow.auto_released", len(released))
+    return len(released) >= batch_size
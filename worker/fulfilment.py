@@ -0,0 +1,69 @@
+import time
+from typing import Dict, List
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from sqlalchemy import update
+
+import metrics
+from content_flow import get_purchased_content
+from db import AsyncSessionLocal
+from media import flood_safe, ingest_file, send_assets
+from media_registry import get_assets
+from models import DigitalContent
+from outbox import SENDER_MAIN
+
+
+async def deliver_purchases(bots: Dict[str, Bot], payload: dict) -> None:
+    """``purchases.deliver`` job: send a client's purchases ``first_id``..``last_id`` to ``chat_id``.
+
+    Media goes through the registry in albums of up to 10, so repeat
+    deliveries are file_id sends. Content added before the registry is
+    registered on first delivery. Items without media are listed in a
+    closing message. Delivery is at least once, like every job.
+    """
+    bot = bots.get(SENDER_MAIN)
+    if bot is None:
+        raise RuntimeError("No main bot configured for purchase delivery")
+    chat_id = payload["chat_id"]
+    started = time.perf_counter()
+
+    async with AsyncSessionLocal() as db:
+        rows = await get_purchased_content(db, payload["client_id"], payload["first_id"], payload["last_id"])
+        if not rows:
+            return
+        assets = await get_assets(db, (row.media_asset_id for row in rows if row.media_asset_id))
+
+        items = []
+        unavailable: List[str] = []
+        for row in rows:
+            caption = f"#{row.content_id} {row.title}"
+            asset = assets.get(row.media_asset_id)
+            if asset is None and row.telegram_file_id:
+                try:
+                    asset = await ingest_file(db, bot, SENDER_MAIN, row.telegram_file_id)
+                except TelegramBadRequest:
+                    metrics.incr("purchases.ingest_failed")
+                else:
+                    # Link it so later deliveries skip getFile and the registry lookup.
+                    await db.execute(
+                        update(DigitalContent)
+                        .where(DigitalContent.id == row.content_id, DigitalContent.media_asset_id.is_(None))
+                        .values(media_asset_id=asset.id)
+                    )
+            if asset is None:
+                unavailable.append(caption)
+            else:
+                items.append((asset, caption))
+        await db.commit()
+
+        await send_assets(db, bot, SENDER_MAIN, chat_id, items)
+
+    if unavailable:
+        await flood_safe(
+            lambda: bot.send_message(
+                chat_id, "No media is attached to these items yet:\n" + "\n".join(unavailable)
+            )
+        )
+    metrics.incr("purchases.delivered", len(items))
+    metrics.observe("purchases.deliver", time.perf_counter() - started)
@@ -0,0 +1,303 @@
+import asyncio
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from aiogram import Bot, types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import (
+    BufferedInputFile,
+    InputMediaAudio,
+    InputMediaDocument,
+    InputMediaPhoto,
+    InputMediaVideo,
+)
+
+import metrics
+from config import settings
+from db import AsyncSessionLocal
+from media_registry import (
+    file_ids_due_for_validation,
+    find_asset_by_file_unique_id,
+    forget_file_id,
+    get_asset,
+    get_file_id,
+    get_file_ids,
+    load_media,
+    mark_validated,
+    register_media,
+    remember_file_id,
+)
+from models import DigitalContent, MediaAsset
+from outbox import SENDER_MAIN, enqueue_notification
+
+# Telegram rejects captions over 1024 characters.
+_CAPTION_LIMIT = 1024
+
+# media_type -> (Bot method, argument and Message attribute)
+_SEND_METHODS = {
+    "photo": ("send_photo", "photo"),
+    "video": ("send_video", "video"),
+    "animation": ("send_animation", "animation"),
+    "audio": ("send_audio", "audio"),
+    "document": ("send_document", "document"),
+}
+
+# Kinds that may share an album; animations and the rest are sent on their own.
+_ALBUM_KINDS = {"photo": "visual", "video": "visual", "document": "document", "audio": "audio"}
+_INPUT_MEDIA = {
+    "photo": InputMediaPhoto,
+    "video": InputMediaVideo,
+    "document": InputMediaDocument,
+    "audio": InputMediaAudio,
+}
+ALBUM_LIMIT = 10
+
+# getFile path folder -> media_type, for files whose kind we were not told.
+_PATH_MEDIA_TYPES = {"photos": "photo", "videos": "video", "animations": "animation", "music": "audio"}
+
+T = TypeVar("T")
+
+
+def _caption(text: Optional[str]) -> Optional[str]:
+    if text and len(text) > _CAPTION_LIMIT:
+        return text[: _CAPTION_LIMIT - 1] + "…"
+    return text
+
+
+def is_stale_file_id(exc: TelegramBadRequest) -> bool:
+    """True when Telegram no longer accepts the file_id (as opposed to any other bad request)."""
+    message = str(exc).lower()
+    return "file identifier" in message or "file reference" in message or "file_id" in message
+
+
+def sent_file(message: types.Message, media_type: str) -> Tuple[Optional[str], Optional[str]]:
+    """(file_id, file_unique_id) of the media in a message Telegram returned."""
+    if message.photo:
+        item = message.photo[-1]
+    else:
+        attribute = _SEND_METHODS.get(media_type, _SEND_METHODS["document"])[1]
+        # Telegram may file an upload under another kind (e.g. a GIF as animation).
+        item = getattr(message, attribute, None) or message.video or message.animation or message.document
+    if item is None:
+        return None, None
+    return item.file_id, item.file_unique_id
+
+
+async def _send(
+    bot: Bot,
+    media_type: str,
+    chat_id: int,
+    media: Union[str, BufferedInputFile],
+    caption: Optional[str],
+) -> types.Message:
+    method, argument = _SEND_METHODS.get(media_type, _SEND_METHODS["document"])
+    return await getattr(bot, method)(chat_id, **{argument: media}, caption=caption)
+
+
+async def send_asset(
+    db,
+    bot: Bot,
+    sender: str,
+    chat_id: int,
+    asset_id: int,
+    caption: Optional[str] = None,
+) -> types.Message:
+    """Send a registered asset, by file_id when this bot has one.
+
+    Only the first delivery per bot uploads bytes (fetched from Supabase);
+    the file_id Telegram returns is recorded for every later send. A
+    file_id Telegram rejects is dropped and the bytes are sent instead.
+    """
+    asset = await get_asset(db, asset_id)
+    if asset is None:
+        raise LookupError(f"Media asset {asset_id} does not exist")
+    caption = _caption(caption)
+
+    file_id = await get_file_id(db, asset.id, sender)
+    if file_id:
+        try:
+            message = await _send(bot, asset.media_type, chat_id, file_id, caption)
+        except TelegramBadRequest as exc:
+            if not is_stale_file_id(exc):
+                raise
+            await forget_file_id(db, asset.id, sender)
+            await db.commit()
+            metrics.incr("media.stale_file_id")
+        else:
+            metrics.incr("media.send.file_id")
+            return message
+
+    started = time.perf_counter()
+    data = await load_media(asset)
+    upload = BufferedInputFile(data, filename=asset.sha256[:16])
+    message = await _send(bot, asset.media_type, chat_id, upload, caption)
+    new_file_id, file_unique_id = sent_file(message, asset.media_type)
+    if new_file_id:
+        await remember_file_id(db, asset.id, sender, new_file_id, file_unique_id)
+        await db.commit()
+    metrics.incr("media.send.upload")
+    metrics.incr("media.upload_bytes", len(data))
+    metrics.observe("media.upload", time.perf_counter() - started)
+    return message
+
+
+def _media_type_from_path(file_path: Optional[str]) -> str:
+    folder = (file_path or "").split("/", 1)[0]
+    return _PATH_MEDIA_TYPES.get(folder, "document")
+
+
+async def ingest_file(
+    db,
+    bot: Bot,
+    sender: str,
+    file_id: str,
+    media_type: Optional[str] = None,
+    file_unique_id: Optional[str] = None,
+) -> MediaAsset:
+    """Registry asset for a file_id this bot can already use.
+
+    Media already known by its file_unique_id is not downloaded again, and
+    bytes already stored under the same hash are not uploaded again. Bots
+    can only download files up to 20 MB. The caller commits.
+    """
+    asset = await find_asset_by_file_unique_id(db, file_unique_id) if file_unique_id else None
+    if asset is None:
+        file = await bot.get_file(file_id)
+        file_unique_id = file.file_unique_id
+        asset = await find_asset_by_file_unique_id(db, file_unique_id)
+        if asset is None:
+            buffer = await bot.download_file(file.file_path)
+            asset, _ = await register_media(
+                db, buffer.getvalue(), media_type or _media_type_from_path(file.file_path)
+            )
+    await remember_file_id(db, asset.id, sender, file_id, file_unique_id)
+    return asset
+
+
+async def ingest_content_media(bots: Dict[str, Bot], payload: dict) -> None:
+    """``media.ingest`` job: register media a model attached to /add_content.
+
+    The content's announcements are queued once the asset exists, in the
+    same transaction that links it to the content.
+    """
+    sender = payload.get("sender", SENDER_MAIN)
+    bot = bots.get(sender)
+    if bot is None:
+        raise RuntimeError(f"No bot configured for sender {sender!r}")
+    async with AsyncSessionLocal() as db:
+        content = await db.get(DigitalContent, payload["content_id"])
+        if content is None or content.media_asset_id is not None:
+            return  # deleted, or a redelivery of a job that already committed
+
+        asset = await ingest_file(
+            db, bot, sender, payload["file_id"], payload["media_type"], payload["file_unique_id"]
+        )
+        content.media_asset_id = asset.id
+        for item in payload.get("announcements", []):
+            enqueue_notification(
+                db,
+                item["chat_id"],
+                item["text"],
+                media_asset_id=asset.id if item.get("with_media") else None,
+            )
+        await db.commit()
+
+
+async def flood_safe(call: Callable[[], Awaitable[T]], attempts: int = 3) -> T:
+    """Await ``call()``, waiting out Telegram flood limits.
+
+    Used mid-delivery, where failing the job would resend what already went out.
+    """
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except TelegramRetryAfter as exc:
+            if attempt == attempts - 1:
+                raise
+            metrics.incr("media.flood_wait")
+            await asyncio.sleep(exc.retry_after)
+
+
+async def _send_album(
+    db, bot: Bot, sender: str, chat_id: int, items: Sequence[Tuple[MediaAsset, Optional[str]]]
+) -> None:
+    file_ids = await get_file_ids(db, (asset.id for asset, _ in items), sender)
+    missing = [asset for asset, _ in items if asset.id not in file_ids]
+    uploads = dict(
+        zip((asset.id for asset in missing), await asyncio.gather(*(load_media(asset) for asset in missing)))
+    )
+
+    media = []
+    for asset, caption in items:
+        source = file_ids.get(asset.id) or BufferedInputFile(uploads[asset.id], filename=asset.sha256[:16])
+        media.append(_INPUT_MEDIA[asset.media_type](media=source, caption=_caption(caption)))
+    messages = await bot.send_media_group(chat_id, media)
+
+    for (asset, _), message in zip(items, messages):
+        if asset.id in uploads:
+            new_file_id, file_unique_id = sent_file(message, asset.media_type)
+            if new_file_id:
+                await remember_file_id(db, asset.id, sender, new_file_id, file_unique_id)
+    await db.commit()
+    metrics.incr("media.send.album")
+    metrics.incr("media.send.file_id", len(items) - len(uploads))
+    metrics.incr("media.send.upload", len(uploads))
+    metrics.incr("media.upload_bytes", sum(len(data) for data in uploads.values()))
+
+
+async def send_assets(
+    db, bot: Bot, sender: str, chat_id: int, items: Sequence[Tuple[MediaAsset, Optional[str]]]
+) -> None:
+    """Send (asset, caption) pairs, grouped into albums of up to 10 where Telegram allows it."""
+    groups: Dict[str, List[Tuple[MediaAsset, Optional[str]]]] = defaultdict(list)
+    singles: List[Tuple[MediaAsset, Optional[str]]] = []
+    for asset, caption in items:
+        kind = _ALBUM_KINDS.get(asset.media_type)
+        (groups[kind] if kind else singles).append((asset, caption))
+
+    for members in groups.values():
+        for start in range(0, len(members), ALBUM_LIMIT):
+            chunk = members[start : start + ALBUM_LIMIT]
+            if len(chunk) == 1:
+                singles.extend(chunk)
+                continue
+            try:
+                await flood_safe(lambda: _send_album(db, bot, sender, chat_id, chunk))
+            except TelegramBadRequest as exc:
+                if not is_stale_file_id(exc):
+                    raise
+                # One stale file_id fails the whole album; send_asset repairs them one by one.
+                metrics.incr("media.album_fallback")
+                singles.extend(chunk)
+
+    for asset, caption in singles:
+        await flood_safe(lambda: send_asset(db, bot, sender, chat_id, asset.id, caption))
+
+
+async def revalidate_file_ids(bots: Dict[str, Bot]) -> bool:
+    """Check the oldest-validated file_ids with getFile and drop the ones Telegram rejects.
+
+    Returns True after a full batch so the runner calls again straight away.
+    """
+    limit = settings.media_revalidate_batch_size
+    async with AsyncSessionLocal() as db:
+        rows = await file_ids_due_for_validation(
+            db, list(bots), timedelta(days=settings.media_revalidate_days), limit
+        )
+        valid = []
+        for row in rows:
+            try:
+                await bots[row.sender].get_file(row.file_id)
+            except TelegramBadRequest as exc:
+                if is_stale_file_id(exc):
+                    await forget_file_id(db, row.asset_id, row.sender)
+                    metrics.incr("media.stale_file_id")
+                    continue
+                # e.g. "file is too big": the id still works for sending.
+            valid.append(row.id)
+        await mark_validated(db, valid)
+        await db.commit()
+    metrics.incr("media.revalidated", len(valid))
+    return len(rows) >= limit
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+import metrics
+from config import settings
+from db import AsyncSessionLocal
+from media import send_asset
+from models import OutboxMessage
+from outbox import claim_outbox_batch, mark_failed, mark_retry, mark_sent, postpone
+
+
+class ChatRateLimiter:
+    """Spaces out sends to the same chat (Telegram allows ~20 messages/minute per group)."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_slot: Dict[int, float] = {}
+
+    def reserve(self, chat_id: int) -> float:
+        """Claim the next send slot for ``chat_id``; returns seconds until it opens."""
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(chat_id, 0.0))
+        self._next_slot[chat_id] = slot + self.interval
+        if len(self._next_slot) > 10000:
+            self._next_slot = {chat: ready for chat, ready in self._next_slot.items() if ready > now}
+        return slot - now
+
+    def defer(self, chat_id: int, seconds: float) -> None:
+        self._next_slot[chat_id] = time.monotonic() + seconds
+
+
+async def _send_chat_messages(
+    bots: Dict[str, Bot], limiter: ChatRateLimiter, messages: List[OutboxMessage]
+) -> None:
+    async with AsyncSessionLocal() as db:
+        for index, message in enumerate(messages):
+            bot = bots.get(message.sender)
+            if bot is None:
+                await mark_failed(db, message.id, f"No bot configured for sender {message.sender!r}")
+                metrics.incr("outbox.failed")
+                continue
+
+            wait = limiter.reserve(message.chat_id)
+            if wait > limiter.interval:
+                # Too far out to hold the lease for; let a later drain pick it up.
+                await postpone(db, message.id, wait)
+                metrics.incr("outbox.postponed")
+                continue
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            started = time.perf_counter()
+            try:
+                if message.media_asset_id:
+                    await send_asset(
+                        db, bot, message.sender, message.chat_id, message.media_asset_id, message.text
+                    )
+                else:
+                    await bot.send_message(message.chat_id, message.text)
+            except TelegramRetryAfter as exc:
+                limiter.defer(message.chat_id, exc.retry_after)
+                for pending in messages[index:]:
+                    await postpone(db, pending.id, exc.retry_after)
+                metrics.incr("outbox.flood_wait")
+                return
+            except (TelegramNetworkError, TelegramServerError) as exc:
+                retried = await mark_retry(db, message, str(exc), settings.outbox_max_attempts)
+                metrics.incr("outbox.retry" if retried else "outbox.failed")
+            except TelegramAPIError as exc:
+                # Bad request, forbidden, chat not found: retrying will not help.
+                await mark_failed(db, message.id, str(exc))
+                metrics.incr("outbox.failed")
+            except Exception as exc:  # noqa: BLE001 - keep draining other messages
+                retried = await mark_retry(db, message, repr(exc), settings.outbox_max_attempts)
+                metrics.incr("outbox.retry" if retried else "outbox.failed")
+            else:
+                await mark_sent(db, message.id)
+                metrics.incr("outbox.sent")
+                metrics.observe("outbox.send", time.perf_counter() - started)
+
+
+async def drain_outbox(bots: Dict[str, Bot], limiter: ChatRateLimiter) -> int:
+    """Send one batch of due outbox messages; returns how many were claimed.
+
+    Chats are drained concurrently, messages within a chat in order.
+    """
+    async with AsyncSessionLocal() as db:
+        messages = await claim_outbox_batch(db, settings.outbox_batch_size)
+    if not messages:
+        return 0
+
+    by_chat: Dict[tuple, List[OutboxMessage]] = defaultdict(list)
+    for message in messages:
+        by_chat[(message.sender, message.chat_id)].append(message)
+    await asyncio.gather(
+        *(_send_chat_messages(bots, limiter, chat_messages) for chat_messages in by_chat.values())
+    )
+    return len(messages)
@@ -0,0 +1,342 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError, ResponseError
+
+import metrics
+from config import settings
+from jobs import (
+    DELAYED_KEY,
+    GROUP,
+    STREAM_PREFIX,
+    dead_key,
+    delayed_member,
+    job_fields,
+    stream_key,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 600
+_READ_BLOCK_MS = 1000
+_PROMOTE_INTERVAL = 0.5
+_PROMOTE_BATCH = 100
+
+# Move due retries from the delayed zset back onto their streams in one step,
+# so two workers promoting at once can't duplicate a job.
+_PROMOTE_DUE = """
+local due = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(due) do
+    local job = cjson.decode(member)
+    redis.call('xadd', ARGV[3] .. job['type'], 'MAXLEN', '~', ARGV[4], '*',
+        'payload', job['payload'], 'attempts', job['attempts'], 'enqueued_at', job['enqueued_at'])
+    redis.call('zrem', KEYS[1], member)
+end
+return #due
+"""
+
+JobHandler = Callable[[Any], Awaitable[None]]
+
+
+@dataclass
+class JobType:
+    name: str
+    handler: JobHandler
+    concurrency: int
+    max_attempts: int
+    timeout: Optional[float] = None
+
+
+@dataclass
+class PeriodicTask:
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    interval: float
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class JobRunner:
+    """Redis Streams consumer-group runner.
+
+    Each job type has its own stream (``jobs:<type>``) and a concurrency limit.
+    A job is acked only after its handler finishes: failures are re-queued
+    through the ``jobs:delayed`` zset with exponential backoff and land in
+    ``jobs:<type>:dead`` after ``max_attempts``. Entries left pending by a
+    crashed consumer are taken over with XAUTOCLAIM after the visibility
+    timeout.
+    """
+
+    def __init__(self, redis: Redis, consumer: Optional[str] = None):
+        self.redis = redis
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.job_types: Dict[str, JobType] = {}
+        self.periodic: List[PeriodicTask] = []
+        self._stopping = asyncio.Event()
+        self._in_flight: Dict[str, Set[asyncio.Task]] = {}
+
+    def register(
+        self,
+        name: str,
+        handler: JobHandler,
+        concurrency: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        if concurrency is None:
+            concurrency = settings.job_concurrency.get(name, settings.job_default_concurrency)
+        self.job_types[name] = JobType(
+            name=name,
+            handler=handler,
+            concurrency=max(1, concurrency),
+            max_attempts=max_attempts or settings.job_max_attempts,
+            timeout=timeout,
+        )
+        self._in_flight[name] = set()
+
+    def every(self, name: str, func: Callable[[], Awaitable[Any]], interval: float) -> None:
+        """Run ``func`` in a loop, sleeping ``interval`` whenever it returns falsy (idle)."""
+        self.periodic.append(PeriodicTask(name=name, func=func, interval=interval))
+
+    def stop(self) -> None:
+        if not self._stopping.is_set():
+            logger.info("Worker stopping: draining in-flight jobs")
+            self._stopping.set()
+
+    async def _sleep(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _ensure_groups(self) -> None:
+        for name in self.job_types:
+            try:
+                await self.redis.xgroup_create(stream_key(name), GROUP, id="0", mkstream=True)
+            except ResponseError as exc:
+                if "BUSYGROUP" not in str(exc):
+                    raise
+
+    async def run(self) -> None:
+        await self._ensure_groups()
+        loops = [asyncio.create_task(self._promote_loop(), name="jobs.promote")]
+        for job_type in self.job_types.values():
+            loops.append(asyncio.create_task(self._consume_loop(job_type), name=f"jobs.{job_type.name}"))
+            loops.append(asyncio.create_task(self._reclaim_loop(job_type), name=f"jobs.{job_type.name}.reclaim"))
+        for task in self.periodic:
+            loops.append(asyncio.create_task(self._periodic_loop(task), name=f"periodic.{task.name}"))
+
+        await self._stopping.wait()
+        await self._drain(loops)
+
+    async def _drain(self, loops: List[asyncio.Task]) -> None:
+        # Readers exit on their own once they see the stop flag; give running
+        # jobs the shutdown window, then cancel what is left. Cancelled jobs
+        # stay pending in the group and are reclaimed by another consumer.
+        deadline = time.monotonic() + settings.worker_shutdown_timeout
+        await asyncio.wait(loops, timeout=settings.worker_shutdown_timeout)
+        in_flight = {task for tasks in self._in_flight.values() for task in tasks}
+        pending = {task for task in set(loops) | in_flight if not task.done()}
+        if pending:
+            _, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()))
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning("Cancelled %d tasks after shutdown timeout", len(pending))
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _free_slots(self, job_type: JobType) -> int:
+        return job_type.concurrency - len(self._in_flight[job_type.name])
+
+    async def _wait_for_slot(self, job_type: JobType) -> None:
+        while self._free_slots(job_type) <= 0 and not self._stopping.is_set():
+            await asyncio.wait(self._in_flight[job_type.name], return_when=asyncio.FIRST_COMPLETED)
+
+    def _spawn(self, job_type: JobType, entry_id: str, fields: dict) -> None:
+        task = asyncio.create_task(self._handle(job_type, entry_id, fields))
+        in_flight = self._in_flight[job_type.name]
+        in_flight.add(task)
+        metrics.set_gauge(f"jobs.{job_type.name}.in_flight", len(in_flight))
+
+        def _done(finished: asyncio.Task) -> None:
+            in_flight.discard(finished)
+            metrics.set_gauge(f"jobs.{job_type.name}.in_flight", len(in_flight))
+
+        task.add_done_callback(_done)
+
+    async def _consume_loop(self, job_type: JobType) -> None:
+        stream = stream_key(job_type.name)
+        while not self._stopping.is_set():
+            await self._wait_for_slot(job_type)
+            if self._stopping.is_set():
+                break
+            try:
+                response = await self.redis.xreadgroup(
+                    GROUP,
+                    self.consumer,
+                    {stream: ">"},
+                    count=self._free_slots(job_type),
+                    block=_READ_BLOCK_MS,
+                )
+            except (RedisError, OSError):
+                metrics.incr(f"jobs.{job_type.name}.redis_error")
+                logger.exception("Reading %s failed", stream)
+                await self._sleep(1)
+                continue
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    self._spawn(job_type, _decode(entry_id), fields)
+
+    async def _reclaim_loop(self, job_type: JobType) -> None:
+        stream = stream_key(job_type.name)
+        min_idle_ms = settings.job_visibility_timeout * 1000
+        while not self._stopping.is_set():
+            await self._sleep(max(1, settings.job_visibility_timeout / 4))
+            if self._stopping.is_set() or self._free_slots(job_type) <= 0:
+                continue
+            try:
+                result = await self.redis.xautoclaim(
+                    stream, GROUP, self.consumer, min_idle_ms, "0-0", count=self._free_slots(job_type)
+                )
+            except (RedisError, OSError):
+                metrics.incr(f"jobs.{job_type.name}.redis_error")
+                continue
+            for entry_id, fields in result[1]:
+                if not fields:
+                    continue  # trimmed from the stream while pending
+                entry_id = _decode(entry_id)
+                metrics.incr(f"jobs.{job_type.name}.reclaimed")
+                if await self._delivered_too_often(job_type, entry_id):
+                    # Probably crashing its consumer; don't let it take the next one down too.
+                    decoded = {_decode(key): _decode(value) for key, value in fields.items()}
+                    await self._fail(
+                        job_type, entry_id, decoded, job_type.max_attempts,
+                        RuntimeError("consumer died while running this job"),
+                    )
+                    continue
+                self._spawn(job_type, entry_id, fields)
+
+    async def _delivered_too_often(self, job_type: JobType, entry_id: str) -> bool:
+        try:
+            pending = await self.redis.xpending_range(
+                stream_key(job_type.name), GROUP, min=entry_id, max=entry_id, count=1
+            )
+        except (RedisError, OSError):
+            return False
+        return bool(pending) and pending[0]["times_delivered"] > job_type.max_attempts
+
+    async def _promote_loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await self.redis.eval(
+                    _PROMOTE_DUE,
+                    1,
+                    DELAYED_KEY,
+                    time.time(),
+                    _PROMOTE_BATCH,
+                    STREAM_PREFIX,
+                    settings.job_stream_maxlen,
+                )
+            except (RedisError, OSError):
+                metrics.incr("jobs.redis_error")
+            await self._sleep(_PROMOTE_INTERVAL)
+
+    async def _periodic_loop(self, task: PeriodicTask) -> None:
+        while not self._stopping.is_set():
+            started = time.perf_counter()
+            try:
+                busy = await task.func()
+            except Exception:
+                metrics.incr(f"periodic.{task.name}.error")
+                logger.exception("Periodic task %s failed", task.name)
+                busy = False
+            metrics.observe(f"periodic.{task.name}", time.perf_counter() - started)
+            if not busy:
+                await self._sleep(task.interval)
+
+    async def _handle(self, job_type: JobType, entry_id: str, raw_fields: dict) -> None:
+        fields = {_decode(key): _decode(value) for key, value in raw_fields.items()}
+        name = job_type.name
+        attempts = int(fields.get("attempts", 0)) + 1
+        enqueued_at = float(fields.get("enqueued_at", time.time()))
+        metrics.observe(f"jobs.{name}.wait", max(0.0, time.time() - enqueued_at))
+
+        started = time.perf_counter()
+        try:
+            payload = json.loads(fields["payload"])
+            if job_type.timeout:
+                await asyncio.wait_for(job_type.handler(payload), timeout=job_type.timeout)
+            else:
+                await job_type.handler(payload)
+        except asyncio.CancelledError:
+            raise  # shutdown: leave it pending for another consumer
+        except Exception as exc:
+            metrics.observe(f"jobs.{name}.run", time.perf_counter() - started)
+            await self._fail(job_type, entry_id, fields, attempts, exc)
+            return
+        metrics.observe(f"jobs.{name}.run", time.perf_counter() - started)
+        try:
+            await self.redis.xack(stream_key(name), GROUP, entry_id)
+        except (RedisError, OSError):
+            # The job ran; it will be redelivered after the visibility timeout.
+            metrics.incr(f"jobs.{name}.ack_error")
+            return
+        metrics.incr(f"jobs.{name}.done")
+
+    async def _fail(
+        self, job_type: JobType, entry_id: str, fields: dict, attempts: int, exc: Exception
+    ) -> None:
+        name = job_type.name
+        error = repr(exc)[:500]
+        pipe = self.redis.pipeline(transaction=True)
+        if attempts >= job_type.max_attempts:
+            logger.error("Job %s %s dead after %d attempts: %s", name, entry_id, attempts, error)
+            pipe.xadd(
+                dead_key(name),
+                {**fields, "attempts": attempts, "error": error, "failed_at": time.time()},
+                maxlen=settings.job_stream_maxlen,
+                approximate=True,
+            )
+            outcome = "dead"
+        else:
+            delay = min(2 ** attempts, MAX_BACKOFF_SECONDS)
+            retry = job_fields(None, attempts, float(fields.get("enqueued_at", time.time())))
+            retry["payload"] = fields["payload"]
+            pipe.zadd(DELAYED_KEY, {delayed_member(name, retry, entry_id): time.time() + delay})
+            outcome = "retried"
+        pipe.xack(stream_key(name), GROUP, entry_id)
+        try:
+            await pipe.execute()
+        except (RedisError, OSError):
+            metrics.incr(f"jobs.{name}.ack_error")
+            return
+        metrics.incr(f"jobs.{name}.{outcome}")
+
+
+def job_stats() -> dict:
+    """Per job type throughput and latency, derived from the metrics registry."""
+    snapshot = metrics.snapshot()
+    uptime = snapshot["uptime"] or 1.0
+    stats: Dict[str, dict] = {}
+    for counter_name, value in snapshot["counters"].items():
+        if not counter_name.startswith("jobs.") or counter_name.count(".") < 2:
+            continue
+        name, outcome = counter_name[len("jobs."):].rsplit(".", 1)
+        stats.setdefault(name, {})[outcome] = value
+    for name, counts in stats.items():
+        counts["per_second"] = counts.get("done", 0) / uptime
+        for timing in ("run", "wait"):
+            timing_stats = snapshot["timings"].get(f"jobs.{name}.{timing}")
+            if timing_stats:
+                counts[f"{timing}_p50"] = timing_stats["p50"]
+                counts[f"{timing}_p95"] = timing_stats["p95"]
+    return stats
@@ -0,0 +1,91 @@
+import logging
+import time
+
+import metrics
+import session_timers
+from config import settings
+from db import AsyncSessionLocal
+from outbox import enqueue_notification
+from session_flow import (
+    complete_expired_sessions,
+    get_active_sessions,
+    get_telegram_ids,
+    page_active_session_ends,
+)
+
+logger = logging.getLogger(__name__)
+
+_RESEED_PAGE_SIZE = 1000
+_REQUEUE_DELAY = 5.0
+
+
+def _notify_participants(db, sessions, telegram_ids, text_for) -> None:
+    for session in sessions:
+        text = text_for(session)
+        for user_id in (session.client_id, session.model_id):
+            enqueue_notification(db, telegram_ids.get(user_id), text)
+
+
+async def fire_session_timers() -> bool:
+    """Handle one batch of due session timers from the Redis timer wheel.
+
+    Returns True after a full batch so the runner calls again immediately.
+    """
+    batch_size = settings.session_timer_batch_size
+    due = await session_timers.pop_due(batch_size)
+    if not due:
+        return False
+
+    started = time.perf_counter()
+    warn_ids = [session_id for session_id, kind in due if kind == session_timers.WARN]
+    end_ids = [session_id for session_id, kind in due if kind == session_timers.END]
+    try:
+        async with AsyncSessionLocal() as db:
+            warned = await get_active_sessions(db, warn_ids) if warn_ids else []
+            ended = await complete_expired_sessions(db, end_ids) if end_ids else []
+            telegram_ids = await get_telegram_ids(
+                db, [user_id for row in warned + ended for user_id in (row.client_id, row.model_id)]
+            )
+            minutes = settings.session_warning_minutes
+            _notify_participants(
+                db, warned, telegram_ids,
+                lambda session: f"⏳ Session {session.session_ref}: {minutes} minutes left.",
+            )
+            _notify_participants(
+                db, ended, telegram_ids,
+                lambda session: f"Session {session.session_ref} has ended and was marked completed.",
+            )
+            await db.commit()
+    except Exception:
+        # Popped timers are gone from Redis; put them back so they are not lost.
+        await session_timers.requeue(due, _REQUEUE_DELAY)
+        raise
+
+    metrics.observe("sessions.timers", time.perf_counter() - started)
+    metrics.incr("sessions.warned", len(warned))
+    metrics.incr("sessions.auto_completed", len(ended))
+    return len(due) >= batch_size
+
+
+async def reseed_session_timers() -> bool:
+    """Re-arm timers for every active session from the database.
+
+    Covers timers lost with Redis or never armed because Redis was down when
+    the session started. Uses the partial (scheduled_end, id) index on
+    active sessions, so it never scans the whole table.
+    """
+    warn_before = settings.session_warning_minutes * 60
+    armed = 0
+    after = None
+    async with AsyncSessionLocal() as db:
+        while True:
+            rows = await page_active_session_ends(db, after, _RESEED_PAGE_SIZE)
+            if not rows:
+                break
+            armed += await session_timers.schedule_many(
+                [(row.id, row.scheduled_end) for row in rows], warn_before
+            )
+            after = (rows[-1].scheduled_end, rows[-1].id)
+    metrics.set_gauge("sessions.timers_pending", await session_timers.pending_count())
+    logger.info("Re-armed %d session timers", armed)
+    return False
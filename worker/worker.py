@@ -1,11 +1,98 @@
 import asyncio
+from functools import partial
+import logging
+from pathlib import Path
+import signal
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "bot"))
+
+from aiogram import Bot  # noqa: E402
+from aiohttp import web  # noqa: E402
+from redis.asyncio import Redis  # noqa: E402
+
+import cache  # noqa: E402
+import metrics  # noqa: E402
+from config import settings  # noqa: E402
+from db import engine, pool_stats, prewarm_pool  # noqa: E402
+from escrow_sweeper import sweep_escrow  # noqa: E402
+from fulfilment import deliver_purchases  # noqa: E402
+from media import ingest_content_media, revalidate_file_ids  # noqa: E402
+from notifications import ChatRateLimiter, drain_outbox  # noqa: E402
+from outbox import SENDER_ADMIN, SENDER_MAIN  # noqa: E402
+from runner import JobRunner, job_stats  # noqa: E402
+from session_expiry import fire_session_timers, reseed_session_timers  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def _build_bots() -> dict:
+    bots = {}
+    if settings.bot_token:
+        bots[SENDER_MAIN] = Bot(token=settings.bot_token)
+    if settings.admin_bot_token:
+        bots[SENDER_ADMIN] = Bot(token=settings.admin_bot_token)
+    return bots
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    snapshot = metrics.snapshot()
+    snapshot["jobs"] = job_stats()
+    snapshot["db_pool"] = pool_stats()
+    return web.json_response(snapshot)
+
+
+async def _start_metrics_server() -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    app_runner = web.AppRunner(app)
+    await app_runner.setup()
+    await web.TCPSite(app_runner, settings.webhook_host, settings.worker_metrics_port).start()
+    return app_runner
+
+
+def register_jobs(runner: JobRunner, bots: dict) -> None:
+    limiter = ChatRateLimiter(settings.outbox_chat_interval)
+    runner.every("outbox.drain", lambda: drain_outbox(bots, limiter), settings.outbox_poll_interval)
+    runner.every("escrow.sweep", sweep_escrow, settings.escrow_sweep_interval)
+    runner.every("sessions.timers", fire_session_timers, settings.session_timer_poll_interval)
+    runner.every("sessions.reseed", reseed_session_timers, settings.session_timer_reseed_interval)
+    runner.every("media.revalidate", lambda: revalidate_file_ids(bots), settings.media_revalidate_interval)
+    runner.register("media.ingest", partial(ingest_content_media, bots))
+    runner.register("purchases.deliver", partial(deliver_purchases, bots))
 
 
 async def background_worker():
-    while True:
-        print("Worker running...")
-        await asyncio.sleep(10)
+    if not settings.redis_url:
+        raise RuntimeError("REDIS_URL must be set to run the worker")
+    redis_client = Redis.from_url(settings.redis_url)
+    cache.set_redis(redis_client)
+    await prewarm_pool()
+    bots = _build_bots()
+    runner = JobRunner(redis_client)
+    register_jobs(runner, bots)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, runner.stop)
+
+    metrics_runner = await _start_metrics_server() if settings.worker_metrics_port else None
+    logger.info("Worker %s started: jobs=%s", runner.consumer, sorted(runner.job_types))
+    try:
+        await runner.run()
+    finally:
+        logger.info("Worker stopped: %s", job_stats())
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        for bot in bots.values():
+            await bot.session.close()
+        cache.set_redis(None)
+        await redis_client.close()
+        await engine.dispose()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(background_worker())